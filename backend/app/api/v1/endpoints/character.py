@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 import logging
-from typing import List
-from app.core.graphql import gql
-from app.services.anilist_service import anilist_query
+from typing import Literal, Optional
+from app.core import config
+from app.core.graphql import filter_variables, gql
+from app.api.v1.fields import FIELDS_QUERY, present, sparse_json, sparse_or_400
+from app.api.v1.errors import rate_limited
+from app.services.anilist_service import AniListRateLimited, anilist_query
+from app.services.entity_store import entity_store
+from app.services.prefetch import CHARACTER, prefetcher
 from app.models.responses import (
     CharacterDetails,
-    VoiceActorDTO,
+    CharacterVoiceActor,
+    CharacterVoiceActors,
     Title,
     CoverImage,
     MediaMini,
@@ -15,73 +21,194 @@ from app.models.responses import (
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/character", tags=["character"])
 CHARACTER_BY_ID_QUERY = gql("character")  # твой GraphQL запрос
+CHARACTER_VOICE_ACTORS_QUERY = gql("character_voice_actors")
+CHARACTER_REQUIRED_FIELDS = frozenset({"id", "name"})
+# поле CharacterDetails -> поле Character в ответе AniList (для ?fields=)
+CHARACTER_SOURCES = {
+    "name_full": "name",
+    "name_native": "name",
+    "name_alternative": "name",
+    "image_large": "image",
+    "description": "description",
+    "favourites": "favourites",
+    "age": "age",
+    "gender": "gender",
+    "bloodType": "bloodType",
+    "dateOfBirth": "dateOfBirth",
+    "anime": "media",
+    "anime_total": "media",
+    "anime_has_next": "media",
+}
+
+# StaffLanguage в AniList
+VoiceActorLanguage = Literal[
+    "JAPANESE", "ENGLISH", "KOREAN", "ITALIAN", "SPANISH",
+    "PORTUGUESE", "FRENCH", "GERMAN", "HEBREW", "HUNGARIAN",
+]
+
+
+def map_voice_actors(edges: list) -> list[CharacterVoiceActor]:
+    """
+    Сэйю по рёбрам за один проход: повтор того же сэйю в другом тайтле
+    только дописывает id тайтла
+    """
+    by_id: dict[int, CharacterVoiceActor] = {}
+    for edge in edges:
+        media_id = ((edge or {}).get("node") or {}).get("id")
+        for va in (edge or {}).get("voiceActors") or []:
+            if not va or not va.get("id"):
+                continue
+            actor = by_id.get(va["id"])
+            if actor is None:
+                name = va.get("name") or {}
+                actor = by_id[va["id"]] = CharacterVoiceActor(
+                    id=va["id"],
+                    name=name.get("full") or "—",
+                    name_native=name.get("native"),
+                    image=(va.get("image") or {}).get("large"),
+                    languageV2=va.get("languageV2"),
+                )
+            if media_id is not None:
+                actor.media_ids.append(media_id)
+    return list(by_id.values())
+
+
+def map_character_details(char_data: dict) -> CharacterDetails:
+    media = char_data.get("media") or {}
+    page_info = media.get("pageInfo") or {}
+
+    return CharacterDetails(**present(char_data, dict(
+        id=char_data["id"],
+        name_full=char_data["name"].get("full", "—"),
+        name_native=char_data["name"].get("native"),
+        name_alternative=char_data["name"].get("alternative", []),
+        image_large=(char_data.get("image") or {}).get("large"),
+        description=char_data.get("description"),
+        favourites=char_data.get("favourites"),
+        age=char_data.get("age"),
+        gender=char_data.get("gender"),
+        bloodType=char_data.get("bloodType"),
+        dateOfBirth=DateOfBirth(**char_data["dateOfBirth"]) if char_data.get("dateOfBirth") else None,
+        anime=[
+            MediaMini(
+                id=m["id"],
+                title=Title(**m.get("title", {})),
+                coverImage=CoverImage(**m.get("coverImage")) if m.get("coverImage") else None,
+                format=m.get("format"),
+                seasonYear=m.get("seasonYear"),
+                averageScore=m.get("averageScore"),
+            )
+            for m in media.get("nodes") or []
+        ],
+        anime_total=page_info.get("total") or 0,
+        anime_has_next=bool(page_info.get("hasNextPage")),
+    ), CHARACTER_SOURCES))
+
 
 @router.get("/{character_id}", response_model=CharacterDetails)
-async def get_character(character_id: int):
+async def get_character(
+    character_id: int,
+    page: int = Query(1, ge=1, description="страница появлений в тайтлах"),
+    limit: int = Query(25, ge=1, le=50),
+    fields: Optional[str] = FIELDS_QUERY,
+):
+    """
+    Персонаж и страница его появлений в тайтлах; сэйю — отдельно,
+    /character/{id}/voice-actors
+    """
+    query, requested = sparse_or_400(CHARACTER_BY_ID_QUERY, "Character", fields, CHARACTER_REQUIRED_FIELDS)
+
+    try:
+        response = None
+        if requested is None and page == 1:
+            # все поля уже известны из прошлых ответов — без запроса к AniList
+            response = entity_store.character_response(
+                character_id,
+                max_age=config.CACHE_TTLS["character"],
+                per_page=limit,
+            )
+        if response is None:
+            response = await anilist_query(
+                query,
+                filter_variables(query, {
+                    "id": character_id,
+                    "page": page,
+                    "perPage": limit,
+                })
+            )
+
+        char_data = (response.get("data") or {}).get("Character")
+        if not char_data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Персонаж не найден"
+            )
+
+        prefetcher.viewed(CHARACTER, character_id)
+        return sparse_json(map_character_details(char_data), requested)
+
+    except HTTPException:
+        raise
+
+    except AniListRateLimited as e:
+        raise rate_limited(e)
+
+    except Exception as e:
+        logger.exception(f"Ошибка при получении персонажа {character_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера"
+        )
+
+
+@router.get("/{character_id}/voice-actors", response_model=CharacterVoiceActors)
+async def get_character_voice_actors(
+    character_id: int,
+    language: Optional[VoiceActorLanguage] = Query(None, description="JAPANESE, ENGLISH, ..."),
+    page: int = Query(1, ge=1, description="страница появлений в тайтлах"),
+    limit: int = Query(25, ge=1, le=50),
+):
+    """
+    Сэйю персонажа по странице его появлений, без повторов
+    """
     try:
         response = await anilist_query(
-            CHARACTER_BY_ID_QUERY,
-            variables={"id": character_id}
+            CHARACTER_VOICE_ACTORS_QUERY,
+            variables={
+                "id": character_id,
+                "page": page,
+                "perPage": limit,
+                "language": language,
+            }
         )
 
-        char_data = response.get("Character")
+        char_data = (response.get("data") or {}).get("Character")
         if not char_data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Персонаж не найден"
             )
 
-        # --- Собираем voice actors ---
-        voice_actors: List[VoiceActorDTO] = []
-        for edge in char_data.get("media", {}).get("edges", []):
-            for va in edge.get("voiceActors", []):
-                if va and va.get("id"):
-                    voice_actors.append(
-                        VoiceActorDTO(
-                            id=va["id"],
-                            name=va.get("name", {}).get("full", "—"),
-                            image=va.get("image", {}).get("large"),
-                            language=va.get("languageV2"),
-                        )
-                    )
-
-        # Убираем дубликаты
-        seen = set()
-        unique_voice_actors = []
-        for va in voice_actors:
-            if va.id not in seen:
-                seen.add(va.id)
-                unique_voice_actors.append(va)
-
-        # --- Возвращаем все данные ---
-        return CharacterDetails(
-            id=char_data["id"],
-            name_full=char_data["name"].get("full", "—"),
-            name_native=char_data["name"].get("native"),
-            name_alternative=char_data["name"].get("alternative", []),
-            image_large=char_data.get("image", {}).get("large"),
-            description=char_data.get("description"),
-            favourites=char_data.get("favourites"),
-            age=char_data.get("age"),
-            gender=char_data.get("gender"),
-            bloodType=char_data.get("bloodType"),
-            dateOfBirth=DateOfBirth(**char_data["dateOfBirth"]) if char_data.get("dateOfBirth") else None,
-            anime=[
-                MediaMini(
-                    id=m["id"],
-                    title=Title(**m.get("title", {})),
-                    coverImage=CoverImage(**m.get("coverImage")) if m.get("coverImage") else None,
-                    format=m.get("format"),
-                    seasonYear=m.get("seasonYear"),
-                    averageScore=m.get("averageScore"),
-                )
-                for m in char_data.get("media", {}).get("nodes", [])
-            ],
-            voice_actors=unique_voice_actors  # ← сюда!
+        media = char_data.get("media") or {}
+        page_info = media.get("pageInfo") or {}
+        return CharacterVoiceActors(
+            character_id=character_id,
+            language=language,
+            page=page,
+            limit=limit,
+            media_total=page_info.get("total") or 0,
+            has_next=bool(page_info.get("hasNextPage")),
+            voice_actors=map_voice_actors(media.get("edges") or []),
         )
 
+    except HTTPException:
+        raise
+
+    except AniListRateLimited as e:
+        raise rate_limited(e)
+
     except Exception as e:
-        logger.exception(f"Ошибка при получении персонажа {character_id}: {str(e)}")
+        logger.exception(f"Ошибка при получении сэйю персонажа {character_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Внутренняя ошибка сервера"
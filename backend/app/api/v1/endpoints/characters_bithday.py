@@ -1,99 +1,96 @@
-from fastapi import APIRouter, HTTPException, Query, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from typing import AsyncIterator, List
 import logging
-from datetime import date
+from datetime import date, timedelta
 
-from app.services.anilist_service import anilist_query
+from app.api.v1.ndjson import ndjson_response, wants_ndjson
 from app.models.responses import CharacterBirthday
-from app.core.graphql import gql
+from app.services.birthday_index import BirthdayRow, birthday_index
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/characters", tags=["characters"])
 
-TODAY_BIRTHDAYS_QUERY = gql("today_birthday")
-
 # сколько отдаём клиенту
 USER_LIMIT_DEFAULT = 8
 
-# сколько тянем за один запрос к AniList
-FETCH_PER_PAGE = 50
+# максимальный диапазон дат для /birthdays
+MAX_RANGE_DAYS = 31
+
+
+def to_birthday(row: BirthdayRow, day: date) -> CharacterBirthday:
+    char_id, name_full, name_native, image_large, favourites, romaji, english = row
+    return CharacterBirthday(
+        id=char_id,
+        name_full=name_full or "—",
+        name_native=name_native,
+        image_large=image_large,
+        favourites=favourites,
+        anime_title_romaji=romaji,
+        anime_title_english=english,
+        month=day.month,
+        day=day.day,
+    )
+
 
-# сколько страниц максимум просматриваем
-MAX_PAGES = 10
+async def stream_birthdays(days: List[date], per_page: int) -> AsyncIterator[CharacterBirthday]:
+    # строка индекса валидируется, только когда до неё дошёл поток
+    for day in days:
+        for row in birthday_index.lookup(day.month, day.day, per_page):
+            yield to_birthday(row, day)
 
 
 @router.get("/today-birthdays", response_model=List[CharacterBirthday])
 async def get_today_birthdays(
+    request: Request,
     per_page: int = Query(USER_LIMIT_DEFAULT, ge=1, le=50)
 ):
     """
-    Персонажи, у которых сегодня день рождения (AniList)
+    Персонажи, у которых сегодня день рождения (AniList).
+    С Accept: application/x-ndjson — потоком, по персонажу на строку
     """
     today = date.today()
 
-    page = 1
-    result: List[CharacterBirthday] = []
+    if wants_ndjson(request):
+        return await ndjson_response(stream_birthdays([today], per_page))
+
+    result = [to_birthday(row, today) for row in birthday_index.lookup(today.month, today.day, per_page)]
+
+    logger.info("Найдено именинников сегодня: %s", len(result))
+    return result
+
 
+@router.get("/birthdays", response_model=List[CharacterBirthday])
+async def get_birthdays(
+    request: Request,
+    month: int = Query(..., ge=1, le=12),
+    day: int = Query(..., ge=1, le=31),
+    days: int = Query(1, ge=1, le=MAX_RANGE_DAYS, description="Сколько дней начиная с month/day"),
+    per_page: int = Query(USER_LIMIT_DEFAULT, ge=1, le=50, description="Лимит на каждый день"),
+):
+    """
+    Дни рождения персонажей на произвольную дату или диапазон дат
+    (NDJSON-поток — как у /today-birthdays)
+    """
+    # високосный год, чтобы 29 февраля было валидной датой
     try:
-        while page <= MAX_PAGES and len(result) < per_page:
-            data = await anilist_query(
-                TODAY_BIRTHDAYS_QUERY,
-                {
-                    "page": page,
-                    "perPage": FETCH_PER_PAGE,
-                    "sort": ["FAVOURITES_DESC"],
-                }
-            )
-
-            characters = data.get("Page", {}).get("characters", [])
-            logger.info("Page %s: получено персонажей %s", page, len(characters))
-
-            if not characters:
-                break
-
-            for char in characters:
-                if len(result) >= per_page:
-                    break
-
-                dob = char.get("dateOfBirth")
-                if not dob:
-                    continue
-
-                if dob.get("month") != today.month or dob.get("day") != today.day:
-                    continue
-
-                media_nodes = char.get("media", {}).get("nodes") or []
-                first_media = media_nodes[0] if media_nodes else {}
-                title = first_media.get("title", {})
-
-                result.append(
-                    CharacterBirthday(
-                        id=char["id"],
-                        name_full=char["name"]["full"],
-                        name_native=char["name"].get("native"),
-                        image_large=char.get("image", {}).get("large"),
-                        favourites=char.get("favourites"),
-                        anime_title_romaji=title.get("romaji"),
-                        anime_title_english=title.get("english"),
-                    )
-                )
-
-            page += 1
-
-        logger.info("Найдено именинников сегодня: %s", len(result))
-        return result
-
-    except RuntimeError as e:
-        logger.error("AniList error (birthdays): %s", str(e))
+        start = date(2024, month, day)
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="Ошибка при запросе к AniList"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректная дата"
         )
 
-    except Exception:
-        logger.exception("Внутренняя ошибка /characters/today-birthdays")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+    if wants_ndjson(request):
+        dates = [start + timedelta(days=offset) for offset in range(days)]
+        return await ndjson_response(stream_birthdays(dates, per_page))
+
+    result: List[CharacterBirthday] = []
+    for offset in range(days):
+        current = start + timedelta(days=offset)
+        result.extend(
+            to_birthday(row, current)
+            for row in birthday_index.lookup(current.month, current.day, per_page)
         )
+
+    return result
@@ -0,0 +1,57 @@
+from typing import Literal, Optional
+import logging
+
+from fastapi import APIRouter, HTTPException, Path, Query, Request, Response, status
+
+from app.core import config
+from app.api.v1.errors import rate_limited
+from app.api.v1.http_cache import etag_matches
+from app.services.anilist_service import AniListRateLimited
+from app.services.image_proxy import ImageNotFound, ImageUpstreamError, image_proxy
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/img",
+    tags=["images"],
+)
+
+
+@router.get("/{kind}/{entity_id}")
+async def get_image(
+    request: Request,
+    kind: Literal["cover", "banner", "character", "staff"],
+    entity_id: int = Path(..., ge=1),
+    w: Optional[int] = Query(None, ge=16, le=2000, description="ширина, округляется вверх до готовых размеров"),
+    v: Optional[str] = Query(None, max_length=64, description="версия оригинала из ссылок API"),
+) -> Response:
+    """
+    Картинка сущности через локальный кэш: без w — оригинал,
+    с w — уменьшенная копия в WebP. Ссылка с актуальной версией ?v=
+    кэшируется клиентом надолго (сменится картинка — сменится ссылка),
+    без неё — коротко, с перепроверкой по ETag
+    """
+    try:
+        body, media_type, etag, version = await image_proxy.get(kind, entity_id, w)
+    except ImageNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Картинка не найдена")
+    except AniListRateLimited as e:
+        raise rate_limited(e)
+    except ImageUpstreamError as e:
+        logger.warning("GET /img/%s/%s: %s", kind, entity_id, e)
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="CDN AniList недоступен")
+    except RuntimeError as e:
+        logger.error("AniList error (image %s %s): %s", kind, entity_id, str(e))
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Ошибка при запросе к AniList")
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={config.IMAGE_MAX_AGE}, immutable"
+            if v == version
+            else f"public, max-age={config.IMAGE_REVALIDATE_MAX_AGE}"
+        ),
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from typing import List, Literal, Optional
 import logging
 
 from app.core.graphql import gql
-from app.services.anilist_service import anilist_query
-from app.models.responses import FullAnimeDetails
+from app.api.v1.errors import rate_limited
+from app.api.v1.fields import FIELDS_QUERY, sparse_or_400
+from app.api.v1.http_cache import cached_json_response, rendered
+from app.services.anilist_service import AniListRateLimited, anilist_query_entry
+from app.core import config
+from app.services.media_batch import fetch_media_batch
+from app.services.prefetch import MEDIA, prefetcher
+from app.models.responses import (
+    FullAnimeDetails,
+    MediaBatchItem,
+    MediaBatchRequest,
+    MediaBatchResponse,
+    MediaShort,
+)
 
 router = APIRouter(
     prefix="",
@@ -14,6 +27,9 @@ logger = logging.getLogger(__name__)
 
 MEDIA_DETAILS_QUERY = gql("media_details")
 
+# без них FullAnimeDetails не валидируется
+MEDIA_REQUIRED_FIELDS = frozenset({"id", "type", "title"})
+
 MEDIA_TYPE_MAP = {
     "anime": "ANIME",
     "manga": "MANGA",
@@ -26,8 +42,10 @@ MEDIA_TYPE_MAP = {
     response_model=FullAnimeDetails,
 )
 async def get_media_details(
+    request: Request,
     media_type: str,
     media_id: int = Path(..., ge=1),
+    fields: Optional[str] = FIELDS_QUERY,
 ):
     media_type = media_type.lower()
 
@@ -38,14 +56,15 @@ async def get_media_details(
         )
 
     expected_type = MEDIA_TYPE_MAP[media_type]
+    query, requested = sparse_or_400(MEDIA_DETAILS_QUERY, "Media", fields, MEDIA_REQUIRED_FIELDS)
 
     try:
-        result = await anilist_query(
-            MEDIA_DETAILS_QUERY,
+        entry = await anilist_query_entry(
+            query,
             {"id": media_id},
         )
 
-        media = result.get("data", {}).get("Media")
+        media = entry.value.get("data", {}).get("Media")
         
         if not media:
             raise HTTPException(
@@ -59,14 +78,93 @@ async def get_media_details(
                 detail=f"Это не {media_type.upper()}",
             )
 
-        return FullAnimeDetails.model_validate(media)
+        prefetcher.viewed(MEDIA, media_id)
+        if requested is None:
+            # сиквел, главные персонажи, стафф — прогреваем в фоне
+            prefetcher.media_viewed(media)
+
+        # валидация и JSON — один раз на запись кэша, дальше готовые байты
+        # при ?fields= в ответе только запрошенные (и вычисляемые) поля
+        body, etag = rendered(
+            entry,
+            "full" if requested is None else "sparse",
+            lambda: FullAnimeDetails.model_validate(media).model_dump_json(
+                exclude_unset=requested is not None,
+            ).encode(),
+        )
+        return cached_json_response(request, body, etag, max_age=entry.ttl)
 
     except HTTPException:
         raise
 
+    except AniListRateLimited as e:
+        raise rate_limited(e)
+
     except Exception:
         logger.exception("AniList error")
         raise HTTPException(
             status_code=503,
             detail="Ошибка загрузки данных AniList",
         )
+
+
+# ─────────────────────────────────────────────────────────────
+# Пакетная загрузка: один aliased GraphQL запрос на много id
+# ─────────────────────────────────────────────────────────────
+
+def parse_ids(raw: str) -> List[int]:
+    try:
+        ids = [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids — список чисел через запятую")
+    return ids
+
+
+async def media_batch(ids: List[int], view: str) -> MediaBatchResponse:
+    # дубликаты убираем, порядок сохраняем
+    ids = list(dict.fromkeys(ids))
+
+    if not ids:
+        raise HTTPException(status_code=400, detail="Пустой список ids")
+    if len(ids) > config.MEDIA_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не больше {config.MEDIA_BATCH_MAX_IDS} id за запрос",
+        )
+    if any(media_id < 1 for media_id in ids):
+        raise HTTPException(status_code=400, detail="id должны быть >= 1")
+
+    model = FullAnimeDetails if view == "full" else MediaShort
+    fetched = await fetch_media_batch(ids)
+
+    items: List[MediaBatchItem] = []
+    for media_id in ids:
+        media = fetched.get(media_id)
+
+        if isinstance(media, AniListRateLimited):
+            items.append(MediaBatchItem(id=media_id, error="AniList временно ограничил запросы"))
+        elif isinstance(media, Exception):
+            items.append(MediaBatchItem(id=media_id, error="Ошибка загрузки данных AniList"))
+        elif media is None:
+            items.append(MediaBatchItem(id=media_id, error="Медиа не найдено"))
+        else:
+            try:
+                items.append(MediaBatchItem(id=media_id, media=model.model_validate(media)))
+            except ValueError:
+                logger.exception("Некорректные данные медиа %s", media_id)
+                items.append(MediaBatchItem(id=media_id, error="Некорректный ответ AniList"))
+
+    return MediaBatchResponse(items=items)
+
+
+@router.get("/media/batch", response_model=MediaBatchResponse)
+async def get_media_batch(
+    ids: str = Query(..., description="id через запятую: 1,2,3"),
+    view: Literal["full", "short"] = Query("full"),
+):
+    return await media_batch(parse_ids(ids), view)
+
+
+@router.post("/media/batch", response_model=MediaBatchResponse)
+async def post_media_batch(body: MediaBatchRequest):
+    return await media_batch(body.ids, body.view)
@@ -0,0 +1,84 @@
+from typing import List
+import logging
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.graphql import gql
+from app.api.v1.errors import rate_limited
+from app.models.responses import MediaShort, SearchResult
+from app.services.anilist_service import AniListRateLimited, anilist_query
+from app.services.entity_store import entity_store
+from app.services.search_index import CONFIDENT, search_index
+
+router = APIRouter(
+    prefix="",
+    tags=["search"],
+)
+
+logger = logging.getLogger(__name__)
+
+SEARCH_QUERY = gql("search")
+
+# короче — не ходим в AniList: typeahead на каждую букву съел бы квоту
+FALLBACK_MIN_LENGTH = 3
+
+
+def local_results(search: str, limit: int) -> tuple[List[MediaShort], float]:
+    """
+    Совпадения из локального индекса и уверенность лучшего из них
+    """
+    results = []
+    confidence = 0.0
+    for hit in search_index.search(search, limit=limit, media_type="ANIME"):
+        record = entity_store.media(hit.media_id)
+        if record is None:
+            continue
+        results.append(MediaShort.model_validate(record.as_dict()))
+        confidence = max(confidence, hit.confidence)
+    return results, confidence
+
+
+@router.get("/anime", response_model=SearchResult)
+# фронтенд обращается к /api/anime
+@router.get("/api/anime", response_model=SearchResult, include_in_schema=False)
+async def search_anime(
+    search: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+) -> SearchResult:
+    """
+    Поиск аниме по названию: сначала локальный индекс по всему, что уже
+    было в кэше, AniList — только если своих совпадений мало или они
+    неуверенные
+    """
+    search = search.strip()
+    results, confidence = local_results(search, limit)
+
+    if (len(results) >= limit and confidence >= CONFIDENT) or len(search) < FALLBACK_MIN_LENGTH:
+        return SearchResult(query=search, source="local", results=results)
+
+    search_index.fallbacks += 1
+    try:
+        result = await anilist_query(SEARCH_QUERY, {"search": search, "type": "ANIME", "perPage": limit})
+
+    except AniListRateLimited as e:
+        # квоты нет — отдаём то, что нашли сами
+        if results:
+            return SearchResult(query=search, source="local", results=results)
+        raise rate_limited(e)
+
+    except Exception as e:
+        if results:
+            logger.warning("AniList недоступен (search %r): %s, отдаём локальные результаты", search, e)
+            return SearchResult(query=search, source="local", results=results)
+        logger.exception("AniList error (search %r)", search)
+        raise HTTPException(
+            status_code=503,
+            detail="Ошибка загрузки данных AniList",
+        )
+
+    media = ((result.get("data") or {}).get("Page") or {}).get("media") or []
+    return SearchResult(
+        query=search,
+        source="anilist",
+        results=[MediaShort.model_validate(item) for item in media],
+    )
@@ -1,27 +1,22 @@
-from datetime import datetime, timezone
-from enum import Enum
-from typing import List
+from typing import List, Literal, Optional
 import logging
 import random
 
-from fastapi import APIRouter, HTTPException, Query, status
+from fastapi import APIRouter, HTTPException, Query, Request, status
 
-from app.core.graphql import gql
-from app.models.responses import MediaShort
-from app.services.anilist_service import anilist_query
-
-CURRENT_SEASON_QUERY = gql("current_season")
+from app.api.v1.errors import rate_limited
+from app.api.v1.ndjson import ndjson_response, wants_ndjson
+from app.models.responses import MediaShort, SeasonCatalogPage
+from app.services.anilist_service import AniListRateLimited
+from app.services.season_catalog import (
+    MediaSeasonEnum,
+    current_season,
+    season_catalog,
+)
 
 logger = logging.getLogger(__name__)
 
 
-class MediaSeasonEnum(str, Enum):
-    WINTER = "WINTER"
-    SPRING = "SPRING"
-    SUMMER = "SUMMER"
-    FALL = "FALL"
-
-
 router = APIRouter(
     prefix="/season",
     tags=["season"],
@@ -30,54 +25,30 @@ router = APIRouter(
 
 @router.get("/current", response_model=List[MediaShort])
 async def get_current_season_anime(
+    request: Request,
     limit: int = Query(8, ge=1, le=50)
 ) -> List[MediaShort]:
-
-    now = datetime.now(timezone.utc)
-    month = now.month
-    year = now.year   # ✅ ВАЖНО
-
-    if month in (1, 2, 3):
-        season = MediaSeasonEnum.WINTER
-    elif month in (4, 5, 6):
-        season = MediaSeasonEnum.SPRING
-    elif month in (7, 8, 9):
-        season = MediaSeasonEnum.SUMMER
-    else:
-        season = MediaSeasonEnum.FALL
-
-    variables = {
-        "season": season.value,
-        "seasonYear": year,
-        "perPage": 50,
-        "page": 1,
-    }
-
-    logger.debug(f"Season query vars: {variables}")
+    """
+    Случайные тайтлы текущего сезона. С Accept: application/x-ndjson —
+    потоком по тайтлу на строку, не дожидаясь загрузки всего каталога
+    """
+    season, year = current_season()
 
     try:
-        result = await anilist_query(CURRENT_SEASON_QUERY, variables)
+        if wants_ndjson(request):
+            return await ndjson_response(season_catalog.sample(season, year, limit))
 
-        data = result.get("data", {})
-        page = data.get("Page", {})
-        media = page.get("media", [])
+        snapshot = await season_catalog.get(season, year)
 
-        if not media:
+        if not snapshot.items:
             logger.warning("No media for %s %s", season.value, year)
             return []
 
-        # fallback coverImage
-        for item in media:
-            if not item.get("coverImage"):
-                item["coverImage"] = {
-                    "large": f"https://img.anili.st/media/{item['id']}",
-                    "extraLarge": f"https://img.anili.st/media/{item['id']}",
-                }
-
-        random.shuffle(media)
-        selected = media[:limit]
+        # случайная выборка из всего каталога сезона, без запроса к AniList
+        return random.sample(snapshot.items, min(limit, len(snapshot.items)))
 
-        return [MediaShort.model_validate(item) for item in selected]
+    except AniListRateLimited as e:
+        raise rate_limited(e)
 
     except RuntimeError as e:
         logger.error("AniList error (current season): %s", str(e))
@@ -92,3 +63,62 @@ async def get_current_season_anime(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Внутренняя ошибка сервера"
         )
+
+
+@router.get("/{year}/{season}", response_model=SeasonCatalogPage)
+async def get_season_catalog(
+    year: int,
+    season: MediaSeasonEnum,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=50),
+    sort: Literal["popularity", "score", "title"] = Query("popularity"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    format: Optional[str] = Query(None, description="TV, MOVIE, OVA, ..."),
+    media_status: Optional[str] = Query(None, alias="status", description="RELEASING, FINISHED, ..."),
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+) -> SeasonCatalogPage:
+    """
+    Каталог сезона с сортировкой, фильтрами и пагинацией — целиком из снапшота
+    """
+    if not 1940 <= year <= 2100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный год"
+        )
+
+    try:
+        snapshot = await season_catalog.get(season, year)
+
+    except AniListRateLimited as e:
+        raise rate_limited(e)
+
+    except RuntimeError as e:
+        logger.error("AniList error (season %s %s): %s", season.value, year, str(e))
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Ошибка при запросе к AniList"
+        )
+
+    items = snapshot.sorted(sort, descending=order == "desc")
+
+    if format or media_status or min_score is not None:
+        format_ = format.upper() if format else None
+        status_ = media_status.upper() if media_status else None
+        items = [
+            item for item in items
+            if (format_ is None or item.format == format_)
+            and (status_ is None or item.status == status_)
+            and (min_score is None or (item.averageScore or 0) >= min_score)
+        ]
+
+    start = (page - 1) * per_page
+
+    return SeasonCatalogPage(
+        season=season.value,
+        year=year,
+        page=page,
+        per_page=per_page,
+        total=len(items),
+        has_next=start + per_page < len(items),
+        items=items[start:start + per_page],
+    )
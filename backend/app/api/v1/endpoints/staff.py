@@ -1,9 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, Request, status, Query
+import asyncio
 import logging
-from typing import List
-
-from app.core.graphql import gql
-from app.services.anilist_service import anilist_query
+from typing import AsyncIterator, List, Optional
+
+from app.core import config
+from app.core.graphql import filter_variables, gql, sparse_query
+from app.core.images import proxy_image_url
+from app.api.v1.fields import FIELDS_QUERY, present, sparse_json, sparse_or_400
+from app.api.v1.errors import rate_limited
+from app.api.v1.ndjson import ndjson_response, wants_ndjson
+from app.services.anilist_service import AniListRateLimited, anilist_query
+from app.services.prefetch import STAFF, prefetcher
 from app.models.responses import (
     StaffDetails,
     Title,
@@ -17,27 +24,156 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/staff", tags=["Staff"])
 
 STAFF_BY_ID_QUERY = gql("staff")
+STAFF_REQUIRED_FIELDS = frozenset({"id", "name"})
+# поле StaffDetails -> поле Staff в ответе AniList (для ?fields=)
+STAFF_SOURCES = {
+    "name_full": "name",
+    "name_native": "name",
+    "name_alternative": "name",
+    "image_large": "image",
+    "description": "description",
+    "primary_occupations": "primaryOccupations",
+    "gender": "gender",
+    "date_of_birth": "dateOfBirth",
+    "date_of_death": "dateOfDeath",
+    "age": "age",
+    "years_active": "yearsActive",
+    "home_town": "homeTown",
+    "blood_type": "bloodType",
+    "favourites": "favourites",
+    "works": "staffMedia",
+    "works_total": "staffMedia",
+    "works_has_next": "staffMedia",
+}
+
+
+def to_work(node: dict) -> StaffMediaMini:
+    cover = node.get("coverImage") or {}
+
+    fallback = proxy_image_url("cover", node["id"]) or f"https://img.anili.st/media/{node['id']}"
+    cover_image = (
+        CoverImage(**cover)
+        if cover
+        else CoverImage(
+            large=fallback,
+            medium=fallback
+        )
+    )
+
+    title_raw = node.get("title") or {}
+    title = Title(
+        romaji=title_raw.get("romaji"),
+        english=title_raw.get("english")
+    )
+
+    return StaffMediaMini(
+        id=node["id"],
+        title=title,
+        coverImage=cover_image,
+        format=node.get("format"),
+        seasonYear=node.get("seasonYear"),
+        averageScore=node.get("averageScore"),
+    )
+
+
+def to_staff_details(staff_data: dict, works: List[StaffMediaMini]) -> StaffDetails:
+    page_info = (staff_data.get("staffMedia") or {}).get("pageInfo") or {}
+
+    dob_raw = staff_data.get("dateOfBirth")
+    dob = DateOfBirth(**dob_raw) if dob_raw else None
+
+    dod_raw = staff_data.get("dateOfDeath")
+    dod = DateOfBirth(**dod_raw) if dod_raw else None
+
+    return StaffDetails(**present(staff_data, dict(
+        id=staff_data["id"],
+        name_full=staff_data.get("name", {}).get("full", "—"),
+        name_native=staff_data.get("name", {}).get("native"),
+        name_alternative=staff_data.get("name", {}).get("alternative", []),
+        image_large=staff_data.get("image", {}).get("large"),
+        description=staff_data.get("description"),
+        primary_occupations=staff_data.get("primaryOccupations", []),
+        gender=staff_data.get("gender"),
+        date_of_birth=dob,
+        date_of_death=dod,
+        age=staff_data.get("age"),
+        years_active=staff_data.get("yearsActive", []),
+        home_town=staff_data.get("homeTown"),
+        blood_type=staff_data.get("bloodType"),
+        favourites=staff_data.get("favourites"),
+        works=works,
+        works_total=page_info.get("total", 0),
+        works_has_next=page_info.get("hasNextPage", False)
+    ), STAFF_SOURCES))
+
+
+async def stream_staff(
+    query: str, staff_id: int, page: int, limit: int, staff_data: dict
+) -> AsyncIterator[StaffDetails | StaffMediaMini]:
+    """
+    NDJSON: первая строка — StaffDetails без works, дальше работы по одной
+    со страницы page до конца (не больше NDJSON_MAX_PAGES страниц).
+    Следующая страница качается, пока отдаётся текущая
+    """
+    yield to_staff_details(staff_data, [])
+
+    staff_media = staff_data.get("staffMedia") or {}
+    pending: asyncio.Task | None = None
+
+    async def fetch(page_number: int) -> dict:
+        # дальше нужны только работы: шапку стаффа не перезапрашиваем
+        works_query = sparse_query(query, "Staff", frozenset({"staffMedia"}))
+        data = await anilist_query(
+            works_query,
+            filter_variables(works_query, {"id": staff_id, "page": page_number, "perPage": limit}),
+        )
+        return ((data.get("data") or {}).get("Staff") or {}).get("staffMedia") or {}
+
+    try:
+        for fetched in range(1, config.NDJSON_MAX_PAGES + 1):
+            has_next = (staff_media.get("pageInfo") or {}).get("hasNextPage")
+            if has_next and fetched < config.NDJSON_MAX_PAGES:
+                pending = asyncio.create_task(fetch(page + fetched))
+
+            for node in staff_media.get("nodes") or []:
+                yield to_work(node)
+
+            if pending is None:
+                return
+            staff_media = await pending
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
 
 
 @router.get("/{staff_id}", response_model=StaffDetails)
 async def get_staff(
+    request: Request,
     staff_id: int,
     page: int = Query(1, ge=1),
-    limit: int = Query(12, ge=1, le=50)
+    limit: int = Query(12, ge=1, le=50),
+    fields: Optional[str] = FIELDS_QUERY,
 ):
+    """
+    Сэйю / стафф со страницей работ. С Accept: application/x-ndjson —
+    потоком: шапка, затем все работы начиная со страницы page
+    """
     logger.info("GET /staff/%s?page=%s&limit=%s", staff_id, page, limit)
 
+    query, requested = sparse_or_400(STAFF_BY_ID_QUERY, "Staff", fields, STAFF_REQUIRED_FIELDS)
+
     try:
         data = await anilist_query(
-            STAFF_BY_ID_QUERY,
-            {
+            query,
+            filter_variables(query, {
                 "id": staff_id,
                 "page": page,
                 "perPage": limit
-            }
+            })
         )
 
-        staff_data = data.get("Staff")
+        staff_data = (data.get("data") or {}).get("Staff")
         if not staff_data:
             logger.warning("Staff %s not found", staff_id)
             raise HTTPException(
@@ -45,67 +181,22 @@ async def get_staff(
                 detail="Сэйю / стафф не найден"
             )
 
-        staff_media = staff_data.get("staffMedia") or {}
-        nodes = staff_media.get("nodes") or []
-        page_info = staff_media.get("pageInfo") or {}
-
-        works: List[StaffMediaMini] = []
-
-        for node in nodes:
-            cover = node.get("coverImage") or {}
+        prefetcher.viewed(STAFF, staff_id)
 
-            cover_image = (
-                CoverImage(**cover)
-                if cover
-                else CoverImage(
-                    large=f"https://img.anili.st/media/{node['id']}",
-                    medium=f"https://img.anili.st/media/{node['id']}"
-                )
+        if wants_ndjson(request):
+            return await ndjson_response(
+                stream_staff(query, staff_id, page, limit, staff_data),
+                exclude_unset=requested is not None,
             )
 
-            title_raw = node.get("title") or {}
-            title = Title(
-                romaji=title_raw.get("romaji"),
-                english=title_raw.get("english")
-            )
+        nodes = (staff_data.get("staffMedia") or {}).get("nodes") or []
+        return sparse_json(to_staff_details(staff_data, [to_work(node) for node in nodes]), requested)
 
-            works.append(
-                StaffMediaMini(
-                    id=node["id"],
-                    title=title,
-                    coverImage=cover_image,
-                    format=node.get("format"),
-                    seasonYear=node.get("seasonYear"),
-                    averageScore=node.get("averageScore"),
-                )
-            )
+    except HTTPException:
+        raise
 
-        dob_raw = staff_data.get("dateOfBirth")
-        dob = DateOfBirth(**dob_raw) if dob_raw else None
-
-        dod_raw = staff_data.get("dateOfDeath")
-        dod = DateOfBirth(**dod_raw) if dod_raw else None
-
-        return StaffDetails(
-            id=staff_data["id"],
-            name_full=staff_data.get("name", {}).get("full", "—"),
-            name_native=staff_data.get("name", {}).get("native"),
-            name_alternative=staff_data.get("name", {}).get("alternative", []),
-            image_large=staff_data.get("image", {}).get("large"),
-            description=staff_data.get("description"),
-            primary_occupations=staff_data.get("primaryOccupations", []),
-            gender=staff_data.get("gender"),
-            date_of_birth=dob,
-            date_of_death=dod,
-            age=staff_data.get("age"),
-            years_active=staff_data.get("yearsActive", []),
-            home_town=staff_data.get("homeTown"),
-            blood_type=staff_data.get("bloodType"),
-            favourites=staff_data.get("favourites"),
-            works=works,
-            works_total=page_info.get("total", 0),
-            works_has_next=page_info.get("hasNextPage", False)
-        )
+    except AniListRateLimited as e:
+        raise rate_limited(e)
 
     except RuntimeError as e:
         logger.error("AniList error (staff %s): %s", staff_id, str(e))
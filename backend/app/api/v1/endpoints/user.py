@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Query, status, Depends
 import logging
+from typing import Optional
 
+from app.core import config
 from app.core.graphql import gql
-from app.services.anilist_service import anilist_query
+from app.api.v1.fields import FIELDS_QUERY, present, sparse_json, sparse_or_400
+from app.api.v1.errors import rate_limited
+from app.services.anilist_service import AniListRateLimited
+from app.services.user_favourites import user_profile_entry
 from app.models.responses import (
     UserProfile,
     Avatar,
@@ -10,7 +15,7 @@ from app.models.responses import (
     AnimeStats,
     MangaStats,
     UserFavourites,
-    MediaMini,
+    FavouriteMedia,
     CharacterMini,
     TitleShort,
     CoverImage,
@@ -28,6 +33,14 @@ router = APIRouter(prefix="/user", tags=["User"])
 
 USER_PROFILE_QUERY = gql("user_profile")
 VIEWER_PROFILE_QUERY = gql("viewer_profile")
+USER_REQUIRED_FIELDS = frozenset({"id", "name"})
+
+FAVOURITES_LIMIT_QUERY = Query(
+    config.USER_FAVOURITES_LIMIT,
+    ge=1,
+    le=config.USER_FAVOURITES_MAX,
+    description="сколько записей избранного отдавать на каждую связь (anime, manga, characters, staff)",
+)
 
 # ─────────────────────────────────────────────────────────────
 # Auth dependency (заглушка, замени на свою)
@@ -41,8 +54,8 @@ async def get_current_token() -> str:
 # MAPPERS (ЕДИНЫЙ ИСТОЧНИК ПРАВДЫ)
 # ─────────────────────────────────────────────────────────────
 
-def map_media(item: dict) -> MediaMini:
-    return MediaMini(
+def map_media(item: dict) -> FavouriteMedia:
+    return FavouriteMedia(
         id=item["id"],
         title=TitleShort(**(item.get("title") or {})),
         coverImage=CoverImage(**(item.get("coverImage") or {}))
@@ -63,7 +76,8 @@ def map_character(item: dict) -> CharacterMini:
 def map_user_profile(user_data: dict) -> UserProfile:
     favourites = user_data.get("favourites", {})
 
-    return UserProfile(
+    # поля UserProfile называются как в ответе AniList: задаём только пришедшие
+    return UserProfile(**present(user_data, dict(
         id=user_data["id"],
         name=user_data["name"],
         avatar=Avatar(**user_data.get("avatar", {}))
@@ -87,7 +101,7 @@ def map_user_profile(user_data: dict) -> UserProfile:
         siteUrl=user_data.get("siteUrl"),
         donatorTier=user_data.get("donatorTier"),
         moderatorRoles=user_data.get("moderatorRoles", []),
-    )
+    ), {name: name for name in UserProfile.model_fields}))
 
 # ─────────────────────────────────────────────────────────────
 # ROUTES
@@ -96,6 +110,7 @@ def map_user_profile(user_data: dict) -> UserProfile:
 @router.get("/me", response_model=UserProfile)
 async def get_current_user_profile(
     _: str = Depends(get_current_token),
+    favourites_limit: int = FAVOURITES_LIMIT_QUERY,
 ):
     """
     Профиль текущего авторизованного пользователя (Viewer)
@@ -103,12 +118,12 @@ async def get_current_user_profile(
     logger.info("Запрос профиля текущего пользователя")
 
     try:
-        response = await anilist_query(
-            VIEWER_PROFILE_QUERY,
-            variables={}
+        entry = await user_profile_entry(
+            VIEWER_PROFILE_QUERY, "Viewer", {}, favourites_limit
         )
+        response = entry.value
 
-        user_data = response.get("Viewer")
+        user_data = (response.get("data") or {}).get("Viewer")
         if not user_data:
             raise HTTPException(
                 status.HTTP_401_UNAUTHORIZED,
@@ -120,6 +135,9 @@ async def get_current_user_profile(
     except HTTPException:
         raise
 
+    except AniListRateLimited as e:
+        raise rate_limited(e)
+
     except KeyError as e:
         logger.error(f"Отсутствует ключ в ответе AniList: {e}")
         raise HTTPException(
@@ -136,30 +154,41 @@ async def get_current_user_profile(
 
 
 @router.get("/{username}", response_model=UserProfile)
-async def get_user_profile_by_name(username: str):
+async def get_user_profile_by_name(
+    username: str,
+    fields: Optional[str] = FIELDS_QUERY,
+    favourites_limit: int = FAVOURITES_LIMIT_QUERY,
+):
     """
-    Публичный профиль пользователя по username
+    Публичный профиль пользователя по username.
+    Избранное догружается постранично до favourites_limit на связь;
+    собранный профиль кэшируется целиком
     """
     logger.info(f"Запрос публичного профиля пользователя: {username}")
 
+    query, requested = sparse_or_400(USER_PROFILE_QUERY, "User", fields, USER_REQUIRED_FIELDS)
+
     try:
-        response = await anilist_query(
-            USER_PROFILE_QUERY,
-            variables={"name": username}
+        entry = await user_profile_entry(
+            query, "User", {"name": username}, favourites_limit
         )
+        response = entry.value
 
-        user_data = response.get("User")
+        user_data = (response.get("data") or {}).get("User")
         if not user_data:
             raise HTTPException(
                 status.HTTP_404_NOT_FOUND,
                 "Пользователь не найден"
             )
 
-        return map_user_profile(user_data)
+        return sparse_json(map_user_profile(user_data), requested)
 
     except HTTPException:
         raise
 
+    except AniListRateLimited as e:
+        raise rate_limited(e)
+
     except KeyError as e:
         logger.error(f"Отсутствует ключ в ответе AniList: {e}")
         raise HTTPException(
@@ -0,0 +1,148 @@
+from typing import Literal, Optional
+import logging
+
+from fastapi import APIRouter, HTTPException, Path, Query, Response, status
+
+from app.core import config
+from app.models.responses import (
+    ListImportStatus,
+    MediaShort,
+    WatchlistItem,
+    WatchlistPage,
+    WatchlistProgress,
+    WatchlistStatus,
+    WatchlistUpdate,
+)
+from app.services.anilist_service import AniListRateLimited
+from app.services.list_import import list_importer
+from app.services.media_batch import fetch_media_batch
+from app.services.watchlist import WatchlistEntry, watchlist
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/watchlist/{user}",
+    tags=["watchlist"],
+)
+
+# имя пользователя AniList
+USER_PATH = Path(..., pattern=r"^[A-Za-z0-9_-]{2,32}$")
+
+
+def to_item(entry: WatchlistEntry, media=None) -> WatchlistItem:
+    item = WatchlistItem(
+        media_id=entry.media_id,
+        status=entry.status,
+        progress=entry.progress,
+        score=entry.score,
+        added_at=entry.added_at,
+        updated_at=entry.updated_at,
+    )
+    if isinstance(media, AniListRateLimited):
+        item.error = "AniList временно ограничил запросы"
+    elif isinstance(media, Exception):
+        item.error = "Ошибка загрузки данных AniList"
+    elif media is not None:
+        item.media = MediaShort.model_validate(media)
+    return item
+
+
+@router.get("", response_model=WatchlistPage)
+async def get_watchlist(
+    user: str = USER_PATH,
+    list_status: Optional[WatchlistStatus] = Query(None, alias="status"),
+    sort: Literal["updated", "added"] = Query("updated"),
+    limit: int = Query(50, ge=1, le=config.WATCHLIST_PAGE_MAX),
+    offset: int = Query(0, ge=0),
+    hydrate: bool = Query(True, description="подставить данные тайтлов"),
+) -> WatchlistPage:
+    """
+    Страница списка; данные тайтлов — одним пакетным запросом
+    (кэш, промахи — алиасами в одном запросе к AniList), а не по /media на строку
+    """
+    total, entries = await watchlist.page(user, list_status, sort, limit, offset)
+
+    media = {}
+    if hydrate and entries:
+        media = await fetch_media_batch([entry.media_id for entry in entries])
+
+    return WatchlistPage(
+        user=user,
+        total=total,
+        limit=limit,
+        offset=offset,
+        has_next=offset + len(entries) < total,
+        items=[to_item(entry, media.get(entry.media_id)) for entry in entries],
+    )
+
+
+@router.post("/import", response_model=ListImportStatus, status_code=status.HTTP_202_ACCEPTED)
+async def start_list_import(
+    user: str = USER_PATH,
+    media_type: Literal["ANIME", "MANGA"] = Query("ANIME", alias="type"),
+) -> ListImportStatus:
+    """
+    Фоновый импорт списка AniList пользователя; упавший импорт
+    продолжается с последней сохранённой пачки
+    """
+    job = await list_importer.start(user, media_type)
+    return ListImportStatus(**job.as_dict())
+
+
+@router.get("/import", response_model=ListImportStatus)
+async def get_list_import(
+    user: str = USER_PATH,
+    media_type: Literal["ANIME", "MANGA"] = Query("ANIME", alias="type"),
+) -> ListImportStatus:
+    job = await list_importer.status(user, media_type)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Импорт не запускался")
+    return ListImportStatus(**job.as_dict())
+
+
+@router.get("/{media_id}", response_model=WatchlistItem)
+async def get_watchlist_entry(
+    user: str = USER_PATH,
+    media_id: int = Path(..., ge=1),
+) -> WatchlistItem:
+    entry = await watchlist.get(user, media_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Тайтла нет в списке")
+    return to_item(entry)
+
+
+@router.put("/{media_id}", response_model=WatchlistItem)
+async def put_watchlist_entry(
+    body: WatchlistUpdate,
+    user: str = USER_PATH,
+    media_id: int = Path(..., ge=1),
+) -> WatchlistItem:
+    """
+    Добавить тайтл в список или изменить статус / оценку / прогресс
+    """
+    entry = await watchlist.put(user, media_id, body.status, body.progress, body.score)
+    return to_item(entry)
+
+
+@router.patch("/{media_id}/progress", status_code=status.HTTP_202_ACCEPTED)
+async def set_watchlist_progress(
+    body: WatchlistProgress,
+    user: str = USER_PATH,
+    media_id: int = Path(..., ge=1),
+) -> dict:
+    """
+    Прогресс просмотра. Запись на диск отложена и склеивается с соседними
+    обновлениями; чтение списка сразу видит новое значение
+    """
+    watchlist.set_progress(user, media_id, body.progress)
+    return {"media_id": media_id, "progress": body.progress}
+
+
+@router.delete("/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_watchlist_entry(
+    user: str = USER_PATH,
+    media_id: int = Path(..., ge=1),
+) -> Response:
+    if not await watchlist.remove(user, media_id):
+        raise HTTPException(status_code=404, detail="Тайтла нет в списке")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
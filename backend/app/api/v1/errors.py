@@ -0,0 +1,17 @@
+import math
+
+from fastapi import HTTPException, status
+
+from app.services.scheduler import AniListRateLimited
+
+
+def rate_limited(exc: AniListRateLimited) -> HTTPException:
+    """
+    Квота AniList исчерпана -> 503 с Retry-After, чтобы клиент
+    повторил запрос позже, а не получил 502/500
+    """
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="AniList временно ограничил запросы, повторите позже",
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
@@ -0,0 +1,48 @@
+from typing import Any
+
+from fastapi import HTTPException, Query, status
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.core.graphql import parse_fields, sparse_query
+
+FIELDS_QUERY = Query(
+    None,
+    description="Поля через запятую, вложенные через точку: title,coverImage,characters.edges.node.name",
+)
+
+
+def sparse_or_400(query: str, root: str, raw_fields: str | None, required: frozenset[str]) -> tuple[str, frozenset[str] | None]:
+    """
+    (запрос, запрошенные поля) — при ?fields= выборка корня root
+    обрезается до нужных путей плюс обязательные для маппинга поля
+    """
+    try:
+        fields = parse_fields(raw_fields)
+        if fields is None:
+            return query, None
+        # сначала проверяем пути клиента как есть: иначе неверный подпуть
+        # обязательного поля (title.foo) растворился бы в целом title
+        sparse_query(query, root, fields)
+        return sparse_query(query, root, fields | required), fields
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def present(data: dict, values: dict[str, Any], sources: dict[str, str]) -> dict[str, Any]:
+    """
+    Значения полей модели, чьё поле-источник (корень в ответе AniList,
+    sources: поле модели -> поле AniList) есть в ответе. Модель из них
+    помнит, какие поля заданы, — как при model_validate(ответ) у media
+    """
+    return {name: value for name, value in values.items() if name not in sources or sources[name] in data}
+
+
+def sparse_json(model: BaseModel, requested: frozenset[str] | None) -> BaseModel | Response:
+    """
+    При ?fields= в ответе только заданные поля (exclude_unset, как у media);
+    без него — модель как есть, через response_model
+    """
+    if requested is None:
+        return model
+    return Response(model.model_dump_json(exclude_unset=True), media_type="application/json")
@@ -0,0 +1,55 @@
+import hashlib
+from typing import Callable
+
+from fastapi import Request, Response
+
+from app.services.anilist_service import response_cache
+from app.services.cache import CacheEntry
+
+
+def make_etag(body: bytes) -> str:
+    # сильный ETag: хэш готового тела ответа
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def rendered(entry: CacheEntry, variant: str, render: Callable[[], bytes]) -> tuple[bytes, str]:
+    """
+    Готовое тело ответа, привязанное к записи кэша AniList.
+
+    render() (валидация + сериализация) вызывается один раз на запись
+    и вариант; пока запись жива, повторные запросы отдают те же байты
+    """
+    if entry.rendered is not None and variant in entry.rendered:
+        return entry.rendered[variant]
+
+    body = render()
+    result = (body, make_etag(body))
+
+    if entry.rendered is None:
+        entry.rendered = {}
+    entry.rendered[variant] = result
+    response_cache.grow(entry, len(body))
+
+    return result
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match сравнивается слабо: W/"x" совпадает с "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def cached_json_response(request: Request, body: bytes, etag: str, max_age: float) -> Response:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={int(max_age)}" if max_age >= 1 else "no-cache",
+    }
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,56 @@
+import json
+import logging
+from typing import AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+NDJSON = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    """
+    Клиент просит поток (Accept: application/x-ndjson) вместо одного JSON
+    """
+    return NDJSON in request.headers.get("accept", "")
+
+
+def _line(item: BaseModel, exclude_unset: bool) -> bytes:
+    # как сериализует FastAPI для response_model
+    return item.model_dump_json(by_alias=True, exclude_unset=exclude_unset).encode() + b"\n"
+
+
+async def ndjson_response(items: AsyncIterator[BaseModel], exclude_unset: bool = False) -> StreamingResponse:
+    """
+    Потоковый ответ: строка JSON на элемент, уходит клиенту сразу,
+    как элемент провалидирован, — весь список в памяти не собирается.
+
+    Первый элемент ждём до отправки заголовков: ошибка до начала потока
+    (квота AniList, 404) поднимается обычным исключением и становится
+    HTTP-статусом у вызывающего. Ошибка посреди потока — последняя
+    строка {"error": ...}: статус 200 уже отправлен.
+    exclude_unset — только заданные поля (ответ на ?fields=)
+    """
+    try:
+        first = await anext(items)
+    except StopAsyncIteration:
+        first = None
+
+    async def body():
+        try:
+            if first is None:
+                return
+            yield _line(first, exclude_unset)
+            async for item in items:
+                yield _line(item, exclude_unset)
+        except Exception:
+            logger.exception("Ошибка посреди NDJSON-потока")
+            yield json.dumps({"error": "Поток прерван: ошибка при запросе к AniList"}, ensure_ascii=False).encode() + b"\n"
+        finally:
+            # клиент ушёл — останавливаем генератор (и его загрузки страниц)
+            await items.aclose()
+
+    return StreamingResponse(body(), media_type=NDJSON)
@@ -0,0 +1,295 @@
+import os
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(name, default)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ─────────────────────────────────────────────────────────────
+# AniList upstream
+# ─────────────────────────────────────────────────────────────
+
+ANILIST_API_URL = _env_str("ANILIST_API_URL", "https://graphql.anilist.co")
+
+# ─────────────────────────────────────────────────────────────
+# HTTP клиент (общий пул соединений на всё приложение)
+# ─────────────────────────────────────────────────────────────
+
+HTTP_TIMEOUT = _env_float("HTTP_TIMEOUT", 20.0)
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 5.0)
+HTTP_POOL_TIMEOUT = _env_float("HTTP_POOL_TIMEOUT", 5.0)
+HTTP_MAX_CONNECTIONS = _env_int("HTTP_MAX_CONNECTIONS", 20)
+HTTP_MAX_KEEPALIVE = _env_int("HTTP_MAX_KEEPALIVE", 10)
+HTTP_KEEPALIVE_EXPIRY = _env_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+# HTTP/2 включается только если установлен пакет h2 (httpx[http2])
+HTTP2_ENABLED = _env_bool("HTTP2_ENABLED", True)
+
+# ─────────────────────────────────────────────────────────────
+# Кэш ответов AniList (в памяти процесса)
+# ─────────────────────────────────────────────────────────────
+
+CACHE_MAX_BYTES = _env_int("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+# "не найдено" кэшируем коротко, чтобы не долбить AniList несуществующими id
+CACHE_NEGATIVE_TTL = _env_int("CACHE_NEGATIVE_TTL", 60)
+
+# TTL в секундах по имени .gql файла, 0 — не кэшировать.
+# Переопределяется через CACHE_TTL_<ИМЯ>, например CACHE_TTL_MEDIA_DETAILS=600
+_DEFAULT_CACHE_TTLS = {
+    "current_season": 600,
+    "media_details": 1800,
+    "character": 3600,
+    "character_voice_actors": 3600,
+    "staff": 3600,
+    "today_birthday": 3600,
+    "user_profile": 300,
+    # профиль с догруженным избранным (все страницы до favourites_limit)
+    "user_profile_full": 300,
+    "search": 3600,
+    # адрес картинки, если её нет в хранилище сущностей (/img)
+    "entity_image": 24 * 60 * 60,
+    # профиль по токену — персональные данные, не кэшируем
+    "viewer_profile": 0,
+    # пачки импорта списков: каждая читается один раз, сущности разбирает импорт
+    "list_collection": 0,
+}
+CACHE_TTLS = {
+    name: _env_int(f"CACHE_TTL_{name.upper()}", ttl)
+    for name, ttl in _DEFAULT_CACHE_TTLS.items()
+}
+CACHE_DEFAULT_TTL = _env_int("CACHE_DEFAULT_TTL", 0)
+
+# ─────────────────────────────────────────────────────────────
+# Refresh-ahead: обновление горячих ключей до истечения TTL
+# ─────────────────────────────────────────────────────────────
+
+REFRESH_AHEAD_ENABLED = _env_bool("REFRESH_AHEAD_ENABLED", True)
+# запросы (имена .gql), ключи которых обновляем заранее.
+# today_birthday не включаем: его страницы читает только раз в сутки
+# построение индекса дней рождения, и обновление всех страниц каждый
+# TTL тратило бы квоту на данные, которые никто не запрашивает
+REFRESH_AHEAD_NAMES = frozenset(
+    name.strip()
+    for name in _env_str("REFRESH_AHEAD_NAMES", "current_season,media_details").split(",")
+    if name.strip()
+)
+# доля квоты AniList в минуту, которую можно тратить на обновления
+REFRESH_AHEAD_RATE_SHARE = _env_float("REFRESH_AHEAD_RATE_SHARE", 0.2)
+# за какую долю TTL до истечения обновлять
+REFRESH_AHEAD_LEAD = _env_float("REFRESH_AHEAD_LEAD", 0.1)
+# случайный сдвиг момента обновления: lead * [1 - jitter, 1]
+REFRESH_AHEAD_JITTER = _env_float("REFRESH_AHEAD_JITTER", 0.5)
+# ключ горячий, если к нему обращались хотя бы столько раз за период полураспада
+REFRESH_AHEAD_MIN_HITS = _env_float("REFRESH_AHEAD_MIN_HITS", 3.0)
+REFRESH_AHEAD_HALF_LIFE = _env_float("REFRESH_AHEAD_HALF_LIFE", 600.0)
+# сколько секунд после истечения запись ещё отдаётся, пока идёт обновление
+REFRESH_AHEAD_STALE = _env_float("REFRESH_AHEAD_STALE", 120.0)
+# сколько ключей отслеживаем (LRU)
+REFRESH_AHEAD_MAX_KEYS = _env_int("REFRESH_AHEAD_MAX_KEYS", 10_000)
+# как часто проверяем, что пора обновить, секунд
+REFRESH_AHEAD_INTERVAL = _env_float("REFRESH_AHEAD_INTERVAL", 1.0)
+
+# ─────────────────────────────────────────────────────────────
+# Планировщик запросов к AniList (rate limit)
+# ─────────────────────────────────────────────────────────────
+
+# квота AniList в минуту; уточняется по заголовку X-RateLimit-Limit
+ANILIST_RATE_PER_MINUTE = _env_int("ANILIST_RATE_PER_MINUTE", 90)
+# сколько запросов можно отправить подряд без ожидания
+ANILIST_BURST = _env_int("ANILIST_BURST", 15)
+# максимальная длина очереди ожидающих запросов
+SCHEDULER_MAX_QUEUE = _env_int("SCHEDULER_MAX_QUEUE", 200)
+# сколько секунд запрос каждого приоритета готов ждать слот
+SCHEDULER_DEADLINE_INTERACTIVE = _env_float("SCHEDULER_DEADLINE_INTERACTIVE", 5.0)
+SCHEDULER_DEADLINE_BACKGROUND = _env_float("SCHEDULER_DEADLINE_BACKGROUND", 30.0)
+SCHEDULER_DEADLINE_REFRESH = _env_float("SCHEDULER_DEADLINE_REFRESH", 60.0)
+
+# ─────────────────────────────────────────────────────────────
+# Пакетная загрузка медиа (/media/batch)
+# ─────────────────────────────────────────────────────────────
+
+# максимум id в одном запросе к нашему API
+MEDIA_BATCH_MAX_IDS = _env_int("MEDIA_BATCH_MAX_IDS", 50)
+# сколько Media(id) в одном GraphQL документе: media_details тяжёлый
+# (50 персонажей, стафф, связи), а лимит сложности AniList — 500
+MEDIA_BATCH_CHUNK = _env_int("MEDIA_BATCH_CHUNK", 5)
+
+# ─────────────────────────────────────────────────────────────
+# Избранное в профиле пользователя (/user)
+# ─────────────────────────────────────────────────────────────
+
+# сколько записей избранного на связь (anime, manga, ...) отдаём по умолчанию
+USER_FAVOURITES_LIMIT = _env_int("USER_FAVOURITES_LIMIT", 250)
+# верхняя граница параметра favourites_limit
+USER_FAVOURITES_MAX = _env_int("USER_FAVOURITES_MAX", 1000)
+# сколько запросов страниц избранного идут к AniList одновременно
+USER_FAVOURITES_CONCURRENCY = _env_int("USER_FAVOURITES_CONCURRENCY", 3)
+# сколько страниц (корней с алиасами) склеиваем в один GraphQL документ
+USER_FAVOURITES_ROOTS_PER_REQUEST = _env_int("USER_FAVOURITES_ROOTS_PER_REQUEST", 6)
+
+# ─────────────────────────────────────────────────────────────
+# Префетч связанных сущностей после просмотра тайтла
+# ─────────────────────────────────────────────────────────────
+
+# выключен по умолчанию: тратит квоту AniList на догадки
+PREFETCH_ENABLED = _env_bool("PREFETCH_ENABLED", False)
+# сколько запросов к AniList в минуту префетч может потратить
+PREFETCH_PER_MINUTE = _env_int("PREFETCH_PER_MINUTE", 20)
+# максимум сущностей, прогреваемых после одного просмотра
+PREFETCH_MAX_FANOUT = _env_int("PREFETCH_MAX_FANOUT", 6)
+# из них: связанных тайтлов (сиквел, приквел, ...), персонажей, стаффа
+PREFETCH_RELATIONS = _env_int("PREFETCH_RELATIONS", 3)
+PREFETCH_CHARACTERS = _env_int("PREFETCH_CHARACTERS", 2)
+PREFETCH_STAFF = _env_int("PREFETCH_STAFF", 1)
+# сколько секунд после прогрева открытие сущности считается попаданием
+PREFETCH_TRACK_SECONDS = _env_int("PREFETCH_TRACK_SECONDS", 600)
+
+# ─────────────────────────────────────────────────────────────
+# Потоковые ответы списков (Accept: application/x-ndjson)
+# ─────────────────────────────────────────────────────────────
+
+# сколько страниц AniList максимум дочитывает один поток (работы стаффа и т.п.)
+NDJSON_MAX_PAGES = _env_int("NDJSON_MAX_PAGES", 20)
+
+# ─────────────────────────────────────────────────────────────
+# Локальные данные (индексы, снапшоты)
+# ─────────────────────────────────────────────────────────────
+
+DATA_DIR = _env_str("DATA_DIR", "data")
+
+# ─────────────────────────────────────────────────────────────
+# Индекс дней рождения персонажей
+# ─────────────────────────────────────────────────────────────
+
+# сколько самых популярных (по избранному) персонажей индексируем
+BIRTHDAY_INDEX_TOP_N = _env_int("BIRTHDAY_INDEX_TOP_N", 2500)
+# как часто перестраивать индекс, секунд
+BIRTHDAY_INDEX_REFRESH = _env_int("BIRTHDAY_INDEX_REFRESH", 24 * 60 * 60)
+# сколько страниц AniList качаем параллельно при построении
+BIRTHDAY_INDEX_CONCURRENCY = _env_int("BIRTHDAY_INDEX_CONCURRENCY", 4)
+
+# ─────────────────────────────────────────────────────────────
+# Снапшоты каталога сезонов
+# ─────────────────────────────────────────────────────────────
+
+# как часто обновлять снапшот сезона в фоне, секунд
+SEASON_SNAPSHOT_REFRESH = _env_int("SEASON_SNAPSHOT_REFRESH", 30 * 60)
+# снапшоты, к которым не обращались дольше, не обновляются и удаляются
+SEASON_SNAPSHOT_IDLE = _env_int("SEASON_SNAPSHOT_IDLE", 6 * 60 * 60)
+# сколько снапшотов держим в памяти (лишние вытесняются по LRU):
+# любой (season, year) — это полная выкачка каталога
+SEASON_SNAPSHOT_MAX = _env_int("SEASON_SNAPSHOT_MAX", 16)
+# сколько страниц каталога качаем параллельно
+SEASON_SNAPSHOT_CONCURRENCY = _env_int("SEASON_SNAPSHOT_CONCURRENCY", 4)
+
+# ─────────────────────────────────────────────────────────────
+# Дисковый уровень кэша (SQLite, переживает рестарты)
+# ─────────────────────────────────────────────────────────────
+
+DISK_CACHE_ENABLED = _env_bool("DISK_CACHE_ENABLED", True)
+DISK_CACHE_PATH = _env_str("DISK_CACHE_PATH", os.path.join(DATA_DIR, "anilist_cache.sqlite3"))
+DISK_CACHE_MAX_BYTES = _env_int("DISK_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+# как часто сбрасывать отложенные записи на диск, секунд
+DISK_CACHE_FLUSH_INTERVAL = _env_float("DISK_CACHE_FLUSH_INTERVAL", 1.0)
+# сколько байт самых горячих записей поднимать в память при старте
+DISK_CACHE_WARM_BYTES = _env_int("DISK_CACHE_WARM_BYTES", CACHE_MAX_BYTES // 2)
+# файл общий для воркеров (uvicorn --workers N): промах грузит из AniList
+# один воркер, остальные ждут его результат
+DISK_CACHE_SHARED = _env_bool("DISK_CACHE_SHARED", True)
+# на сколько секунд воркер арендует ключ на время загрузки
+# (дольше дедлайна планировщика + HTTP таймаута — иначе двойная загрузка)
+DISK_CACHE_LEASE_TTL = _env_float("DISK_CACHE_LEASE_TTL", 30.0)
+
+# ─────────────────────────────────────────────────────────────
+# Списки просмотра (SQLite)
+# ─────────────────────────────────────────────────────────────
+
+WATCHLIST_PATH = _env_str("WATCHLIST_PATH", os.path.join(DATA_DIR, "watchlist.sqlite3"))
+# как часто сбрасывать накопленные изменения прогресса, секунд
+WATCHLIST_FLUSH_INTERVAL = _env_float("WATCHLIST_FLUSH_INTERVAL", 0.5)
+# потоков (и соединений) на чтение
+WATCHLIST_READERS = _env_int("WATCHLIST_READERS", 4)
+# максимум записей на страницу списка
+WATCHLIST_PAGE_MAX = _env_int("WATCHLIST_PAGE_MAX", 100)
+# импорт списков AniList: записей на пачку (максимум AniList — 500)
+LIST_IMPORT_PER_CHUNK = _env_int("LIST_IMPORT_PER_CHUNK", 500)
+# повторов пачки при ошибке AniList, прежде чем импорт встанет
+LIST_IMPORT_RETRIES = _env_int("LIST_IMPORT_RETRIES", 3)
+# воркер, не отмечавшийся в задаче импорта столько секунд, считается упавшим:
+# его задачу может перехватить другой воркер
+LIST_IMPORT_LEASE_TTL = _env_float("LIST_IMPORT_LEASE_TTL", 120.0)
+
+# ─────────────────────────────────────────────────────────────
+# Нормализованное хранилище сущностей (Media / Character / Staff)
+# ─────────────────────────────────────────────────────────────
+
+# максимум записей каждого типа, дальше вытесняются самые старые
+ENTITY_STORE_MAX_PER_TYPE = _env_int("ENTITY_STORE_MAX_PER_TYPE", 200_000)
+
+# ─────────────────────────────────────────────────────────────
+# Прокси картинок (/img/{kind}/{id}?w=)
+# ─────────────────────────────────────────────────────────────
+
+IMAGE_CACHE_PATH = _env_str("IMAGE_CACHE_PATH", os.path.join(DATA_DIR, "images"))
+IMAGE_CACHE_MAX_BYTES = _env_int("IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+# каталог общий для воркеров: как часто пересобирать индекс сканом
+# (файлы и вытеснения других воркеров), секунд
+IMAGE_CACHE_RESCAN_INTERVAL = _env_float("IMAGE_CACHE_RESCAN_INTERVAL", 300.0)
+# ширины, к которым округляется ?w= (вверх): ограничивает число копий
+IMAGE_WIDTHS = tuple(sorted(int(w) for w in _env_str("IMAGE_WIDTHS", "100,200,300,460,700").split(",")))
+IMAGE_WEBP_QUALITY = _env_int("IMAGE_WEBP_QUALITY", 80)
+# процессов для уменьшения картинок (нужен Pillow, без него отдаём оригиналы)
+IMAGE_WORKERS = _env_int("IMAGE_WORKERS", 2)
+# оригиналы больше этого не качаем
+IMAGE_MAX_SOURCE_BYTES = _env_int("IMAGE_MAX_SOURCE_BYTES", 10 * 1024 * 1024)
+# Cache-Control max-age ответов прокси по ссылке с актуальной версией
+# (?v=, меняется вместе с картинкой), секунд
+IMAGE_MAX_AGE = _env_int("IMAGE_MAX_AGE", 30 * 24 * 60 * 60)
+# ... без версии или с устаревшей: картинка по той же ссылке может смениться
+IMAGE_REVALIDATE_MAX_AGE = _env_int("IMAGE_REVALIDATE_MAX_AGE", 10 * 60)
+# откуда прокси качает оригиналы
+IMAGE_ALLOWED_HOSTS = frozenset(_env_str("IMAGE_ALLOWED_HOSTS", "s4.anilist.co,img.anili.st").split(","))
+# база ссылок на прокси в ответах API (cover_image_url и т.п.), например
+# https://api.example.com/img; пусто — ссылки ведут прямо на CDN AniList
+IMAGE_PROXY_URL = _env_str("IMAGE_PROXY_URL", "")
+# ширина постера в карточках списков (MediaShort)
+IMAGE_CARD_WIDTH = _env_int("IMAGE_CARD_WIDTH", 300)
+
+# ─────────────────────────────────────────────────────────────
+# Логирование
+# ─────────────────────────────────────────────────────────────
+
+LOG_LEVEL = _env_str("LOG_LEVEL", "INFO")
+# "text" или "json" (одна строка JSON на запись — для сборщиков логов)
+LOG_FORMAT = _env_str("LOG_FORMAT", "text")
+# тела запросов/ответов AniList: каждый N-й запрос (0 — выключено)
+LOG_PAYLOAD_SAMPLE_EVERY = _env_int("LOG_PAYLOAD_SAMPLE_EVERY", 0)
+# ... и все запросы медленнее порога, мс (0 — выключено)
+LOG_PAYLOAD_SLOW_MS = _env_int("LOG_PAYLOAD_SLOW_MS", 0)
+# обрезать тело в логе до стольких символов
+LOG_PAYLOAD_MAX_CHARS = _env_int("LOG_PAYLOAD_MAX_CHARS", 4000)
+
+# ─────────────────────────────────────────────────────────────
+# Запись / воспроизведение ответов AniList (офлайн-зеркало)
+# ─────────────────────────────────────────────────────────────
+
+# live — обычная работа; record — работаем вживую и сохраняем ответы;
+# replay — отвечаем только из записей, без сети
+ANILIST_TRANSPORT = _env_str("ANILIST_TRANSPORT", "live").lower()
+ANILIST_RECORDINGS_PATH = _env_str("ANILIST_RECORDINGS_PATH", os.path.join(DATA_DIR, "anilist_recordings.sqlite3"))
@@ -1,3 +1,4 @@
+import re
 from pathlib import Path
 from functools import lru_cache
 
@@ -7,6 +8,14 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 # app/api/v1/graphql_queries
 GQL_DIR = BASE_DIR / "api" / "v1" / "graphql_queries"
 
+OPERATION_RE = re.compile(r"^\s*(?:query|mutation)\s+(\w+)")
+
+# текст запроса -> имя .gql файла (для TTL кэша и метрик)
+_QUERY_NAMES: dict[str, str] = {}
+# имя операции -> имя .gql файла: по нему имя наследуют sparse-варианты
+# (их тексты не запоминаем — набор ?fields= задаёт клиент)
+_OPERATION_NAMES: dict[str, str] = {}
+
 
 @lru_cache
 def gql(name: str) -> str:
@@ -19,4 +28,282 @@ def gql(name: str) -> str:
     if not path.exists():
         raise FileNotFoundError(f"GraphQL file not found: {path}")
 
-    return path.read_text(encoding="utf-8")
+    query = path.read_text(encoding="utf-8")
+    _QUERY_NAMES[query] = name
+    _OPERATION_NAMES[operation_name(query)] = name
+    return query
+
+
+@lru_cache(maxsize=256)
+def operation_name(query: str) -> str:
+    """
+    Имя операции из текста запроса: "query MediaDetails(...)" -> "MediaDetails"
+    """
+    match = OPERATION_RE.match(query)
+    return match.group(1) if match else "anonymous"
+
+
+def query_name(query: str) -> str:
+    """
+    Имя .gql файла, из которого загружен запрос, иначе имя операции
+    """
+    name = _QUERY_NAMES.get(query)
+    if name is not None:
+        return name
+    operation = operation_name(query)
+    return _OPERATION_NAMES.get(operation) or operation
+
+
+def _matching_brace(text: str, start: int) -> int:
+    """
+    Индекс закрывающей скобки для "{" в позиции start
+    """
+    depth = 0
+    in_string = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if ch == '"' and text[i - 1] != "\\":
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("Unbalanced braces in GraphQL document")
+
+
+@lru_cache(maxsize=64)
+def selection_set(query: str, field: str) -> str:
+    """
+    Тело выборки корневого поля без внешних скобок:
+    selection_set(gql("media_details"), "Media") -> "id type source ..."
+    """
+    match = re.search(rf"\b{re.escape(field)}\s*(\([^)]*\))?\s*{{", query)
+    if not match:
+        raise ValueError(f"Field {field} not found in GraphQL document")
+
+    start = match.end() - 1
+    return query[start + 1:_matching_brace(query, start)]
+
+
+# ─────────────────────────────────────────────────────────────
+# Sparse fieldsets: обрезка выборки запроса до нужных полей
+# ─────────────────────────────────────────────────────────────
+
+FIELD_PATH_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+VARIABLE_RE = re.compile(r"\$(\w+)")
+NAME_RE = re.compile(r"\w+")
+DIRECTIVE_RE = re.compile(r"@\w+")
+
+# максимум путей в ?fields=
+MAX_FIELD_PATHS = 50
+
+
+class Selection:
+    __slots__ = ("head", "name", "children")
+
+    def __init__(self, head: str, name: str, children: "list[Selection] | None"):
+        self.head = head            # "alias: name(args) @directives" как в исходнике
+        self.name = name            # имя для путей: алиас, если есть
+        self.children = children    # None — скалярное поле
+
+    def render(self, indent: str = "  ") -> str:
+        if self.children is None:
+            return indent + self.head
+        inner = "\n".join(child.render(indent + "  ") for child in self.children)
+        return f"{indent}{self.head} {{\n{inner}\n{indent}}}"
+
+
+def _skip_ignored(text: str, i: int) -> int:
+    while i < len(text):
+        if text[i] in " \t\r\n,":
+            i += 1
+        elif text[i] == "#":
+            while i < len(text) and text[i] != "\n":
+                i += 1
+        else:
+            break
+    return i
+
+
+def _balanced(text: str, i: int, open_ch: str, close_ch: str) -> int:
+    """
+    Индекс после закрывающей скобки для open_ch в позиции i
+    """
+    depth = 0
+    in_string = False
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                i += 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == open_ch:
+            depth += 1
+        elif ch == close_ch:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    raise ValueError("Unbalanced GraphQL document")
+
+
+def _parse_selections(text: str, i: int) -> tuple[list[Selection], int]:
+    """
+    Разбирает выборку начиная с "{" в позиции i
+    """
+    selections = []
+    i = _skip_ignored(text, i + 1)
+
+    while text[i] != "}":
+        start = i
+        match = NAME_RE.match(text, i)
+        if not match:
+            raise ValueError(f"Unexpected GraphQL token at {i}: {text[i:i + 20]!r}")
+        name = match.group()
+        i = _skip_ignored(text, match.end())
+
+        # alias: field
+        if text[i] == ":":
+            i = _skip_ignored(text, i + 1)
+            match = NAME_RE.match(text, i)
+            i = _skip_ignored(text, match.end())
+
+        if text[i] == "(":
+            i = _skip_ignored(text, _balanced(text, i, "(", ")"))
+
+        while text[i] == "@":
+            match = DIRECTIVE_RE.match(text, i)
+            i = _skip_ignored(text, match.end())
+            if text[i] == "(":
+                i = _skip_ignored(text, _balanced(text, i, "(", ")"))
+
+        head = " ".join(text[start:i].split())
+        if text[i] == "{":
+            children, i = _parse_selections(text, i)
+            selections.append(Selection(head, name, children))
+        else:
+            selections.append(Selection(head, name, None))
+
+        i = _skip_ignored(text, i)
+
+    return selections, i + 1
+
+
+def root_selections(query: str) -> list[Selection]:
+    """
+    Корневые поля операции с вложенными выборками
+    """
+    selections, _ = _parse_selections(query, query.index("{"))
+    return selections
+
+
+def _prune(selections: list[Selection], paths: list[tuple[str, ...]], prefix: str, unknown: set[str]) -> list[Selection]:
+    wanted: dict[str, list[tuple[str, ...]]] = {}
+    for path in paths:
+        wanted.setdefault(path[0], []).append(path[1:])
+
+    by_name = {selection.name: selection for selection in selections}
+    for name in wanted:
+        if name not in by_name:
+            unknown.add(prefix + name)
+
+    result = []
+    for selection in selections:
+        rest = wanted.get(selection.name)
+        if rest is None:
+            # id оставляем всегда — по нему нормализуются сущности
+            if selection.name == "id":
+                result.append(selection)
+            continue
+
+        # запрошено поле целиком — берём всю его выборку
+        if any(not tail for tail in rest) or selection.children is None:
+            if any(tail for tail in rest) and selection.children is None:
+                unknown.add(prefix + selection.name + "." + next(tail for tail in rest if tail)[0])
+            result.append(selection)
+            continue
+
+        children = _prune(selection.children, rest, f"{prefix}{selection.name}.", unknown)
+        result.append(Selection(selection.head, selection.name, children))
+
+    return result
+
+
+def parse_fields(raw: str | None) -> frozenset[str] | None:
+    """
+    "title, coverImage,characters.edges.node.name" -> frozenset путей
+    """
+    if raw is None or not raw.strip():
+        return None
+
+    fields = frozenset(part.strip() for part in raw.split(",") if part.strip())
+    if len(fields) > MAX_FIELD_PATHS:
+        raise ValueError(f"Too many fields (max {MAX_FIELD_PATHS})")
+
+    for field in fields:
+        if not FIELD_PATH_RE.match(field):
+            raise ValueError(f"Invalid field path: {field}")
+
+    return fields
+
+
+@lru_cache(maxsize=256)
+def sparse_query(query: str, root: str, fields: frozenset[str]) -> str:
+    """
+    Вариант запроса, в котором у корневого поля root оставлены только
+    пути fields (и id). Неиспользуемые переменные убираются из заголовка.
+    Скомпилированные варианты кэшируются; ValueError — неизвестное поле
+    """
+    brace = query.index("{")
+    header = query[:brace].strip()
+    selections, _ = _parse_selections(query, brace)
+
+    unknown: set[str] = set()
+    pruned = []
+    for selection in selections:
+        if selection.name == root and selection.children is not None:
+            paths = [tuple(field.split(".")) for field in fields]
+            selection = Selection(selection.head, selection.name, _prune(selection.children, paths, "", unknown))
+        pruned.append(selection)
+
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    body = "\n".join(selection.render() for selection in pruned)
+
+    # GraphQL запрещает объявленные, но неиспользуемые переменные
+    used = set(VARIABLE_RE.findall(body))
+    header_match = re.match(r"^(\w+\s+\w+)\s*(\((.*)\))?$", header, re.S)
+    if header_match and header_match.group(3):
+        definitions = [
+            definition.strip()
+            for definition in re.split(r",(?=\s*\$)", header_match.group(3))
+            if definition.strip()
+        ]
+        kept = [d for d in definitions if VARIABLE_RE.match(d).group(1) in used]
+        header = header_match.group(1) + (f"({', '.join(kept)})" if kept else "")
+
+    # вариант сохраняет имя операции — и через него имя исходного .gql
+    # (TTL кэша, метрики)
+    return f"{header} {{\n{body}\n}}\n"
+
+
+@lru_cache(maxsize=256)
+def declared_variables(query: str) -> frozenset[str]:
+    brace = query.index("{")
+    return frozenset(VARIABLE_RE.findall(query[:brace]))
+
+
+def filter_variables(query: str, variables: dict) -> dict:
+    """
+    Только переменные, объявленные в запросе
+    """
+    declared = declared_variables(query)
+    return {name: value for name, value in variables.items() if name in declared}
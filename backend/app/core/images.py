@@ -0,0 +1,32 @@
+import hashlib
+from urllib.parse import urlencode
+
+from app.core import config
+
+
+def image_version(source_url: str) -> str:
+    """
+    Короткий хэш адреса оригинала: сменилась картинка — сменилась версия
+    (и имя файла в кэше прокси)
+    """
+    return hashlib.blake2b(source_url.encode(), digest_size=12).hexdigest()
+
+
+def proxy_image_url(kind: str, entity_id: int, width: int | None = None, source: str | None = None) -> str | None:
+    """
+    URL картинки через прокси /img (уменьшенная копия с нашим кэшем);
+    None — прокси в ссылках выключен (IMAGE_PROXY_URL не задан).
+
+    source — известный адрес оригинала: ссылка получает ?v= с его
+    версией и кэшируется клиентом надолго; без него — короткий max-age
+    """
+    base = config.IMAGE_PROXY_URL
+    if not base:
+        return None
+    params = {}
+    if width:
+        params["w"] = width
+    if source:
+        params["v"] = image_version(source)
+    url = f"{base.rstrip('/')}/{kind}/{entity_id}"
+    return f"{url}?{urlencode(params)}" if params else url
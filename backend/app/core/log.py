@@ -0,0 +1,153 @@
+"""
+Логирование: correlation id запроса, ленивая сериализация тел и
+сэмплирование payload'ов AniList.
+
+Тело ответа AniList сериализуется только если запись реально будет
+выведена: LazyJSON превращается в строку в Formatter, а не в месте вызова.
+"""
+import itertools
+import json
+import logging
+import uuid
+from contextvars import ContextVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import config
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# id входящего запроса; наследуется asyncio-задачами, созданными внутри него
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class LazyJSON:
+    """
+    json.dumps(value), вызванный только при форматировании записи,
+    с обрезкой до max_chars.
+    """
+
+    __slots__ = ("value", "max_chars")
+
+    def __init__(self, value, max_chars: int = 0):
+        self.value = value
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        if isinstance(self.value, (bytes, bytearray)):
+            text = self.value.decode("utf-8", "replace")
+        else:
+            text = json.dumps(self.value, ensure_ascii=False, indent=2)
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}… ({len(text)} символов)"
+        return text
+
+
+class PayloadSampler:
+    """
+    Какие запросы к AniList логировать целиком:
+    - все, если логгер включён на DEBUG;
+    - каждый N-й (every), если логгер включён на INFO;
+    - все медленнее slow_ms.
+    """
+
+    def __init__(self, logger: logging.Logger, every: int = 0, slow_ms: int = 0, max_chars: int = 0):
+        self.logger = logger
+        self.every = every
+        self.slow = slow_ms / 1000
+        self.max_chars = max_chars
+        self._counter = itertools.count(1)
+
+    def sampled(self) -> bool:
+        """
+        Решение до запроса (тело запроса логируем вместе с ответом)
+        """
+        if self.logger.isEnabledFor(logging.DEBUG):
+            return True
+        return bool(self.every) and next(self._counter) % self.every == 0
+
+    def emit(self, operation: str, variables: dict, body, elapsed: float, sampled: bool) -> None:
+        slow = bool(self.slow) and elapsed >= self.slow
+        if not (sampled or slow) or not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.log(
+            logging.WARNING if slow else logging.INFO,
+            "AniList %s %.1f мс\nvariables: %s\nresponse: %s",
+            operation,
+            elapsed * 1000,
+            LazyJSON(variables, self.max_chars),
+            LazyJSON(body, self.max_chars),
+        )
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна строка JSON на запись
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging() -> None:
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    if config.LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+        ))
+
+    app_logger = logging.getLogger("app")
+    app_logger.handlers[:] = [handler]
+    app_logger.setLevel(config.LOG_LEVEL.upper())
+    app_logger.propagate = False
+
+
+class RequestIdMiddleware:
+    """
+    Берёт X-Request-ID из запроса (или генерирует) и возвращает его
+    в ответе; все логи, в том числе вызовы AniList, помечены этим id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex[:16]
+        token = request_id.set(rid)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (REQUEST_ID_HEADER, rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
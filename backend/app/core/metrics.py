@@ -0,0 +1,274 @@
+"""
+Метрики в формате Prometheus без внешних зависимостей.
+
+Дочерние серии (набор значений меток) создаются один раз и дальше
+переиспользуются: на запрос — только инкременты счётчиков.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# границы бакетов латентности, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: tuple, child) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._children[()].dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def _render_child(self, values: tuple, child: _HistogramChild) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_number(bound) if bound != float("inf") else "+Inf"}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class StatsGauge(_Metric):
+    """
+    Числовые поля stats() компонентов (кэши, single-flight, планировщик)
+    одной серией: component_stat{component="cache",stat="hit_ratio"}.
+    Считается только при выгрузке /metrics.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        self._sources: dict[str, Callable[[], dict]] = {}
+        super().__init__(name, documentation, ("component", "stat"))
+
+    def _new_child(self):
+        return _Value()
+
+    def add(self, component: str, stats: Callable[[], dict]) -> None:
+        self._sources[component] = stats
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for component, stats in self._sources.items():
+            for stat, value in stats().items():
+                if isinstance(value, bool):
+                    value = int(value)
+                elif not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"{self.name}{_labels(self.labelnames, (component, stat))} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ─────────────────────────────────────────────────────────────
+# HTTP эндпоинты нашего API
+# ─────────────────────────────────────────────────────────────
+
+HTTP_REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "Латентность запросов к API по шаблону пути",
+    ("method", "route", "status"),
+))
+HTTP_REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight",
+    "Запросы к API в обработке",
+))
+COMPONENT_STATS = registry.register(StatsGauge(
+    "component_stat",
+    "Состояние внутренних компонентов: кэши, single-flight, планировщик",
+))
+
+# ─────────────────────────────────────────────────────────────
+# Upstream AniList
+# ─────────────────────────────────────────────────────────────
+
+UPSTREAM_LATENCY = registry.register(Histogram(
+    "anilist_request_duration_seconds",
+    "Латентность запросов к AniList по GraphQL операции",
+    ("operation",),
+))
+UPSTREAM_RESPONSES = registry.register(Counter(
+    "anilist_responses_total",
+    "Ответы AniList по операции и HTTP статусу",
+    ("operation", "status"),
+))
+UPSTREAM_ERRORS = registry.register(Counter(
+    "anilist_errors_total",
+    "Ошибки запросов к AniList (timeout, connection, json, rate_limited)",
+    ("operation", "kind"),
+))
+UPSTREAM_BYTES = registry.register(Counter(
+    "anilist_received_bytes_total",
+    "Байт получено от AniList",
+    ("operation",),
+))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge(
+    "anilist_requests_in_flight",
+    "Запросы к AniList в полёте",
+))
+
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: латентность и статусы по шаблону маршрута
+    ("/media/{media_type}/{media_id}"), а не по сырому пути —
+    иначе число серий растёт с каждым id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # роутер FastAPI кладёт сработавший маршрут в scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_LATENCY.labels(scope["method"], path, status).observe(time.perf_counter() - start)
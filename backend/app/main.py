@@ -1,15 +1,67 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 # Импортируем главный v1 роутер
 from app.api.v1.router import api_router
+from app.core.log import RequestIdMiddleware, configure_logging
+from app.core.metrics import COMPONENT_STATS, MetricsMiddleware, registry
+from app.services.anilist_service import disk_cache, inflight, refresh_ahead, response_cache, warm_from_disk
+from app.services.birthday_index import birthday_index
+from app.services.entity_store import entity_store
+from app.services.http_client import shutdown_client, startup_client
+from app.services.image_proxy import image_proxy
+from app.services.list_import import list_importer
+from app.services.prefetch import prefetcher
+from app.services.recorder import offline, recordings
+from app.services.scheduler import scheduler
+from app.services.search_index import search_index
+from app.services.season_catalog import season_catalog
+from app.services.watchlist import watchlist
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Один пул соединений к AniList на весь процесс
+    await startup_client()
+    # офлайн-режим: индекс записей в память до первого запроса
+    if offline():
+        await recordings.load()
+    # дисковый кэш: стартуем "тёплыми" после рестарта/деплоя
+    await disk_cache.start()
+    await warm_from_disk()
+    refresh_ahead.start()
+    birthday_index.start()
+    season_catalog.start()
+    await watchlist.start()
+    await list_importer.resume_interrupted()
+    await image_proxy.start()
+    try:
+        yield
+    finally:
+        await image_proxy.stop()
+        await prefetcher.stop()
+        await refresh_ahead.stop()
+        await list_importer.stop()
+        await watchlist.stop()
+        await season_catalog.stop()
+        await birthday_index.stop()
+        await disk_cache.stop()
+        await shutdown_client()
+        await recordings.stop()
+
 
 app = FastAPI(
     title="WordAnimation API",
     description="API для аниме, персонажей, сэйю и т.д.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS — разрешаем фронт (Vue/Vite на 5173)
@@ -27,6 +79,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Метрики запросов (внешний слой — меряем всё, включая CORS)
+app.add_middleware(MetricsMiddleware)
+# X-Request-ID: связывает логи входящего запроса и его вызовов AniList
+app.add_middleware(RequestIdMiddleware)
+
+COMPONENT_STATS.add("cache", response_cache.stats)
+COMPONENT_STATS.add("disk_cache", disk_cache.stats)
+COMPONENT_STATS.add("entities", entity_store.stats)
+COMPONENT_STATS.add("single_flight", inflight.stats)
+COMPONENT_STATS.add("refresh_ahead", refresh_ahead.stats)
+COMPONENT_STATS.add("scheduler", scheduler.stats)
+COMPONENT_STATS.add("recorder", recordings.stats)
+COMPONENT_STATS.add("search", search_index.stats)
+COMPONENT_STATS.add("watchlist", watchlist.stats)
+COMPONENT_STATS.add("list_import", list_importer.stats)
+COMPONENT_STATS.add("prefetch", prefetcher.stats)
+COMPONENT_STATS.add("images", image_proxy.stats)
+
 # Подключаем все v1 эндпоинты
 app.include_router(api_router)
 
@@ -37,4 +107,24 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "time": "OK"}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "time": "OK",
+        "cache": response_cache.stats(),
+        "disk_cache": disk_cache.stats(),
+        "entities": entity_store.stats(),
+        "single_flight": inflight.stats(),
+        "refresh_ahead": refresh_ahead.stats(),
+        "scheduler": scheduler.stats(),
+        "recorder": recordings.stats(),
+        "search": search_index.stats(),
+        "watchlist": watchlist.stats(),
+        "list_import": list_importer.stats(),
+        "prefetch": prefetcher.stats(),
+        "images": image_proxy.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    # text exposition format Prometheus
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,8 @@
 from pydantic import BaseModel, computed_field, Field
-from typing import Optional, Literal, List, Dict, Any
+from typing import Optional, Literal, List, Dict, Any, Union
+
+from app.core import config
+from app.core.images import proxy_image_url
 
 
 class VoiceActorName(BaseModel):
@@ -140,6 +143,9 @@ class FullAnimeDetails(BaseModel):
     @property
     def cover_image_url(self) -> str:
         """Всегда возвращает постер"""
+        proxied = proxy_image_url("cover", self.id, source=self.coverImage and (self.coverImage.extraLarge or self.coverImage.large))
+        if proxied:
+            return proxied
         if self.coverImage:
             return (
                 self.coverImage.extraLarge
@@ -177,6 +183,15 @@ class MediaShort(BaseModel):
     @computed_field
     @property
     def cover_image_url(self) -> str:
+        # карточки списков — уменьшенная копия через /img
+        proxied = proxy_image_url(
+            "cover",
+            self.id,
+            config.IMAGE_CARD_WIDTH,
+            source=self.coverImage and (self.coverImage.extraLarge or self.coverImage.large),
+        )
+        if proxied:
+            return proxied
         if self.coverImage:
             return (
                 self.coverImage.extraLarge
@@ -187,6 +202,95 @@ class MediaShort(BaseModel):
         return f"https://s4.anilist.co/file/anilistcdn/media/anime/cover/large/bx{self.id}.png"
 
 
+class SeasonCatalogPage(BaseModel):
+    season: str
+    year: int
+    page: int
+    per_page: int
+    total: int
+    has_next: bool
+    items: List[MediaShort] = Field(default_factory=list)
+
+
+class SearchResult(BaseModel):
+    query: str
+    source: Literal["local", "anilist"]
+    results: List[MediaShort] = Field(default_factory=list)
+
+
+WatchlistStatus = Literal["CURRENT", "PLANNING", "COMPLETED", "DROPPED", "PAUSED", "REPEATING"]
+
+
+class WatchlistUpdate(BaseModel):
+    # не передан — у существующей записи сохраняется, новая получает PLANNING
+    status: Optional[WatchlistStatus] = None
+    progress: Optional[int] = Field(None, ge=0)
+    score: Optional[float] = Field(None, ge=0, le=100)
+
+
+class WatchlistProgress(BaseModel):
+    progress: int = Field(..., ge=0)
+
+
+class WatchlistItem(BaseModel):
+    media_id: int
+    status: WatchlistStatus
+    progress: int = 0
+    score: Optional[float] = None
+    added_at: float
+    updated_at: float
+    media: Optional[MediaShort] = None
+    error: Optional[str] = None
+
+
+class MediaListEntry(BaseModel):
+    """
+    Запись MediaListCollection AniList (импорт списка)
+    """
+    mediaId: int
+    status: WatchlistStatus
+    progress: Optional[int] = 0
+    score: Optional[float] = None
+    createdAt: Optional[int] = None
+    updatedAt: Optional[int] = None
+
+
+class ListImportStatus(BaseModel):
+    user: str
+    type: Literal["ANIME", "MANGA"]
+    state: Literal["queued", "running", "done", "failed"]
+    chunks_done: int = 0
+    imported: int = 0
+    skipped: int = 0
+    error: Optional[str] = None
+    started_at: float
+    updated_at: float
+
+
+class WatchlistPage(BaseModel):
+    user: str
+    total: int
+    limit: int
+    offset: int
+    has_next: bool
+    items: List[WatchlistItem] = Field(default_factory=list)
+
+
+class MediaBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1)
+    view: Literal["full", "short"] = "full"
+
+
+class MediaBatchItem(BaseModel):
+    id: int
+    media: Optional[Union[FullAnimeDetails, MediaShort]] = None
+    error: Optional[str] = None
+
+
+class MediaBatchResponse(BaseModel):
+    items: List[MediaBatchItem] = Field(default_factory=list)
+
+
 class MediaMini(BaseModel):
     id: int
     title: Title
@@ -213,7 +317,21 @@ class CharacterDetails(BaseModel):
     anime_total: int = 0
     anime_has_next: bool = False
 
-    voice_actors: List[VoiceActorDTO] = Field(default_factory=list)
+
+class CharacterVoiceActor(VoiceActorDTO):
+    name_native: Optional[str] = None
+    # тайтлы страницы, в которых сэйю озвучивал персонажа
+    media_ids: List[int] = Field(default_factory=list)
+
+
+class CharacterVoiceActors(BaseModel):
+    character_id: int
+    language: Optional[str] = None
+    page: int
+    limit: int
+    media_total: int = 0
+    has_next: bool = False
+    voice_actors: List[CharacterVoiceActor] = Field(default_factory=list)
 
 
 class CharacterBirthday(BaseModel):
@@ -224,6 +342,8 @@ class CharacterBirthday(BaseModel):
     favourites: Optional[int] = None
     anime_title_romaji: Optional[str] = None
     anime_title_english: Optional[str] = None
+    month: Optional[int] = None
+    day: Optional[int] = None
 
 
 class StaffMediaMini(BaseModel):
@@ -287,7 +407,7 @@ class TitleShort(BaseModel):
     english: Optional[str] = None
 
 
-class MediaMini(BaseModel):
+class FavouriteMedia(BaseModel):
     id: int
     title: TitleShort
     coverImage: Optional[CoverImage] = None  
@@ -305,8 +425,8 @@ class CharacterMini(BaseModel):
 
 
 class UserFavourites(BaseModel):
-    anime: List[MediaMini] = Field(default_factory=list)
-    manga: List[MediaMini] = Field(default_factory=list)
+    anime: List[FavouriteMedia] = Field(default_factory=list)
+    manga: List[FavouriteMedia] = Field(default_factory=list)
     characters: List[CharacterMini] = Field(default_factory=list)
     staff: List[CharacterMini] = Field(default_factory=list)  
 
@@ -1,37 +1,345 @@
 import httpx
-import certifi
 import json
 import logging
+import time
+from typing import Awaitable, Callable
+
+from app.core import config
+from app.core.graphql import operation_name, query_name
+from app.core.log import PayloadSampler
+from app.core.metrics import (
+    UPSTREAM_BYTES,
+    UPSTREAM_ERRORS,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_LATENCY,
+    UPSTREAM_RESPONSES,
+)
+from app.services.cache import CacheEntry, ResponseCache, make_cache_key
+from app.services.disk_cache import DiskCache, DiskEntry
+from app.services.entity_store import entity_store
+from app.services.http_client import get_client
+from app.services.recorder import offline
+from app.services.refresh_ahead import RefreshAhead
+from app.services.scheduler import AniListRateLimited, Priority, scheduler
+from app.services.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
-ANILIST_API_URL = "https://graphql.anilist.co"
+ANILIST_API_URL = config.ANILIST_API_URL
+
+# сколько раз повторяем запрос после 429 (после паузы Retry-After)
+RATE_LIMIT_RETRIES = 1
+
+response_cache = ResponseCache(config.CACHE_MAX_BYTES)
+disk_cache = DiskCache(
+    config.DISK_CACHE_PATH,
+    max_bytes=config.DISK_CACHE_MAX_BYTES,
+    flush_interval=config.DISK_CACHE_FLUSH_INTERVAL,
+    enabled=config.DISK_CACHE_ENABLED,
+    shared=config.DISK_CACHE_SHARED,
+    lease_ttl=config.DISK_CACHE_LEASE_TTL,
+)
+inflight = SingleFlight()
+# тела запросов/ответов: сериализуются только если запись будет выведена
+payloads = PayloadSampler(
+    logging.getLogger("app.anilist.payloads"),
+    every=config.LOG_PAYLOAD_SAMPLE_EVERY,
+    slow_ms=config.LOG_PAYLOAD_SLOW_MS,
+    max_chars=config.LOG_PAYLOAD_MAX_CHARS,
+)
+
+
+def cache_ttl(name: str) -> int:
+    return config.CACHE_TTLS.get(name, config.CACHE_DEFAULT_TTL)
+
+
+def is_not_found(result: dict) -> bool:
+    """
+    404-подобный ответ: все корневые поля data пустые (Media: null и т.п.)
+    """
+    data = result.get("data")
+    return not data or all(value is None for value in data.values())
+
+
+def cached_result(query: str, variables: dict) -> dict | None:
+    """
+    Ответ из кэша без похода в AniList (None — промах)
+    """
+    name = query_name(query)
+    if cache_ttl(name) <= 0:
+        return None
+
+    entry = response_cache.get(make_cache_key(name, query, variables))
+    return entry.value if entry is not None else None
+
+
+def store_result(query: str, variables: dict, result: dict, size: int) -> None:
+    """
+    Кладёт в кэш ответ, полученный в обход anilist_query (например, из пакета)
+    """
+    name = query_name(query)
+    ttl = cache_ttl(name)
+    if ttl <= 0:
+        return
+
+    _store(make_cache_key(name, query, variables), name, ttl, result, size)
+
+
+def _store(
+    key: str,
+    name: str,
+    ttl: int,
+    result: dict,
+    size: int,
+    raw: bytes | None = None,
+) -> CacheEntry | None:
+    negative = is_not_found(result)
+    if negative:
+        ttl = config.CACHE_NEGATIVE_TTL
 
-HEADERS = {
-    "Content-Type": "application/json",
-    "Accept": "application/json",
-    "User-Agent": "JukeyAnime/1.0",
-}
+    entry = response_cache.set(key, result, size, ttl, negative=negative)
+    disk_cache.put(key, name, result, size, ttl, negative=negative, raw=raw)
 
+    if not negative:
+        entity_store.ingest(name, result)
 
-async def anilist_query(query: str, variables: dict | None = None) -> dict:
+    return entry
+
+
+async def warm_from_disk() -> int:
+    """
+    Поднимает в память самые горячие записи дискового кэша (при старте)
+    """
+    entries = await disk_cache.hottest(config.DISK_CACHE_WARM_BYTES)
+    for entry in entries:
+        response_cache.set(entry.key, entry.value, entry.size, entry.ttl, negative=entry.negative)
+        # ключ — "имя_запроса:хэш"; сущности (и поиск) тоже поднимаем
+        if not entry.negative:
+            entity_store.ingest(entry.key.partition(":")[0], entry.value)
+
+    if entries:
+        logger.info("Прогрев кэша с диска: %s записей", len(entries))
+    return len(entries)
+
+
+async def anilist_query(
+    query: str,
+    variables: dict | None = None,
+    *,
+    priority: Priority = Priority.INTERACTIVE,
+) -> dict:
+    """
+    Запрос к AniList через кэш ответов и планировщик rate limit.
+
+    Результат может быть общим для нескольких запросов — не мутировать.
+    При исчерпанной квоте бросает AniListRateLimited (подкласс RuntimeError).
+    """
+    entry = await anilist_query_entry(query, variables, priority=priority)
+    return entry.value
+
+
+async def anilist_query_entry(
+    query: str,
+    variables: dict | None = None,
+    *,
+    priority: Priority = Priority.INTERACTIVE,
+) -> CacheEntry:
+    """
+    То же, что anilist_query, но возвращает запись кэша: к ней можно
+    привязать готовое тело HTTP-ответа (entry.rendered)
+    """
     variables = variables or {}
 
+    name = query_name(query)
+    ttl = cache_ttl(name)
+    key = make_cache_key(name, query, variables) if ttl > 0 else None
+
+    # некэшируемые запросы (персональные) не склеиваем
+    if key is None:
+        result, raw = await _fetch(query, variables, priority)
+        return CacheEntry("", result, len(raw), 0.0, is_not_found(result))
+
+    # горячие ключи: истёкшая запись ещё отдаётся, пока идёт обновление
+    entry = response_cache.get(key, refresh_ahead.stale_for(name))
+    if entry is None:
+        entry = await inflight.do(key, lambda: _load(key, name, ttl, query, variables, priority))
+    else:
+        disk_cache.touch(key)
+
+    refresh_ahead.touch(key, name, query, variables, entry)
+    return entry
+
+
+async def composite_query_entry(
+    name: str,
+    query: str,
+    variables: dict,
+    build: Callable[[], Awaitable[dict]],
+) -> CacheEntry:
+    """
+    Результат, собранный из нескольких запросов к AniList (build), под
+    тем же кэшем, single-flight и TTL по name, что и обычные запросы:
+    дорогой веер запросов оплачивается один раз на TTL
+    """
+    ttl = cache_ttl(name)
+    if ttl <= 0:
+        result = await build()
+        return CacheEntry("", result, 0, 0.0, is_not_found(result))
+
+    key = make_cache_key(name, query, variables)
+    entry = response_cache.get(key)
+    if entry is not None:
+        disk_cache.touch(key)
+        return entry
+
+    async def load() -> CacheEntry:
+        disk_entry = await disk_cache.get(key)
+        if disk_entry is not None:
+            return _from_disk(key, disk_entry)
+
+        async def fetch() -> tuple[dict, int, bytes | None]:
+            result = await build()
+            return result, len(json.dumps(result, ensure_ascii=False, separators=(",", ":"))), None
+
+        return await _load_shared(key, name, ttl, fetch)
+
+    return await inflight.do(key, load)
+
+
+def _from_disk(key: str, disk_entry: DiskEntry) -> CacheEntry:
+    entry = response_cache.set(key, disk_entry.value, disk_entry.size, disk_entry.ttl, negative=disk_entry.negative)
+    return entry or CacheEntry(key, disk_entry.value, disk_entry.size, 0.0, disk_entry.negative)
+
+
+async def _load_shared(
+    key: str,
+    name: str,
+    ttl: int,
+    fetch: Callable[[], Awaitable[tuple[dict, int, bytes | None]]],
+) -> CacheEntry:
+    """
+    Загрузка ключа, одна на все воркеры хоста: если тот же ключ уже
+    грузит другой воркер (аренда в дисковом кэше), ждём его результат.
+    fetch -> (ответ, размер, исходное тело или None)
+    """
+    leased = await disk_cache.acquire(key)
+    if not leased:
+        disk_entry = await disk_cache.wait(key)
+        if disk_entry is not None:
+            return _from_disk(key, disk_entry)
+        # у того воркера не вышло — грузим сами, без аренды
+
+    try:
+        result, size, raw = await fetch()
+        entry = _store(key, name, ttl, result, size, raw=raw)
+        return entry or CacheEntry(key, result, size, 0.0, is_not_found(result))
+    finally:
+        if leased:
+            await disk_cache.release(key)
+
+
+async def _load(key: str, name: str, ttl: int, query: str, variables: dict, priority: Priority) -> CacheEntry:
+    # второй уровень: диск (переживает рестарты, общий для воркеров)
+    disk_entry = await disk_cache.get(key)
+    if disk_entry is not None:
+        return _from_disk(key, disk_entry)
+
+    async def fetch() -> tuple[dict, int, bytes]:
+        result, raw = await _fetch(query, variables, priority)
+        return result, len(raw), raw
+
+    return await _load_shared(key, name, ttl, fetch)
+
+
+async def _refresh(key: str, name: str, query: str, variables: dict) -> CacheEntry:
+    """
+    Перезапрос ключа мимо кэша (refresh-ahead); ожидающие того же ключа
+    пользователи присоединяются к этой загрузке, другие воркеры — ждут её.
+    Если другой воркер уже обновил ключ, берём его запись с диска
+    """
+    async def fetch() -> tuple[dict, int, bytes]:
+        result, raw = await _fetch(query, variables, Priority.REFRESH)
+        return result, len(raw), raw
+
+    async def refresh() -> CacheEntry:
+        # иначе N воркеров обновляют горячий ключ N раз за TTL
+        disk_entry = await disk_cache.get(key)
+        current = response_cache.peek(key)
+        if disk_entry is not None and disk_entry.ttl > (current.ttl if current is not None else 0.0) + 1.0:
+            return _from_disk(key, disk_entry)
+        return await _load_shared(key, name, cache_ttl(name), fetch)
+
+    return await inflight.do(key, refresh)
+
+
+refresh_ahead = RefreshAhead(
+    config.REFRESH_AHEAD_NAMES,
+    _refresh,
+    enabled=config.REFRESH_AHEAD_ENABLED,
+    share=config.REFRESH_AHEAD_RATE_SHARE,
+    lead=config.REFRESH_AHEAD_LEAD,
+    jitter=config.REFRESH_AHEAD_JITTER,
+    min_hits=config.REFRESH_AHEAD_MIN_HITS,
+    half_life=config.REFRESH_AHEAD_HALF_LIFE,
+    stale=config.REFRESH_AHEAD_STALE,
+    max_keys=config.REFRESH_AHEAD_MAX_KEYS,
+    interval=config.REFRESH_AHEAD_INTERVAL,
+)
+
+
+async def _post(operation: str, payload: dict) -> httpx.Response:
+    """
+    POST в AniList с учётом латентности, статуса и объёма ответа
+    """
+    UPSTREAM_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        resp = await get_client().post(ANILIST_API_URL, json=payload)
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+        UPSTREAM_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+    UPSTREAM_RESPONSES.labels(operation, resp.status_code).inc()
+    UPSTREAM_BYTES.labels(operation).inc(len(resp.content))
+    return resp
+
+
+async def _fetch(query: str, variables: dict, priority: Priority) -> tuple[dict, bytes]:
+    """
+    Один запрос к AniList: (разобранный JSON, исходное тело ответа)
+    """
     payload = {
         "query": query,
         "variables": variables,
     }
 
-    logger.debug("AniList request")
-    logger.debug(json.dumps(payload, ensure_ascii=False, indent=2))
+    started = time.monotonic()
+    deadline = started + scheduler.deadlines[priority]
+    operation = operation_name(query)
+    sampled = payloads.sampled()
 
     try:
-        async with httpx.AsyncClient(
-            headers=HEADERS,
-            timeout=httpx.Timeout(20.0),
-            verify=certifi.where(),
-        ) as client:
-            resp = await client.post(ANILIST_API_URL, json=payload)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            # воспроизведение записей не тратит квоту AniList
+            if not offline():
+                await scheduler.acquire(priority, deadline=max(0.0, deadline - time.monotonic()))
+            resp = await _post(operation, payload)
+
+            retry_after = scheduler.observe(resp.status_code, resp.headers)
+            if retry_after is None:
+                break
+
+            # 429: повторяем, только если успеваем до дедлайна
+            if attempt == RATE_LIMIT_RETRIES or time.monotonic() + retry_after > deadline:
+                UPSTREAM_ERRORS.labels(operation, "rate_limited").inc()
+                raise AniListRateLimited("AniList rate limit (429)", retry_after=retry_after)
+
+        # 404 — не ошибка, а "не найдено": AniList отдаёт data с null
+        if resp.status_code == 404:
+            result = resp.json()
+            if "data" in result:
+                payloads.emit(operation, variables, resp.content, time.monotonic() - started, sampled)
+                return result, resp.content
 
         # ❗ HTTP-ошибки — реальные ошибки
         if resp.status_code != 200:
@@ -39,20 +347,21 @@ async def anilist_query(query: str, variables: dict | None = None) -> dict:
             raise RuntimeError(f"AniList HTTP error {resp.status_code}")
 
         result = resp.json()
+        payloads.emit(operation, variables, resp.content, time.monotonic() - started, sampled)
 
-        logger.debug("AniList response")
-        logger.debug(json.dumps(result, ensure_ascii=False, indent=2))
-
-        return result
+        return result, resp.content
 
     except httpx.TimeoutException:
+        UPSTREAM_ERRORS.labels(operation, "timeout").inc()
         logger.error("AniList timeout")
         raise RuntimeError("AniList timeout")
 
     except httpx.RequestError as e:
+        UPSTREAM_ERRORS.labels(operation, "connection").inc()
         logger.error(f"AniList connection error: {e}")
         raise RuntimeError("Ошибка соединения с AniList")
 
     except json.JSONDecodeError:
+        UPSTREAM_ERRORS.labels(operation, "json").inc()
         logger.error("AniList invalid JSON")
         raise RuntimeError("Некорректный JSON от AniList")
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from pathlib import Path
+
+from app.core import config
+from app.core.graphql import gql
+from app.services.anilist_service import Priority, anilist_query
+
+logger = logging.getLogger(__name__)
+
+TODAY_BIRTHDAYS_QUERY = gql("today_birthday")
+
+FETCH_PER_PAGE = 50
+INDEX_VERSION = 1
+
+# компактная запись: (id, name_full, name_native, image_large,
+#                     favourites, anime_title_romaji, anime_title_english)
+BirthdayRow = tuple
+FAVOURITES = 4
+
+
+def _day_key(month: int, day: int) -> str:
+    return f"{month:02d}-{day:02d}"
+
+
+def _row(char: dict) -> BirthdayRow:
+    media_nodes = (char.get("media") or {}).get("nodes") or []
+    title = (media_nodes[0] if media_nodes else {}).get("title") or {}
+    name = char.get("name") or {}
+
+    return (
+        char["id"],
+        name.get("full"),
+        name.get("native"),
+        (char.get("image") or {}).get("large"),
+        char.get("favourites") or 0,
+        title.get("romaji"),
+        title.get("english"),
+    )
+
+
+class BirthdayIndex:
+    """
+    month-day -> персонажи, отсортированные по избранному.
+
+    Строится в фоне из топ-N персонажей AniList раз в сутки и
+    сохраняется на диск, чтобы после рестарта отвечать сразу.
+    Пока первый индекс строится, отдаём то, что уже загружено.
+    """
+
+    def __init__(self, path: Path, top_n: int, refresh_interval: int, concurrency: int):
+        self.path = path
+        self.top_n = top_n
+        self.refresh_interval = refresh_interval
+        self.concurrency = concurrency
+
+        self._days: dict[str, list[BirthdayRow]] = {}
+        self.built_at = 0.0
+        self.characters = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at > 0
+
+    def lookup(self, month: int, day: int, limit: int | None = None) -> list[BirthdayRow]:
+        rows = self._days.get(_day_key(month, day), [])
+        return rows[:limit] if limit is not None else rows
+
+    # ─── persistence ───────────────────────────────────────────
+
+    def load(self) -> bool:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            logger.exception("Не удалось прочитать индекс дней рождения %s", self.path)
+            return False
+
+        if raw.get("version") != INDEX_VERSION:
+            return False
+
+        self._days = {key: [tuple(row) for row in rows] for key, rows in raw["days"].items()}
+        self.built_at = raw["built_at"]
+        self.characters = raw.get("characters", 0)
+        logger.info("Индекс дней рождения загружен: %s персонажей", self.characters)
+        return True
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # у каждого воркера свой временный файл: os.replace атомарен, последний побеждает
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "version": INDEX_VERSION,
+                    "built_at": self.built_at,
+                    "characters": self.characters,
+                    "days": self._days,
+                },
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+    # ─── build ─────────────────────────────────────────────────
+
+    async def build(self) -> None:
+        pages = math.ceil(self.top_n / FETCH_PER_PAGE)
+        sem = asyncio.Semaphore(self.concurrency)
+
+        # первый индекс наполняем "вживую", повторный — строим рядом и подменяем
+        days: dict[str, list[BirthdayRow]] = {}
+        if not self.ready:
+            self._days = days
+        total = 0
+
+        async def fetch_page(page: int) -> None:
+            nonlocal total
+            async with sem:
+                result = await anilist_query(
+                    TODAY_BIRTHDAYS_QUERY,
+                    {
+                        "page": page,
+                        "perPage": FETCH_PER_PAGE,
+                        "sort": ["FAVOURITES_DESC"],
+                    },
+                    priority=Priority.BACKGROUND,
+                )
+
+            characters = ((result.get("data") or {}).get("Page") or {}).get("characters") or []
+            total += len(characters)
+
+            touched = set()
+            for char in characters:
+                dob = char.get("dateOfBirth") or {}
+                if not dob.get("month") or not dob.get("day"):
+                    continue
+                key = _day_key(dob["month"], dob["day"])
+                days.setdefault(key, []).append(_row(char))
+                touched.add(key)
+
+            # страницы приходят в произвольном порядке
+            for key in touched:
+                days[key].sort(key=lambda row: row[FAVOURITES], reverse=True)
+
+        started = time.monotonic()
+        await asyncio.gather(*(fetch_page(page) for page in range(1, pages + 1)))
+
+        self._days = days
+        self.characters = total
+        self.built_at = time.time()
+        # сериализация тысяч персонажей и запись файла — не в цикле событий
+        await asyncio.get_running_loop().run_in_executor(None, self.save)
+
+        logger.info(
+            "Индекс дней рождения построен: %s персонажей, %s дат за %.1f с",
+            total, len(days), time.monotonic() - started,
+        )
+
+    async def _run(self) -> None:
+        while True:
+            age = time.time() - self.built_at
+            if age >= self.refresh_interval:
+                try:
+                    await self.build()
+                except Exception:
+                    logger.exception("Ошибка построения индекса дней рождения")
+                    await asyncio.sleep(60)
+                    continue
+                age = 0
+
+            await asyncio.sleep(self.refresh_interval - age)
+
+    def start(self) -> None:
+        self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+birthday_index = BirthdayIndex(
+    path=Path(config.DATA_DIR) / "birthday_index.json",
+    top_n=config.BIRTHDAY_INDEX_TOP_N,
+    refresh_interval=config.BIRTHDAY_INDEX_REFRESH,
+    concurrency=config.BIRTHDAY_INDEX_CONCURRENCY,
+)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+def make_cache_key(name: str, query: str, variables: dict | None) -> str:
+    """
+    Ключ = имя запроса + хэш текста запроса и канонизированных переменных
+    (порядок ключей и пробелы не влияют на ключ)
+    """
+    canonical = json.dumps(
+        variables or {},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    digest = hashlib.blake2b(
+        query.encode() + b"\0" + canonical.encode(),
+        digest_size=16,
+    ).hexdigest()
+    return f"{name}:{digest}"
+
+
+class CacheEntry:
+    # rendered: готовые тела HTTP-ответов по варианту -> (bytes, etag)
+    __slots__ = ("key", "value", "size", "expires_at", "negative", "rendered")
+
+    def __init__(self, key: str, value: Any, size: int, expires_at: float, negative: bool):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.negative = negative
+        self.rendered: dict[str, tuple[bytes, str]] | None = None
+
+    @property
+    def ttl(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+class ResponseCache:
+    """
+    TTL + LRU кэш ответов AniList с бюджетом по памяти.
+
+    Размер записи — приблизительный, по длине JSON-тела ответа.
+    Значения отдаются вызывающему коду как есть: их нельзя мутировать.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, stale: float = 0.0) -> CacheEntry | None:
+        """
+        stale > 0 — запись, истёкшая не больше stale секунд назад, тоже
+        отдаётся (stale-while-revalidate): вызывающий видит это по entry.ttl == 0
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        if entry.expires_at <= now:
+            if now - entry.expires_at <= stale:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return entry
+            self._remove(entry)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if entry.negative:
+            self.negative_hits += 1
+        return entry
+
+    def peek(self, key: str) -> CacheEntry | None:
+        """
+        Запись как есть (в т.ч. истёкшая), без учёта в статистике и LRU
+        """
+        return self._entries.get(key)
+
+    def set(self, key: str, value: Any, size: int, ttl: float, negative: bool = False) -> CacheEntry | None:
+        if ttl <= 0 or size > self.max_bytes:
+            return None
+
+        old = self._entries.get(key)
+        if old is not None:
+            self._remove(old)
+
+        entry = CacheEntry(key, value, size, time.monotonic() + ttl, negative)
+        self._entries[key] = entry
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            _, oldest = self._entries.popitem(last=False)
+            self.bytes -= oldest.size
+            self.evictions += 1
+
+        return entry
+
+    def grow(self, entry: CacheEntry, extra: int) -> None:
+        """
+        Увеличивает учтённый размер записи (например, добавилось готовое тело ответа)
+        """
+        entry.size += extra
+        if self._entries.get(entry.key) is not entry:
+            return
+
+        self.bytes += extra
+        while self.bytes > self.max_bytes and self._entries:
+            _, oldest = self._entries.popitem(last=False)
+            self.bytes -= oldest.size
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._remove(entry)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, entry: CacheEntry) -> None:
+        del self._entries[entry.key]
+        self.bytes -= entry.size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,460 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    value       BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    expires_at  REAL NOT NULL,
+    negative    INTEGER NOT NULL DEFAULT 0,
+    hits        INTEGER NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_hot ON entries (hits DESC, accessed_at DESC);
+CREATE TABLE IF NOT EXISTS leases (
+    key         TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    expires_at  REAL NOT NULL
+);
+"""
+
+# как часто удалять просроченные записи и проверять лимит размера, секунд
+MAINTENANCE_INTERVAL = 60.0
+# сколько ждать блокировку базы, занятую другим воркером, мс
+BUSY_TIMEOUT_MS = 5000
+# опрос ключа, который грузит другой воркер: от и до, секунд
+LEASE_POLL_MIN = 0.01
+LEASE_POLL_MAX = 0.1
+
+
+class DiskEntry:
+    __slots__ = ("key", "value", "size", "ttl", "negative")
+
+    def __init__(self, key: str, value: Any, size: int, ttl: float, negative: bool):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.ttl = ttl
+        self.negative = negative
+
+
+class DiskCache:
+    """
+    Второй уровень кэша ответов AniList в SQLite (WAL).
+
+    Чтение — read-through из отдельного потока. Запись — write-behind:
+    put() только кладёт запись в буфер, фоновая задача сбрасывает буфер
+    на диск пачками, поэтому запрос никогда не ждёт диск на запись.
+    Все операции с базой идут через один поток-исполнитель.
+
+    Файл общий для всех воркеров хоста (shared): промах, который уже
+    грузит другой воркер, ждёт его результата, а не идёт в AniList
+    сам. Кто грузит — решает аренда ключа (таблица leases, lease_ttl
+    секунд); свой результат арендатор пишет на диск сразу, минуя буфер.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        flush_interval: float,
+        enabled: bool = True,
+        shared: bool = False,
+        lease_ttl: float = 30.0,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.shared = shared
+        self.lease_ttl = lease_ttl
+        # уникален для процесса и экземпляра: pid переиспользуется
+        self.owner = uuid.uuid4().hex
+
+        self._conn: sqlite3.Connection | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: dict[str, tuple] = {}
+        self._touched: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+        self._last_maintenance = 0.0
+        # stop() идёт: новые операции с базой не начинаются
+        self._closing = False
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.leases = 0
+        self.lease_waits = 0
+        self.lease_wait_hits = 0
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None and not self._closing
+
+    # ─── lifecycle ─────────────────────────────────────────────
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    async def _run_db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def start(self) -> None:
+        if not self.enabled or self.active:
+            return
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache")
+        try:
+            await self._run_db(self._open)
+        except sqlite3.Error:
+            logger.exception("Не удалось открыть дисковый кэш %s, работаем без него", self.path)
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            return
+
+        self._task = asyncio.create_task(self._writer())
+        logger.info("Дисковый кэш открыт: %s", self.path)
+
+    async def stop(self) -> None:
+        if not self.active:
+            return
+
+        # с этого момента acquire / wait / release — no-op: загрузки,
+        # не успевшие до остановки, не трогают закрываемую базу
+        self._closing = True
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # дописываем всё, что осталось в буфере, и снимаем свои аренды —
+        # другие воркеры не ждут их истечения
+        await self._flush()
+        if self.shared:
+            try:
+                await self._run_db(self._drop_leases)
+            except sqlite3.Error:
+                logger.exception("Ошибка снятия аренд дискового кэша")
+        await self._run_db(self._conn.close)
+        self._conn = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self._closing = False
+
+    # ─── read path ─────────────────────────────────────────────
+
+    def _get(self, key: str) -> DiskEntry | None:
+        row = self._conn.execute(
+            "SELECT value, size, expires_at, negative FROM entries WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, size, expires_at, negative = row
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return None
+
+        return DiskEntry(key, json.loads(value), size, ttl, bool(negative))
+
+    async def get(self, key: str) -> DiskEntry | None:
+        if not self.active:
+            return None
+
+        # запись могла ещё не доехать до диска
+        pending = self._pending.get(key)
+        if pending is not None:
+            _, _, raw, value, size, expires_at, negative = pending
+            ttl = expires_at - time.time()
+            if ttl > 0:
+                self.hits += 1
+                return DiskEntry(key, value, size, ttl, negative)
+
+        try:
+            entry = await self._run_db(self._get, key)
+        except sqlite3.Error:
+            logger.exception("Ошибка чтения дискового кэша")
+            return None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._touched[key] = time.time()
+        return entry
+
+    def touch(self, key: str) -> None:
+        """
+        Отмечает обращение к ключу (попадание в памяти) — для прогрева "горячих"
+        """
+        if self.active:
+            self._touched[key] = time.time()
+
+    # ─── write path (write-behind) ─────────────────────────────
+
+    def put(
+        self,
+        key: str,
+        name: str,
+        value: Any,
+        size: int,
+        ttl: float,
+        negative: bool = False,
+        raw: bytes | None = None,
+    ) -> None:
+        """
+        raw — исходное тело ответа, если есть (иначе value сериализуется в потоке записи)
+        """
+        if not self.active or ttl <= 0:
+            return
+        self._pending[key] = (key, name, raw, value, size, time.time() + ttl, negative)
+
+    @staticmethod
+    def _rows(pending: list[tuple], now: float) -> list[tuple]:
+        return [
+            (
+                key,
+                name,
+                raw if raw is not None else json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode(),
+                size,
+                expires_at,
+                int(negative),
+                now,
+            )
+            for key, name, raw, value, size, expires_at, negative in pending
+        ]
+
+    def _upsert(self, rows: list[tuple]) -> None:
+        self._conn.executemany(
+            """
+            INSERT INTO entries (key, name, value, size, expires_at, negative, hits, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                name = excluded.name,
+                value = excluded.value,
+                size = excluded.size,
+                expires_at = excluded.expires_at,
+                negative = excluded.negative,
+                accessed_at = excluded.accessed_at
+            """,
+            rows,
+        )
+
+    def _write(self, pending: list[tuple], touched: dict[str, float]) -> None:
+        now = time.time()
+        rows = self._rows(pending, now)
+
+        with self._conn:
+            self._upsert(rows)
+            self._conn.executemany(
+                "UPDATE entries SET hits = hits + 1, accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in touched.items()],
+            )
+
+        if now - self._last_maintenance >= MAINTENANCE_INTERVAL:
+            self._last_maintenance = now
+            self._maintain(now)
+
+    def _maintain(self, now: float) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            self._conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # выселяем самые давно использованные, пока не влезем в лимит
+        excess = total - self.max_bytes
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+        with self._conn:
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    async def flush(self) -> None:
+        if not self.active:
+            return
+        await self._flush()
+
+    async def _flush(self) -> None:
+        if not (self._pending or self._touched):
+            return
+
+        pending = list(self._pending.values())
+        touched = self._touched
+        self._pending = {}
+        self._touched = {}
+
+        try:
+            await self._run_db(self._write, pending, touched)
+            self.writes += len(pending)
+        except sqlite3.Error:
+            logger.exception("Ошибка записи дискового кэша, %s записей потеряно", len(pending))
+
+    async def _writer(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    # ─── аренда ключа: single-flight между воркерами ───────────
+
+    def _acquire(self, key: str) -> bool:
+        now = time.time()
+        with self._conn:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.expires_at <= ?
+                """,
+                (key, self.owner, now + self.lease_ttl, now),
+            )
+        return cursor.rowcount == 1
+
+    async def acquire(self, key: str) -> bool:
+        """
+        True — ключ грузим мы (или делить не с кем); False — его уже
+        грузит другой воркер, результат ждать через wait()
+        """
+        if not self.active or not self.shared:
+            return True
+        try:
+            acquired = await self._run_db(self._acquire, key)
+        except sqlite3.Error:
+            logger.exception("Ошибка аренды ключа в дисковом кэше")
+            return True
+        if acquired:
+            self.leases += 1
+        return acquired
+
+    def _poll(self, key: str) -> tuple[bool, DiskEntry | None]:
+        row = self._conn.execute("SELECT expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[0] > time.time():
+            return True, None
+        return False, self._get(key)
+
+    async def wait(self, key: str) -> DiskEntry | None:
+        """
+        Ждёт, пока другой воркер догрузит ключ; None — он не справился
+        (ошибка, аренда истекла), грузить придётся самим
+        """
+        self.lease_waits += 1
+        delay = LEASE_POLL_MIN
+        while True:
+            await asyncio.sleep(delay)
+            if not self.active:
+                return None
+            try:
+                leased, entry = await self._run_db(self._poll, key)
+            except sqlite3.Error:
+                logger.exception("Ошибка чтения дискового кэша")
+                return None
+            if not leased:
+                if entry is not None:
+                    self.lease_wait_hits += 1
+                return entry
+            delay = min(LEASE_POLL_MAX, delay * 2)
+
+    def _release(self, key: str, pending: tuple | None) -> None:
+        with self._conn:
+            if pending is not None:
+                self._upsert(self._rows([pending], time.time()))
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def _drop_leases(self) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+
+    async def release(self, key: str) -> None:
+        """
+        Снимает аренду; результат загрузки (если он в буфере) пишется
+        в той же транзакции — ожидающие воркеры сразу его видят.
+        После stop() — no-op: аренды сняты при остановке
+        """
+        if not self.active or not self.shared:
+            return
+        pending = self._pending.pop(key, None)
+        try:
+            await self._run_db(self._release, key, pending)
+        except sqlite3.Error:
+            logger.exception("Ошибка снятия аренды в дисковом кэше")
+            # запись не потеряна: уйдёт с обычным сбросом буфера
+            if pending is not None:
+                self._pending.setdefault(key, pending)
+            return
+        if pending is not None:
+            self.writes += 1
+
+    # ─── warm load ─────────────────────────────────────────────
+
+    def _hottest(self, max_bytes: int) -> list[DiskEntry]:
+        now = time.time()
+        entries = []
+        budget = max_bytes
+
+        rows = self._conn.execute(
+            """
+            SELECT key, value, size, expires_at, negative FROM entries
+            WHERE expires_at > ? ORDER BY hits DESC, accessed_at DESC
+            """,
+            (now,),
+        )
+        for key, value, size, expires_at, negative in rows:
+            if size > budget:
+                break
+            budget -= size
+            entries.append(DiskEntry(key, json.loads(value), size, expires_at - now, bool(negative)))
+
+        return entries
+
+    async def hottest(self, max_bytes: int) -> list[DiskEntry]:
+        """
+        Самые востребованные живые записи в пределах бюджета (для прогрева памяти)
+        """
+        if not self.active or max_bytes <= 0:
+            return []
+        return await self._run_db(self._hottest, max_bytes)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.active,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "pending": len(self._pending),
+            "evictions": self.evictions,
+            "leases": self.leases,
+            "lease_waits": self.lease_waits,
+            "lease_wait_hits": self.lease_wait_hits,
+        }
@@ -0,0 +1,354 @@
+import logging
+import time
+from typing import Callable, Iterable
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+
+class Record:
+    """
+    Компактная запись сущности AniList на __slots__.
+
+    FIELDS: слот -> путь в ответе GraphQL. Записи из разных запросов
+    сливаются: merge() ставит только поля, которые есть в ответе
+    (null — и у родителя — сохраняется как None), незаполненный слот
+    означает "поле неизвестно".
+    """
+
+    __slots__ = ("id", "updated_at")
+    FIELDS: dict[str, tuple[str, ...]] = {}
+
+    def __init__(self, entity_id: int):
+        self.id = entity_id
+        self.updated_at = 0.0
+
+    def merge(self, data: dict) -> None:
+        for slot, path in self.FIELDS.items():
+            value = data
+            for part in path:
+                if not isinstance(value, dict) or part not in value:
+                    break
+                value = value[part]
+                if value is None:
+                    # null в ответе (в т.ч. родитель: dateOfBirth: null) —
+                    # поле известно и пусто, иначе known() не сработает никогда
+                    setattr(self, slot, None)
+                    break
+            else:
+                setattr(self, slot, tuple(value) if isinstance(value, list) else value)
+        self.updated_at = time.time()
+
+    def known(self, *slots: str) -> bool:
+        return all(hasattr(self, slot) for slot in slots)
+
+    def as_dict(self) -> dict:
+        """
+        Обратно в форму ответа GraphQL (только известные поля)
+        """
+        out: dict = {"id": self.id}
+        for slot, path in self.FIELDS.items():
+            if not hasattr(self, slot):
+                continue
+            value = getattr(self, slot)
+            target = out
+            for part in path[:-1]:
+                target = target.setdefault(part, {})
+            target[path[-1]] = list(value) if isinstance(value, tuple) else value
+        return out
+
+
+class MediaRecord(Record):
+    FIELDS = {
+        "type": ("type",),
+        "format": ("format",),
+        "status": ("status",),
+        "source": ("source",),
+        "description": ("description",),
+        "season": ("season",),
+        "season_year": ("seasonYear",),
+        "start_year": ("startDate", "year"),
+        "episodes": ("episodes",),
+        "duration": ("duration",),
+        "average_score": ("averageScore",),
+        "popularity": ("popularity",),
+        "favourites": ("favourites",),
+        "banner_image": ("bannerImage",),
+        "genres": ("genres",),
+        "title_romaji": ("title", "romaji"),
+        "title_english": ("title", "english"),
+        "title_native": ("title", "native"),
+        "title_user_preferred": ("title", "userPreferred"),
+        "cover_extra_large": ("coverImage", "extraLarge"),
+        "cover_large": ("coverImage", "large"),
+        "cover_medium": ("coverImage", "medium"),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class CharacterRecord(Record):
+    FIELDS = {
+        "name_full": ("name", "full"),
+        "name_native": ("name", "native"),
+        "name_alternative": ("name", "alternative"),
+        "image_large": ("image", "large"),
+        "description": ("description",),
+        "favourites": ("favourites",),
+        "age": ("age",),
+        "gender": ("gender",),
+        "blood_type": ("bloodType",),
+        "dob_year": ("dateOfBirth", "year"),
+        "dob_month": ("dateOfBirth", "month"),
+        "dob_day": ("dateOfBirth", "day"),
+    }
+    # первая страница появлений из запроса character: id медиа
+    # и pageInfo; details_at — когда получено
+    __slots__ = tuple(FIELDS) + (
+        "media_ids",
+        "media_total",
+        "media_has_next",
+        "details_at",
+    )
+
+
+class StaffRecord(Record):
+    FIELDS = {
+        "name_full": ("name", "full"),
+        "name_native": ("name", "native"),
+        "name_alternative": ("name", "alternative"),
+        "image_large": ("image", "large"),
+        "language": ("languageV2",),
+        "description": ("description",),
+        "primary_occupations": ("primaryOccupations",),
+        "gender": ("gender",),
+        "age": ("age",),
+        "blood_type": ("bloodType",),
+        "home_town": ("homeTown",),
+        "years_active": ("yearsActive",),
+        "favourites": ("favourites",),
+        "dob_year": ("dateOfBirth", "year"),
+        "dob_month": ("dateOfBirth", "month"),
+        "dob_day": ("dateOfBirth", "day"),
+        "dod_year": ("dateOfDeath", "year"),
+        "dod_month": ("dateOfDeath", "month"),
+        "dod_day": ("dateOfDeath", "day"),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+# поля, без которых /character/{id} нельзя собрать локально
+CHARACTER_DETAIL_FIELDS = tuple(CharacterRecord.FIELDS) + (
+    "media_ids",
+    "media_total",
+    "media_has_next",
+)
+
+
+def _nodes(connection: dict | None) -> list[dict]:
+    return [node for node in ((connection or {}).get("nodes") or []) if node and node.get("id")]
+
+
+def _edges(connection: dict | None) -> list[dict]:
+    return [edge for edge in ((connection or {}).get("edges") or []) if edge]
+
+
+class EntityStore:
+    """
+    Нормализованные Media / Character / Staff по (тип, id), общие для
+    всех эндпоинтов: один персонаж из media_details, character,
+    staff и избранного пользователя хранится один раз
+    """
+
+    def __init__(self, max_per_type: int):
+        self.max_per_type = max_per_type
+        self._tables: dict[type, dict[int, Record]] = {
+            MediaRecord: {},
+            CharacterRecord: {},
+            StaffRecord: {},
+        }
+        self._media_listeners: list[Callable[[MediaRecord], None]] = []
+        self._media_evict_listeners: list[Callable[[int], None]] = []
+        self.merges = 0
+        self.evictions = 0
+
+    def on_media(self, listener: Callable[[MediaRecord], None]) -> None:
+        """
+        listener(record) после каждого обновления Media (поисковый индекс)
+        """
+        self._media_listeners.append(listener)
+
+    def on_media_evicted(self, listener: Callable[[int], None]) -> None:
+        """
+        listener(media_id) после вытеснения Media из хранилища
+        """
+        self._media_evict_listeners.append(listener)
+
+    def media(self, media_id: int) -> MediaRecord | None:
+        return self._tables[MediaRecord].get(media_id)
+
+    def character(self, character_id: int) -> CharacterRecord | None:
+        return self._tables[CharacterRecord].get(character_id)
+
+    def staff(self, staff_id: int) -> StaffRecord | None:
+        return self._tables[StaffRecord].get(staff_id)
+
+    def _upsert(self, cls: type, data: dict | None) -> Record | None:
+        if not data or not data.get("id"):
+            return None
+
+        table = self._tables[cls]
+        record = table.get(data["id"])
+        if record is None:
+            if len(table) >= self.max_per_type:
+                # dict хранит порядок вставки — вытесняем самую старую запись
+                evicted = next(iter(table))
+                del table[evicted]
+                self.evictions += 1
+                if cls is MediaRecord:
+                    for listener in self._media_evict_listeners:
+                        listener(evicted)
+            record = table[data["id"]] = cls(data["id"])
+
+        record.merge(data)
+        self.merges += 1
+        if cls is MediaRecord:
+            for listener in self._media_listeners:
+                listener(record)
+        return record
+
+    def _media_many(self, items: Iterable[dict]) -> None:
+        for item in items:
+            self._upsert(MediaRecord, item)
+
+    def _staff_many(self, items: Iterable[dict]) -> None:
+        for item in items:
+            self._upsert(StaffRecord, item)
+
+    def _characters_many(self, items: Iterable[dict]) -> None:
+        for item in items:
+            self._upsert(CharacterRecord, item)
+
+    # ─── разбор ответов по имени запроса ──────────────────────
+
+    def _ingest_media(self, media: dict | None) -> None:
+        if not media:
+            return
+
+        self._upsert(MediaRecord, media)
+        self._staff_many(edge.get("node") for edge in _edges(media.get("staff")))
+        self._media_many(edge.get("node") for edge in _edges(media.get("relations")))
+
+        for edge in _edges(media.get("characters")):
+            self._upsert(CharacterRecord, edge.get("node"))
+            self._staff_many(edge.get("voiceActors") or [])
+
+    def _ingest_character(self, data: dict) -> None:
+        char = data.get("Character")
+        record = self._upsert(CharacterRecord, char)
+        if record is None:
+            return
+
+        connection = char.get("media")
+        if not connection or "nodes" not in connection:
+            return
+
+        nodes = _nodes(connection)
+        self._media_many(nodes)
+
+        # локально собираем только первую страницу появлений
+        page_info = connection.get("pageInfo") or {}
+        if (page_info.get("currentPage") or 1) != 1:
+            return
+        record.media_ids = tuple(node["id"] for node in nodes)
+        record.media_total = page_info.get("total") or 0
+        record.media_has_next = bool(page_info.get("hasNextPage"))
+        record.details_at = time.time()
+
+    def _ingest_staff(self, data: dict) -> None:
+        staff = data.get("Staff")
+        if self._upsert(StaffRecord, staff) is not None:
+            self._media_many(_nodes(staff.get("staffMedia")))
+
+    def _ingest_user(self, user: dict | None) -> None:
+        favourites = (user or {}).get("favourites") or {}
+        self._media_many(_nodes(favourites.get("anime")))
+        self._media_many(_nodes(favourites.get("manga")))
+        self._characters_many(_nodes(favourites.get("characters")))
+        self._staff_many(_nodes(favourites.get("staff")))
+
+    def ingest(self, name: str, result: dict) -> None:
+        """
+        Разбирает свежий ответ AniList (по имени .gql) в записи сущностей
+        """
+        data = result.get("data") or {}
+
+        try:
+            if name == "media_details":
+                self._ingest_media(data.get("Media"))
+            elif name == "character":
+                self._ingest_character(data)
+            elif name == "character_voice_actors":
+                for edge in _edges((data.get("Character") or {}).get("media")):
+                    self._staff_many(va for va in edge.get("voiceActors") or [] if va and va.get("id"))
+            elif name == "staff":
+                self._ingest_staff(data)
+            elif name in ("current_season", "search"):
+                self._media_many(((data.get("Page") or {}).get("media")) or [])
+            elif name == "today_birthday":
+                self._characters_many(((data.get("Page") or {}).get("characters")) or [])
+            elif name in ("user_profile", "user_profile_full"):
+                self._ingest_user(data.get("User"))
+            elif name == "list_collection":
+                for media_list in (data.get("MediaListCollection") or {}).get("lists") or []:
+                    self._media_many(entry.get("media") for entry in media_list.get("entries") or [])
+        except Exception:
+            # хранилище — оптимизация, ответ пользователю важнее
+            logger.exception("Ошибка разбора ответа %s в хранилище сущностей", name)
+
+    # ─── сборка ответов из хранилища ──────────────────────────
+
+    def character_response(self, character_id: int, max_age: float, per_page: int) -> dict | None:
+        """
+        Ответ запроса character (первая страница из per_page появлений),
+        собранный локально, если все поля известны и не старше max_age
+        секунд; иначе None
+        """
+        record = self.character(character_id)
+        if record is None or not record.known(*CHARACTER_DETAIL_FIELDS):
+            return None
+        if time.time() - record.details_at > max_age:
+            return None
+        # сохранённая страница короче запрошенной, а дальше ещё есть
+        if per_page > len(record.media_ids) and record.media_has_next:
+            return None
+
+        nodes = []
+        for media_id in record.media_ids[:per_page]:
+            media = self.media(media_id)
+            if media is None:
+                return None
+            nodes.append(media.as_dict())
+
+        char = record.as_dict()
+        char["media"] = {
+            "nodes": nodes,
+            "pageInfo": {
+                "total": record.media_total,
+                "hasNextPage": record.media_has_next or per_page < len(record.media_ids),
+                "currentPage": 1,
+            },
+        }
+        return {"data": {"Character": char}}
+
+    def stats(self) -> dict:
+        return {
+            "media": len(self._tables[MediaRecord]),
+            "characters": len(self._tables[CharacterRecord]),
+            "staff": len(self._tables[StaffRecord]),
+            "merges": self.merges,
+            "evictions": self.evictions,
+        }
+
+
+entity_store = EntityStore(config.ENTITY_STORE_MAX_PER_TYPE)
@@ -0,0 +1,82 @@
+import logging
+
+import certifi
+import httpx
+
+from app.core import config
+from app.services.recorder import wrap_transport
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json",
+    "User-Agent": "JukeyAnime/1.0",
+}
+
+_client: httpx.AsyncClient | None = None
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_client() -> httpx.AsyncClient:
+    """
+    Клиент с keep-alive пулом: TCP/TLS рукопожатие и загрузка
+    certifi происходят один раз, а не на каждый запрос к AniList.
+    Транспорт — живой, с записью или воспроизведение (config.ANILIST_TRANSPORT)
+    """
+    http2 = config.HTTP2_ENABLED and http2_available()
+    if config.HTTP2_ENABLED and not http2:
+        logger.info("Пакет h2 не установлен, HTTP/2 отключён")
+
+    network = httpx.AsyncHTTPTransport(
+        http2=http2,
+        verify=certifi.where(),
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+    return httpx.AsyncClient(
+        headers=HEADERS,
+        transport=wrap_transport(network),
+        timeout=httpx.Timeout(
+            config.HTTP_TIMEOUT,
+            connect=config.HTTP_CONNECT_TIMEOUT,
+            pool=config.HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+
+async def startup_client() -> None:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+        logger.info("HTTP клиент AniList создан")
+
+
+async def shutdown_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("HTTP клиент AniList закрыт")
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Общий клиент приложения. Вне lifespan (скрипты, бенчмарки)
+    создаётся лениво при первом обращении
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
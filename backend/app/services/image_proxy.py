@@ -0,0 +1,457 @@
+import asyncio
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import certifi
+import httpx
+
+from app.core import config
+from app.core.graphql import gql
+from app.core.images import image_version
+from app.services.anilist_service import AniListRateLimited, anilist_query
+from app.services.entity_store import entity_store
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+ENTITY_IMAGE_QUERY = gql("entity_image")
+
+# сколько редиректов CDN проходим при загрузке оригинала
+MAX_REDIRECTS = 3
+
+# сигнатуры форматов, которые отдаёт CDN AniList
+MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class ImageNotFound(LookupError):
+    pass
+
+
+class ImageUpstreamError(RuntimeError):
+    pass
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def sniff_type(data: bytes) -> str:
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, media_type in MAGIC:
+        if data.startswith(magic):
+            return media_type
+    return "application/octet-stream"
+
+
+def resize_webp(data: bytes, width: int, quality: int) -> bytes:
+    """
+    Уменьшенная до width копия в WebP (выполняется в процессе пула).
+    Меньше оригинала не увеличиваем — только перекодируем
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=quality, method=4)
+        return out.getvalue()
+
+
+class ImageStore:
+    """
+    Каталог с оригиналами и копиями картинок, ограниченный max_bytes.
+
+    Индекс (имя -> размер) в памяти в порядке LRU; строится сканом
+    каталога при старте (порядок — по mtime). Файлы пишутся через
+    временный и os.replace, так что читатель не видит недописанный файл.
+    Вызывается из пула потоков ввода-вывода: индекс и счётчик байт —
+    под threading.Lock, сами файлы читаются и удаляются вне его.
+
+    Каталог общий для воркеров: файл, которого нет в индексе, ищется
+    на диске и принимается в индекс; попадание обновляет mtime, так
+    что порядок LRU общий. Раз в rescan_interval секунд индекс
+    пересобирается сканом — бюджет max_bytes соблюдается на весь хост,
+    а файлы, удалённые чужим вытеснением, просто выпадают из индекса.
+    """
+
+    def __init__(self, path: str, max_bytes: int, rescan_interval: float):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._scanned_at = 0.0
+        self.bytes = 0
+        self.evictions = 0
+        self.adopted = 0
+
+    def scan(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._scanned_at = time.monotonic()
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.path):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith(".tmp"):
+                    # недописанный файл упавшего процесса (свежий — пишется прямо сейчас)
+                    if now - stat.st_mtime > 60:
+                        os.unlink(entry.path)
+                    continue
+            except FileNotFoundError:
+                # удалён другим воркером во время скана
+                continue
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            self._index.clear()
+            for _, name, size in sorted(files):
+                self._index[name] = size
+            self.bytes = sum(self._index.values())
+            victims = self._evict()
+        self._unlink(victims)
+
+    def read(self, name: str) -> bytes | None:
+        path = self.path / name
+        try:
+            data = path.read_bytes()
+            # общий для воркеров LRU — по mtime
+            os.utime(path)
+        except FileNotFoundError:
+            # удалён снаружи или вытеснен другим воркером — просто промах
+            with self._lock:
+                self.bytes -= self._index.pop(name, 0)
+            return None
+        with self._lock:
+            if name in self._index:
+                self._index.move_to_end(name)
+            else:
+                # записан другим воркером
+                self._index[name] = len(data)
+                self.bytes += len(data)
+                self.adopted += 1
+        return data
+
+    def write(self, name: str, data: bytes) -> None:
+        tmp = self.path / f"{name}.{os.getpid()}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, self.path / name)
+        with self._lock:
+            self.bytes += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            victims = self._evict()
+        self._unlink(victims)
+        if time.monotonic() - self._scanned_at > self.rescan_interval:
+            self.scan()
+
+    def _evict(self) -> list[str]:
+        # вызывается под self._lock; файлы удаляет вызывающий
+        victims = []
+        while self.bytes > self.max_bytes and self._index:
+            name, size = self._index.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            victims.append(name)
+        return victims
+
+    def _unlink(self, names: list[str]) -> None:
+        for name in names:
+            try:
+                os.unlink(self.path / name)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class ImageProxy:
+    """
+    Картинки AniList через наш сервер: оригинал качается с CDN один раз
+    и лежит в ImageStore, уменьшенные WebP-копии (ширина округляется
+    вверх до одной из widths) строятся в пуле процессов и тоже кэшируются.
+
+    Адрес оригинала берётся из хранилища сущностей, а если сущность ещё
+    не встречалась — маленьким запросом entity_image (кэш на сутки).
+    Имена файлов — хэш адреса: сменилась обложка — новый файл,
+    старый вытеснится сам. Без Pillow отдаются оригиналы.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        rescan_interval: float,
+        widths: tuple[int, ...],
+        quality: int,
+        workers: int,
+        max_source_bytes: int,
+        allowed_hosts: frozenset[str],
+    ):
+        self.store = ImageStore(path, max_bytes, rescan_interval)
+        self.widths = widths
+        self.quality = quality
+        self.workers = workers
+        self.max_source_bytes = max_source_bytes
+        self.allowed_hosts = allowed_hosts
+        self.resize_enabled = pillow_available()
+
+        self._client: httpx.AsyncClient | None = None
+        self._io: ThreadPoolExecutor | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self._inflight = SingleFlight()
+        self._lock = asyncio.Lock()
+
+        self.hits = 0
+        self.resized = 0
+        self.resize_seconds = 0.0
+        self.originals = 0
+        self.not_found = 0
+        self.errors = 0
+
+    # ─── lifecycle ─────────────────────────────────────────────
+
+    @property
+    def active(self) -> bool:
+        return self._io is not None
+
+    async def start(self) -> None:
+        if self.active:
+            return
+        async with self._lock:
+            if self.active:
+                return
+            io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="image-io")
+            await asyncio.get_running_loop().run_in_executor(io_pool, self.store.scan)
+            self._client = httpx.AsyncClient(
+                verify=certifi.where(),
+                timeout=httpx.Timeout(config.HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT),
+                headers={"User-Agent": "JukeyAnime/1.0"},
+            )
+            self._io = io_pool
+            if not self.resize_enabled:
+                logger.info("Pillow не установлен: /img отдаёт оригиналы без уменьшения")
+            logger.info("Кэш картинок: %s (%s файлов)", self.store.path, len(self.store))
+
+    async def stop(self) -> None:
+        if not self.active:
+            return
+        await self._client.aclose()
+        self._client = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self._io.shutdown(wait=True)
+        self._io = None
+
+    async def _run_io(self, fn, *args):
+        if not self.active:
+            await self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    async def _resize(self, data: bytes, width: int) -> bytes:
+        if self._pool is None:
+            # процессы поднимаем при первой копии, а не на старте
+            self._pool = ProcessPoolExecutor(max_workers=self.workers or None)
+        pool = self._pool
+        started = time.perf_counter()
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(pool, resize_webp, data, width, self.quality)
+        except BrokenProcessPool as e:
+            # процесс пула упал (OOM, сигнал) — пул больше не принимает задачи, поднимем новый
+            if self._pool is pool:
+                self._pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise ImageUpstreamError(f"пул уменьшения картинок упал: {e}") from e
+        except Exception as e:
+            # битый файл, DecompressionBombError и т.п. — ошибка картинки, а не сервера
+            raise ImageUpstreamError(f"не удалось уменьшить картинку: {e!r}") from e
+        self.resize_seconds += time.perf_counter() - started
+        self.resized += 1
+        return body
+
+    # ─── адрес оригинала ──────────────────────────────────────
+
+    def snap_width(self, width: int | None) -> int | None:
+        """
+        Ширина копии: ближайшая из widths не меньше запрошенной
+        (None — оригинал)
+        """
+        if width is None or not self.resize_enabled:
+            return None
+        return next((w for w in self.widths if w >= width), self.widths[-1])
+
+    @staticmethod
+    def _known_url(kind: str, entity_id: int) -> str | None:
+        if kind in ("cover", "banner"):
+            record = entity_store.media(entity_id)
+            if record is None:
+                return None
+            if kind == "banner":
+                return getattr(record, "banner_image", None)
+            return getattr(record, "cover_extra_large", None) or getattr(record, "cover_large", None)
+
+        record = entity_store.character(entity_id) if kind == "character" else entity_store.staff(entity_id)
+        return getattr(record, "image_large", None) if record is not None else None
+
+    async def source_url(self, kind: str, entity_id: int) -> str | None:
+        url = self._known_url(kind, entity_id)
+        if url:
+            return url
+
+        root = "media" if kind in ("cover", "banner") else kind
+        result = await anilist_query(ENTITY_IMAGE_QUERY, {"id": entity_id, root: True})
+        data = (result.get("data") or {}).get(root.capitalize()) or {}
+        if kind == "cover":
+            cover = data.get("coverImage") or {}
+            return cover.get("extraLarge") or cover.get("large")
+        if kind == "banner":
+            return data.get("bannerImage")
+        return (data.get("image") or {}).get("large")
+
+    # ─── загрузка ─────────────────────────────────────────────
+
+    def _check_host(self, url: str) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.hostname not in self.allowed_hosts:
+            raise ImageUpstreamError(f"хост картинки не разрешён: {url}")
+
+    async def _download(self, url: str) -> bytes:
+        # редиректы — вручную: каждый Location проверяется по списку хостов,
+        # иначе разрешённый CDN мог бы увести запрос на внутренний адрес
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_host(url)
+            async with self._client.stream("GET", url) as resp:
+                if resp.is_redirect:
+                    location = resp.headers.get("location")
+                    if not location:
+                        raise ImageUpstreamError(f"CDN ответил {resp.status_code} без Location: {url}")
+                    url = urljoin(url, location)
+                    continue
+                if resp.status_code == 404:
+                    raise ImageNotFound(url)
+                if resp.status_code != 200:
+                    raise ImageUpstreamError(f"CDN ответил {resp.status_code}: {url}")
+                chunks = []
+                size = 0
+                async for chunk in resp.aiter_bytes():
+                    size += len(chunk)
+                    if size > self.max_source_bytes:
+                        raise ImageUpstreamError(f"картинка больше {self.max_source_bytes} байт: {url}")
+                    chunks.append(chunk)
+            self.originals += 1
+            return b"".join(chunks)
+        raise ImageUpstreamError(f"слишком много редиректов: {url}")
+
+    async def _original(self, name: str, url: str) -> bytes:
+        data = await self._run_io(self.store.read, name)
+        if data is not None:
+            return data
+
+        async def load() -> bytes:
+            body = await self._download(url)
+            await self._run_io(self.store.write, name, body)
+            return body
+
+        return await self._inflight.do(name, load)
+
+    async def get(self, kind: str, entity_id: int, width: int | None) -> tuple[bytes, str, str, str]:
+        """
+        (тело, content-type, ETag, версия оригинала) картинки;
+        ImageNotFound — у сущности нет такой картинки,
+        ImageUpstreamError — CDN недоступен или картинка битая,
+        RuntimeError — ошибка запроса адреса у AniList
+        """
+        try:
+            url = await self.source_url(kind, entity_id)
+        except AniListRateLimited:
+            raise
+        except RuntimeError:
+            self.errors += 1
+            raise
+        if not url:
+            self.not_found += 1
+            raise ImageNotFound(f"{kind}/{entity_id}")
+
+        digest = image_version(url)
+        original = f"{digest}.orig"
+        width = self.snap_width(width)
+
+        try:
+            if width is None:
+                data = await self._original(original, url)
+                self.hits += 1
+                return data, sniff_type(data), f'"{digest}"', digest
+
+            name = f"{digest}-w{width}.webp"
+            data = await self._run_io(self.store.read, name)
+            if data is not None:
+                self.hits += 1
+            else:
+                async def build() -> bytes:
+                    body = await self._resize(await self._original(original, url), width)
+                    await self._run_io(self.store.write, name, body)
+                    return body
+
+                data = await self._inflight.do(name, build)
+            return data, "image/webp", f'"{digest}-w{width}"', digest
+        except ImageNotFound:
+            self.not_found += 1
+            raise
+        except ImageUpstreamError:
+            self.errors += 1
+            raise
+        except (httpx.HTTPError, OSError) as e:
+            self.errors += 1
+            raise ImageUpstreamError(str(e)) from e
+
+    def stats(self) -> dict:
+        return {
+            "resize": self.resize_enabled,
+            "files": len(self.store),
+            "bytes": self.store.bytes,
+            "evictions": self.store.evictions,
+            "adopted": self.store.adopted,
+            "hits": self.hits,
+            "originals": self.originals,
+            "resized": self.resized,
+            "resize_ms_avg": round(self.resize_seconds / self.resized * 1000, 2) if self.resized else 0.0,
+            "not_found": self.not_found,
+            "errors": self.errors,
+        }
+
+
+image_proxy = ImageProxy(
+    config.IMAGE_CACHE_PATH,
+    max_bytes=config.IMAGE_CACHE_MAX_BYTES,
+    rescan_interval=config.IMAGE_CACHE_RESCAN_INTERVAL,
+    widths=config.IMAGE_WIDTHS,
+    quality=config.IMAGE_WEBP_QUALITY,
+    workers=config.IMAGE_WORKERS,
+    max_source_bytes=config.IMAGE_MAX_SOURCE_BYTES,
+    allowed_hosts=config.IMAGE_ALLOWED_HOSTS,
+)
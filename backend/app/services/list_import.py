@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import time
+import uuid
+
+from pydantic import ValidationError
+
+from app.core import config
+from app.core.graphql import gql
+from app.models.responses import MediaListEntry
+from app.services.anilist_service import AniListRateLimited, Priority, anilist_query, cache_ttl
+from app.services.entity_store import entity_store
+from app.services.watchlist import WatchlistEntry, watchlist
+
+logger = logging.getLogger(__name__)
+
+LIST_COLLECTION_QUERY = gql("list_collection")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# состояния, в которых задачу ведёт (или должен вести) воркер-владелец
+ACTIVE = (QUEUED, RUNNING)
+
+
+def to_entry(item: MediaListEntry, now: float) -> WatchlistEntry:
+    added = float(item.createdAt or item.updatedAt or now)
+    return WatchlistEntry(
+        item.mediaId,
+        item.status,
+        item.progress or 0,
+        # 0 в AniList — "без оценки"
+        item.score or None,
+        added,
+        float(item.updatedAt or added),
+    )
+
+
+class ImportJob:
+    __slots__ = (
+        "user", "media_type", "state", "next_chunk", "imported", "skipped",
+        "error", "started_at", "updated_at", "task",
+    )
+
+    def __init__(self, user: str, media_type: str):
+        self.user = user
+        self.media_type = media_type
+        self.state = QUEUED
+        self.next_chunk = 1
+        self.imported = 0
+        self.skipped = 0
+        self.error: str | None = None
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "ImportJob":
+        job = cls(row[0], row[1])
+        job.state, job.next_chunk, job.imported, job.skipped, job.error, job.started_at, job.updated_at = row[2:]
+        return job
+
+    def row(self) -> tuple:
+        return (
+            self.user, self.media_type, self.state, self.next_chunk, self.imported,
+            self.skipped, self.error, self.started_at, self.updated_at,
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "user": self.user,
+            "type": self.media_type,
+            "state": self.state,
+            "chunks_done": self.next_chunk - 1,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "error": self.error,
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class ListImporter:
+    """
+    Фоновый импорт списков AniList (MediaListCollection) в списки просмотра.
+
+    Список качается пачками (chunk/perChunk), каждая пачка сразу
+    проверяется, пишется в SQLite и отпускается — в памяти не больше
+    одной пачки, сколько бы тысяч записей ни было у пользователя.
+    Номер следующей пачки сохраняется в той же транзакции, что и её
+    записи: после сбоя или рестарта импорт продолжается с места остановки.
+    Media из ответа попутно попадают в хранилище сущностей и поиск.
+
+    Воркеров несколько, база одна: задачу ведёт тот, кто атомарно
+    захватил её строку в list_imports (owner). Владелец отмечается
+    (heartbeat) с каждой пачкой и раз в lease_ttl / 3; задачу упавшего
+    воркера перехватывают по истечении lease_ttl.
+    """
+
+    def __init__(self, per_chunk: int, retries: int, lease_ttl: float):
+        self.per_chunk = per_chunk
+        self.retries = retries
+        self.lease_ttl = lease_ttl
+        self.owner = uuid.uuid4().hex
+        self._jobs: dict[tuple[str, str], ImportJob] = {}
+
+        self.chunks = 0
+        self.failures = 0
+
+    async def status(self, user: str, media_type: str) -> ImportJob | None:
+        job = self._jobs.get((user, media_type))
+        if job is not None and job.state in ACTIVE:
+            return job
+        # завершённую (или чужую) задачу — из базы: её мог перезапустить другой воркер
+        row = await watchlist.load_import(user, media_type)
+        return ImportJob.from_row(row) if row else job
+
+    async def start(self, user: str, media_type: str) -> ImportJob:
+        """
+        Запускает импорт; незавершённый (упавший) — продолжает с последней пачки.
+        Импорт, который ведёт другой воркер, не дублируется — отдаётся его состояние
+        """
+        key = (user, media_type)
+        job = self._jobs.get(key)
+        if job is not None and job.state in ACTIVE:
+            return job
+
+        fresh = ImportJob(user, media_type)
+        row = await watchlist.claim_import(fresh.row(), self.owner, ACTIVE, time.time() - self.lease_ttl)
+        if row is None:
+            row = await watchlist.load_import(user, media_type)
+            return ImportJob.from_row(row) if row else fresh
+
+        if row[2] != DONE:
+            job = ImportJob.from_row(row)
+            job.error = None
+        else:
+            job = fresh
+
+        job.state = QUEUED
+        self._jobs[key] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    async def resume_interrupted(self) -> int:
+        """
+        Импорты, прерванные рестартом, продолжаются при старте
+        (каждый — одним воркером: кто первым захватил)
+        """
+        rows = await watchlist.imports_in_state(RUNNING) + await watchlist.imports_in_state(QUEUED)
+        resumed = 0
+        for row in rows:
+            job = await self.start(row[0], row[1])
+            resumed += job.task is not None
+        if resumed:
+            logger.info("Продолжаем прерванные импорты списков: %s", resumed)
+        return resumed
+
+    async def stop(self) -> None:
+        jobs = [job for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for job in jobs:
+            job.task.cancel()
+        # состояние в базе остаётся running — продолжим после рестарта
+        await asyncio.gather(*(job.task for job in jobs), return_exceptions=True)
+        # отпускаем задачи: их сразу подхватит другой воркер, не дожидаясь lease_ttl
+        for job in jobs:
+            await watchlist.release_import(job.user, job.media_type, self.owner)
+
+    async def _heartbeat(self, job: ImportJob) -> None:
+        # пачка может ждать квоту AniList дольше lease_ttl — отмечаемся и между пачками
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            if not await watchlist.save_import(job.row(), self.owner):
+                return
+
+    async def _fetch_chunk(self, job: ImportJob) -> dict:
+        variables = {
+            "userName": job.user,
+            "type": job.media_type,
+            "chunk": job.next_chunk,
+            "perChunk": self.per_chunk,
+        }
+        for attempt in range(self.retries + 1):
+            try:
+                return await anilist_query(LIST_COLLECTION_QUERY, variables, priority=Priority.BACKGROUND)
+            except AniListRateLimited as e:
+                # квота — не ошибка импорта, просто ждём
+                await asyncio.sleep(e.retry_after)
+            except RuntimeError:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+        raise RuntimeError("AniList: квота не восстановилась")
+
+    def _validate(self, collection: dict, now: float) -> tuple[list[WatchlistEntry], int]:
+        entries: dict[int, WatchlistEntry] = {}
+        skipped = 0
+        for media_list in collection.get("lists") or []:
+            for raw in media_list.get("entries") or []:
+                try:
+                    item = MediaListEntry.model_validate(raw)
+                except ValidationError:
+                    skipped += 1
+                    continue
+                # тайтл может быть и в обычном, и в пользовательском списке
+                entries[item.mediaId] = to_entry(item, now)
+        return list(entries.values()), skipped
+
+    async def _run(self, job: ImportJob) -> None:
+        job.state = RUNNING
+        if not await watchlist.save_import(job.row(), self.owner):
+            self._lost(job)
+            return
+        logger.info("Импорт списка %s (%s) с пачки %s", job.user, job.media_type, job.next_chunk)
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            while True:
+                result = await self._fetch_chunk(job)
+                if result.get("errors") and not result.get("data"):
+                    raise RuntimeError((result["errors"][0] or {}).get("message") or "AniList error")
+
+                collection = (result.get("data") or {}).get("MediaListCollection")
+                if collection is None:
+                    raise RuntimeError("Список пользователя не найден")
+
+                # с TTL > 0 ответ уже разобран при записи в кэш (_store)
+                if cache_ttl("list_collection") <= 0:
+                    entity_store.ingest("list_collection", result)
+                entries, skipped = self._validate(collection, time.time())
+                has_next = bool(collection.get("hasNextChunk"))
+                del result, collection
+
+                job.next_chunk += 1
+                job.imported += len(entries)
+                job.skipped += skipped
+                job.updated_at = time.time()
+                if not has_next:
+                    job.state = DONE
+                if not await watchlist.put_chunk(job.user, entries, job.row(), self.owner):
+                    self._lost(job)
+                    return
+                self.chunks += 1
+
+                if not has_next:
+                    break
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            logger.exception("Импорт списка %s (%s) прерван на пачке %s", job.user, job.media_type, job.next_chunk)
+            job.state = FAILED
+            job.error = str(e)
+            job.updated_at = time.time()
+            self.failures += 1
+            await watchlist.save_import(job.row(), self.owner)
+            return
+
+        finally:
+            heartbeat.cancel()
+
+        logger.info("Импорт списка %s (%s) завершён: %s записей", job.user, job.media_type, job.imported)
+
+    def _lost(self, job: ImportJob) -> None:
+        logger.warning("Импорт списка %s (%s) перехвачен другим воркером", job.user, job.media_type)
+        # локальная копия устарела: status() читает состояние из базы
+        self._jobs.pop((job.user, job.media_type), None)
+
+    def stats(self) -> dict:
+        return {
+            "running": sum(job.state == RUNNING for job in self._jobs.values()),
+            "chunks": self.chunks,
+            "failures": self.failures,
+        }
+
+
+list_importer = ListImporter(
+    per_chunk=config.LIST_IMPORT_PER_CHUNK,
+    retries=config.LIST_IMPORT_RETRIES,
+    lease_ttl=config.LIST_IMPORT_LEASE_TTL,
+)
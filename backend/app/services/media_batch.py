@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+
+from app.core import config
+from app.core.graphql import gql, selection_set
+from app.services.anilist_service import (
+    Priority,
+    anilist_query,
+    cached_result,
+    store_result,
+)
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DETAILS_QUERY = gql("media_details")
+
+
+class MediaBatchError(Exception):
+    """
+    Ошибка по конкретному id внутри пакета
+    """
+
+
+def build_batch_query(ids: list[int]) -> str:
+    """
+    Один документ с алиасами: m1: Media(id: 1) {...} m2: Media(id: 2) {...}
+    Поля берутся из media_details.gql
+    """
+    fields = selection_set(MEDIA_DETAILS_QUERY, "Media")
+    roots = "\n".join(
+        f"  m{media_id}: Media(id: {media_id}) {{{fields}}}"
+        for media_id in ids
+    )
+    return f"query MediaBatch {{\n{roots}\n}}"
+
+
+def _alias_errors(result: dict) -> dict[str, dict]:
+    errors = {}
+    for error in result.get("errors") or []:
+        path = error.get("path") or []
+        if path:
+            errors[str(path[0])] = error
+    return errors
+
+
+async def _fetch_chunk(ids: list[int], priority: Priority) -> dict[int, dict | None | Exception]:
+    try:
+        result = await anilist_query(build_batch_query(ids), priority=priority)
+    except Exception as e:
+        logger.error("AniList batch error (%s): %s", ids, e)
+        return {media_id: e for media_id in ids}
+
+    data = result.get("data") or {}
+    errors = _alias_errors(result)
+
+    # размер записи кэша — доля тела пакета, без повторной сериализации
+    body_size = len(json.dumps(data, separators=(",", ":"))) if data else 0
+    item_size = max(1, body_size // len(ids))
+
+    items: dict[int, dict | None | Exception] = {}
+    for media_id in ids:
+        alias = f"m{media_id}"
+        media = data.get(alias)
+
+        # 404 по алиасу — просто "не найдено", остальное — ошибка элемента
+        error = errors.get(alias)
+        if media is None and error and error.get("status") != 404:
+            items[media_id] = MediaBatchError(error.get("message", "AniList error"))
+            continue
+
+        items[media_id] = media
+        store_result(MEDIA_DETAILS_QUERY, {"id": media_id}, {"data": {"Media": media}}, item_size)
+
+    return items
+
+
+async def fetch_media_batch(
+    ids: list[int],
+    priority: Priority = Priority.INTERACTIVE,
+) -> dict[int, dict | None | Exception]:
+    """
+    Детали нескольких медиа: из кэша media_details, промахи —
+    одним или несколькими (по MEDIA_BATCH_CHUNK) запросами к AniList.
+
+    Значение по id: dict — медиа, None — не найдено, Exception — ошибка
+    """
+    items: dict[int, dict | None | Exception] = {}
+    misses: list[int] = []
+
+    for media_id in ids:
+        cached = cached_result(MEDIA_DETAILS_QUERY, {"id": media_id})
+        if cached is not None:
+            items[media_id] = (cached.get("data") or {}).get("Media")
+        else:
+            misses.append(media_id)
+
+    chunk = config.MEDIA_BATCH_CHUNK
+    chunks = [misses[i:i + chunk] for i in range(0, len(misses), chunk)]
+
+    for fetched in await asyncio.gather(*(_fetch_chunk(c, priority) for c in chunks)):
+        items.update(fetched)
+
+    logger.info("Media batch: %s id, из кэша %s, запросов %s", len(ids), len(ids) - len(misses), len(chunks))
+    return items
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+
+from app.core import config
+from app.core.graphql import gql, selection_set
+from app.services.anilist_service import Priority, anilist_query, cached_result, store_result
+from app.services.media_batch import fetch_media_batch
+
+logger = logging.getLogger(__name__)
+
+MEDIA = "media"
+CHARACTER = "character"
+STAFF = "staff"
+
+# связи, по которым чаще всего переходят дальше, — в порядке важности
+RELATION_ORDER = ("SEQUEL", "PREQUEL", "PARENT", "SIDE_STORY", "SPIN_OFF", "ALTERNATIVE")
+
+
+class EntityBatch:
+    """
+    Пакетный запрос Character / Staff с алиасами; каждый ответ кладётся
+    в кэш под тем же ключом, что и у эндпоинта с параметрами по умолчанию
+    """
+
+    def __init__(self, name: str, root: str, variables: dict):
+        self.query = gql(name)
+        self.root = root
+        # переменные эндпоинта без id: страница связей по умолчанию
+        self.variables = variables
+
+    def build(self, ids: list[int]) -> str:
+        fields = selection_set(self.query, self.root)
+        roots = "\n".join(f"  e{entity_id}: {self.root}(id: {entity_id}) {{{fields}}}" for entity_id in ids)
+        return f"query {self.root}Prefetch($page: Int, $perPage: Int) {{\n{roots}\n}}"
+
+    def cached(self, entity_id: int) -> bool:
+        return cached_result(self.query, {"id": entity_id, **self.variables}) is not None
+
+    async def fetch(self, ids: list[int]) -> int:
+        result = await anilist_query(self.build(ids), self.variables, priority=Priority.REFRESH)
+        data = result.get("data") or {}
+        item_size = max(1, len(json.dumps(data, separators=(",", ":"))) // len(ids))
+
+        stored = 0
+        for entity_id in ids:
+            value = data.get(f"e{entity_id}")
+            if value is not None:
+                store_result(self.query, {"id": entity_id, **self.variables}, {"data": {self.root: value}}, item_size)
+                stored += 1
+        return stored
+
+
+# переменные — как у /character/{id} и /staff/{id} без параметров
+BATCHES = {
+    CHARACTER: EntityBatch("character", "Character", {"page": 1, "perPage": 25}),
+    STAFF: EntityBatch("staff", "Staff", {"page": 1, "perPage": 12}),
+}
+MEDIA_DETAILS_QUERY = gql("media_details")
+
+
+def _edges(media: dict, connection: str) -> list[dict]:
+    return [
+        edge for edge in ((media.get(connection) or {}).get("edges") or [])
+        if edge and (edge.get("node") or {}).get("id")
+    ]
+
+
+class Prefetcher:
+    """
+    Фоновый прогрев кэша по открытой странице тайтла: сиквел / приквел,
+    главные персонажи и стафф — то, куда чаще всего кликают следующим.
+
+    Запросы идут с приоритетом REFRESH (уступают пользовательским),
+    пакетами, в пределах бюджета per_minute запросов к AniList в минуту
+    и max_fanout сущностей на один просмотр. Уже закэшированное не
+    качается. used / fetched — доля прогретых сущностей, которые
+    действительно открыли в течение track_seconds.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        per_minute: int,
+        max_fanout: int,
+        quotas: dict[str, int],
+        track_seconds: int,
+    ):
+        self.enabled = enabled
+        self.per_minute = per_minute
+        self.max_fanout = max_fanout
+        self.quotas = quotas
+        self.track_seconds = track_seconds
+
+        self._requests: deque[float] = deque()          # время запросов за последнюю минуту
+        self._inflight: set[tuple[str, int]] = set()
+        self._prefetched: OrderedDict[tuple[str, int], float] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+        self.views = 0
+        self.planned = 0
+        self.requests = 0
+        self.fetched = 0
+        self.used = 0
+        self.over_budget = 0
+        self.errors = 0
+
+    # ─── отбор кандидатов ─────────────────────────────────────
+
+    def candidates(self, media: dict) -> list[tuple[str, int]]:
+        relations = [
+            edge for edge in _edges(media, "relations")
+            if edge.get("relationType") in RELATION_ORDER
+        ]
+        relations.sort(key=lambda edge: RELATION_ORDER.index(edge["relationType"]))
+        # MAIN — первыми, внутри роли порядок AniList (по избранному)
+        characters = sorted(_edges(media, "characters"), key=lambda edge: edge.get("role") != "MAIN")
+        staff = _edges(media, "staff")
+
+        picked: list[tuple[str, int]] = []
+        for kind, edges in ((MEDIA, relations), (CHARACTER, characters), (STAFF, staff)):
+            ids = list(dict.fromkeys(edge["node"]["id"] for edge in edges))
+            picked.extend((kind, entity_id) for entity_id in ids[: self.quotas.get(kind, 0)])
+        return picked[: self.max_fanout]
+
+    def _is_cached(self, kind: str, entity_id: int) -> bool:
+        if kind == MEDIA:
+            return cached_result(MEDIA_DETAILS_QUERY, {"id": entity_id}) is not None
+        return BATCHES[kind].cached(entity_id)
+
+    # ─── бюджет ───────────────────────────────────────────────
+
+    def _take_budget(self, requests: int) -> bool:
+        now = time.monotonic()
+        while self._requests and now - self._requests[0] > 60:
+            self._requests.popleft()
+        if len(self._requests) + requests > self.per_minute:
+            return False
+        self._requests.extend([now] * requests)
+        return True
+
+    # ─── события эндпоинтов ───────────────────────────────────
+
+    def media_viewed(self, media: dict) -> None:
+        """
+        Открыта полная страница тайтла: планируем прогрев связанных сущностей
+        """
+        if not self.enabled:
+            return
+        self.views += 1
+
+        groups: dict[str, list[int]] = {}
+        for kind, entity_id in self.candidates(media):
+            key = (kind, entity_id)
+            if key in self._inflight or self._is_cached(kind, entity_id):
+                continue
+            groups.setdefault(kind, []).append(entity_id)
+        if not groups:
+            return
+
+        chunk = config.MEDIA_BATCH_CHUNK
+        requests = sum(math.ceil(len(ids) / chunk) if kind == MEDIA else 1 for kind, ids in groups.items())
+        if not self._take_budget(requests):
+            self.over_budget += 1
+            return
+
+        for kind, ids in groups.items():
+            self._inflight.update((kind, entity_id) for entity_id in ids)
+            self.planned += len(ids)
+            task = asyncio.create_task(self._fetch(kind, ids))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def viewed(self, kind: str, entity_id: int) -> None:
+        """
+        Сущность открыли: если её прогревали — прогрев окупился
+        """
+        prefetched_at = self._prefetched.pop((kind, entity_id), None)
+        if prefetched_at is not None and time.monotonic() - prefetched_at <= self.track_seconds:
+            self.used += 1
+
+    # ─── загрузка ─────────────────────────────────────────────
+
+    async def _fetch(self, kind: str, ids: list[int]) -> None:
+        try:
+            if kind == MEDIA:
+                fetched = await fetch_media_batch(ids, priority=Priority.REFRESH)
+                self.requests += math.ceil(len(ids) / config.MEDIA_BATCH_CHUNK)
+                done = [media_id for media_id, media in fetched.items() if isinstance(media, dict)]
+            else:
+                self.requests += 1
+                await BATCHES[kind].fetch(ids)
+                done = ids
+        except Exception as e:
+            # прогрев — оптимизация: ошибки (в т.ч. квота) только считаем
+            self.errors += 1
+            logger.warning("Префетч %s %s не удался: %s", kind, ids, e)
+            return
+        finally:
+            self._inflight.difference_update((kind, entity_id) for entity_id in ids)
+
+        now = time.monotonic()
+        for entity_id in done:
+            self._prefetched[(kind, entity_id)] = now
+            self._prefetched.move_to_end((kind, entity_id))
+        self.fetched += len(done)
+        while self._prefetched and now - next(iter(self._prefetched.values())) > self.track_seconds:
+            self._prefetched.popitem(last=False)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "views": self.views,
+            "planned": self.planned,
+            "requests": self.requests,
+            "fetched": self.fetched,
+            "used": self.used,
+            "hit_rate": round(self.used / self.fetched, 3) if self.fetched else 0.0,
+            "over_budget": self.over_budget,
+            "errors": self.errors,
+        }
+
+
+prefetcher = Prefetcher(
+    enabled=config.PREFETCH_ENABLED,
+    per_minute=config.PREFETCH_PER_MINUTE,
+    max_fanout=config.PREFETCH_MAX_FANOUT,
+    quotas={
+        MEDIA: config.PREFETCH_RELATIONS,
+        CHARACTER: config.PREFETCH_CHARACTERS,
+        STAFF: config.PREFETCH_STAFF,
+    },
+    track_seconds=config.PREFETCH_TRACK_SECONDS,
+)
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from app.core import config
+from app.core.graphql import operation_name
+
+logger = logging.getLogger(__name__)
+
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+MODES = (LIVE, RECORD, REPLAY)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    key         TEXT PRIMARY KEY,
+    operation   TEXT NOT NULL,
+    status      INTEGER NOT NULL,
+    body        BLOB NOT NULL,
+    recorded_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# записываем только то, что имеет смысл воспроизводить
+RECORDABLE_STATUSES = (200, 404)
+
+
+def recording_key(content: bytes) -> tuple[str, str]:
+    """
+    (ключ, имя операции) для тела POST {"query", "variables"}.
+    Текст запроса входит в ключ: sparse-варианты и пакеты с одной
+    операцией и переменными — разные запросы
+    """
+    payload = json.loads(content)
+    query = payload.get("query") or ""
+    variables = json.dumps(payload.get("variables") or {}, sort_keys=True, separators=(",", ":"))
+    operation = operation_name(query)
+    digest = hashlib.blake2b(f"{query}\0{variables}".encode(), digest_size=16).hexdigest()
+    return f"{operation}:{digest}", operation
+
+
+class RecordStore:
+    """
+    Записанные пары запрос/ответ AniList в SQLite.
+
+    Тела хранятся сжатыми (zlib). Для воспроизведения весь индекс
+    поднимается в память при старте: поиск — один dict lookup,
+    распаковка — только тела, которое реально отдаём.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._conn: sqlite3.Connection | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._index: dict[str, tuple[int, bytes]] | None = None
+        self._lock = asyncio.Lock()
+
+        self.recorded = 0
+        self.replayed = 0
+        self.missing = 0
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    async def _run_db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def start(self) -> None:
+        if self._conn is not None:
+            return
+        async with self._lock:
+            if self._conn is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+            await self._run_db(self._open)
+
+    async def stop(self) -> None:
+        if self._conn is None:
+            return
+        await self._run_db(self._conn.close)
+        self._conn = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    # ─── record ────────────────────────────────────────────────
+
+    def _insert(self, row: tuple) -> None:
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO recordings (key, operation, status, body, recorded_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    status = excluded.status,
+                    body = excluded.body,
+                    recorded_at = excluded.recorded_at
+                """,
+                row,
+            )
+
+    async def record(self, key: str, operation: str, status: int, body: bytes) -> None:
+        await self.start()
+        compressed = zlib.compress(body)
+        try:
+            await self._run_db(self._insert, (key, operation, status, compressed, time.time()))
+        except sqlite3.Error:
+            logger.exception("Не удалось записать ответ AniList %s", key)
+            return
+        self.recorded += 1
+        if self._index is not None:
+            self._index[key] = (status, compressed)
+
+    # ─── replay ────────────────────────────────────────────────
+
+    def _load(self) -> dict[str, tuple[int, bytes]]:
+        return {key: (status, body) for key, status, body in self._conn.execute("SELECT key, status, body FROM recordings")}
+
+    async def load(self) -> int:
+        await self.start()
+        async with self._lock:
+            if self._index is None:
+                self._index = await self._run_db(self._load)
+                logger.info("Записи AniList загружены: %s ответов из %s", len(self._index), self.path)
+        return len(self._index)
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def lookup(self, key: str) -> tuple[int, bytes] | None:
+        """
+        (статус, распакованное тело) или None
+        """
+        found = self._index.get(key) if self._index is not None else None
+        if found is None:
+            self.missing += 1
+            return None
+        self.replayed += 1
+        status, body = found
+        return status, zlib.decompress(body)
+
+    def stats(self) -> dict:
+        return {
+            "mode": config.ANILIST_TRANSPORT,
+            "recordings": len(self._index) if self._index is not None else None,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "missing": self.missing,
+        }
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Живой запрос в AniList + сохранение пары запрос/ответ
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, store: RecordStore):
+        self.inner = inner
+        self.store = store
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        if request.method != "POST" or response.status_code not in RECORDABLE_STATUSES:
+            return response
+
+        # сырое тело (возможно, gzip) отдаём клиенту как есть,
+        # в запись — уже распакованное
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        await response.aclose()
+        replayed = httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            content=raw,
+            extensions=response.extensions,
+        )
+
+        key, operation = recording_key(request.content)
+        await self.store.record(key, operation, response.status_code, replayed.content)
+        return replayed
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Ответы только из записей, без сети. Незаписанный запрос — ошибка
+    соединения, как если бы AniList был недоступен
+    """
+
+    def __init__(self, store: RecordStore):
+        self.store = store
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.store.loaded:
+            await self.store.load()
+
+        key, operation = recording_key(request.content)
+        found = self.store.lookup(key)
+        if found is None:
+            logger.warning("Нет записи для %s (%s)", operation, key)
+            raise httpx.ConnectError(f"Нет записанного ответа для {operation}", request=request)
+
+        status, body = found
+        return httpx.Response(
+            status,
+            headers={"Content-Type": "application/json"},
+            content=body,
+            request=request,
+        )
+
+
+recordings = RecordStore(config.ANILIST_RECORDINGS_PATH)
+
+
+def offline() -> bool:
+    """
+    Режим воспроизведения: сети и квоты AniList нет
+    """
+    return config.ANILIST_TRANSPORT == REPLAY
+
+
+def wrap_transport(network: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """
+    Транспорт клиента AniList по config.ANILIST_TRANSPORT
+    """
+    mode = config.ANILIST_TRANSPORT
+    if mode == RECORD:
+        return RecordingTransport(network, recordings)
+    if mode == REPLAY:
+        return ReplayTransport(recordings)
+    if mode not in MODES:
+        logger.warning("Неизвестный ANILIST_TRANSPORT=%r, используем live", mode)
+    return network
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable
+
+from app.services.cache import CacheEntry
+from app.services.scheduler import AniListRateLimited, scheduler
+
+logger = logging.getLogger(__name__)
+
+# refresh(key, name, query, variables) — перезапрос мимо кэша с записью результата
+Refresh = Callable[[str, str, str, dict], Awaitable[CacheEntry]]
+
+
+class HotKey:
+    __slots__ = ("name", "query", "variables", "score", "seen_at", "expires_at", "lead", "refreshing")
+
+    def __init__(self, name: str, query: str, variables: dict):
+        self.name = name
+        self.query = query
+        self.variables = variables
+        self.score = 0.0
+        self.seen_at = 0.0
+        self.expires_at = 0.0
+        self.lead = 0.0
+        self.refreshing = False
+
+
+class RefreshAhead:
+    """
+    Обновление горячих ключей кэша до истечения TTL.
+
+    Для запросов из names считается частота обращений к ключу
+    (экспоненциально затухающая, период полураспада half_life). Ключ
+    с частотой не ниже min_hits перезапрашивается в фоне за lead доли
+    TTL до истечения; момент сдвинут случайным jitter, чтобы ключи с
+    одинаковым TTL не обновлялись одновременно. Пока идёт обновление
+    (или если оно не успело), истёкшая запись отдаётся ещё stale секунд.
+
+    На обновления уходит не больше share от текущей квоты AniList в
+    минуту (по планировщику); запросы — с приоритетом REFRESH.
+    """
+
+    def __init__(
+        self,
+        names: frozenset[str],
+        refresh: Refresh,
+        *,
+        enabled: bool,
+        share: float,
+        lead: float,
+        jitter: float,
+        min_hits: float,
+        half_life: float,
+        stale: float,
+        max_keys: int,
+        interval: float,
+    ):
+        self.names = names
+        self.refresh = refresh
+        self.enabled = enabled
+        self.share = share
+        self.lead = lead
+        self.jitter = jitter
+        self.min_hits = min_hits
+        self.half_life = half_life
+        self.stale = stale
+        self.max_keys = max_keys
+        self.interval = interval
+
+        self._keys: OrderedDict[str, HotKey] = OrderedDict()
+        self._spent: deque[float] = deque()
+        self._tasks: set[asyncio.Task] = set()
+        self._loop: asyncio.Task | None = None
+
+        self.refreshes = 0
+        self.revalidations = 0
+        self.over_budget = 0
+        self.errors = 0
+
+    def stale_for(self, name: str) -> float:
+        """
+        Сколько секунд после истечения запись name ещё можно отдавать
+        """
+        return self.stale if self.enabled and name in self.names else 0.0
+
+    # ─── учёт обращений ───────────────────────────────────────
+
+    def _decayed(self, hot: HotKey, now: float) -> float:
+        return hot.score * math.exp2(-(now - hot.seen_at) / self.half_life)
+
+    def touch(self, key: str, name: str, query: str, variables: dict, entry: CacheEntry) -> None:
+        """
+        Обращение к ключу (попадание в кэш или свежая загрузка)
+        """
+        # expires_at == 0 — ответ не попал в кэш (слишком большой)
+        if not self.enabled or name not in self.names or entry.negative or not entry.expires_at:
+            return
+
+        now = time.monotonic()
+        hot = self._keys.get(key)
+        if hot is None:
+            hot = self._keys[key] = HotKey(name, query, variables)
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+
+        hot.score = self._decayed(hot, now) + 1.0
+        hot.seen_at = now
+        if entry.expires_at != hot.expires_at:
+            self._schedule(hot, entry)
+
+        # истёкшая запись уже отдана — обновляем немедленно
+        if entry.expires_at <= now and not hot.refreshing:
+            self.revalidations += 1
+            self._start(key, hot)
+
+    def _schedule(self, hot: HotKey, entry: CacheEntry) -> None:
+        ttl = max(0.0, entry.expires_at - time.monotonic())
+        hot.expires_at = entry.expires_at
+        hot.lead = ttl * self.lead * random.uniform(1.0 - self.jitter, 1.0)
+
+    # ─── обновление ───────────────────────────────────────────
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        while self._spent and now - self._spent[0] > 60:
+            self._spent.popleft()
+        if len(self._spent) >= scheduler.rate * 60 * self.share:
+            return False
+        self._spent.append(now)
+        return True
+
+    def _start(self, key: str, hot: HotKey) -> None:
+        if not self._take_budget():
+            self.over_budget += 1
+            return
+        hot.refreshing = True
+        task = asyncio.create_task(self._refresh(key, hot))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: str, hot: HotKey) -> None:
+        try:
+            entry = await self.refresh(key, hot.name, hot.query, hot.variables)
+            self.refreshes += 1
+            if entry.expires_at:
+                self._schedule(hot, entry)
+        except AniListRateLimited:
+            # квота занята пользователями — повторим на следующем проходе
+            self.over_budget += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Фоновое обновление %s не удалось: %s", key, e)
+        finally:
+            hot.refreshing = False
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+
+            for key, hot in list(self._keys.items()):
+                if hot.refreshing:
+                    continue
+                score = self._decayed(hot, now)
+                if score < self.min_hits:
+                    # остыл и уже не отдаётся даже устаревшим — забываем
+                    if now > hot.expires_at + self.stale:
+                        del self._keys[key]
+                    continue
+                if hot.expires_at - now <= hot.lead:
+                    self._start(key, hot)
+
+    def start(self) -> None:
+        if self.enabled and self._loop is None:
+            self._loop = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        if self._loop is not None:
+            tasks.append(self._loop)
+            self._loop = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "tracked": len(self._keys),
+            "hot": sum(self._decayed(hot, now) >= self.min_hits for hot in self._keys.values()),
+            "refreshes": self.refreshes,
+            "revalidations": self.revalidations,
+            "over_budget": self.over_budget,
+            "errors": self.errors,
+        }
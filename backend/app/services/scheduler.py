@@ -0,0 +1,214 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    # меньше — важнее
+    INTERACTIVE = 0   # страницы, которые ждёт пользователь
+    BACKGROUND = 1    # фоновые сканы: дни рождения, каталоги сезонов
+    REFRESH = 2       # обновление и прогрев кэша
+
+
+class AniListRateLimited(RuntimeError):
+    """
+    Квота AniList исчерпана: либо AniList ответил 429,
+    либо ожидание слота превысит допустимый дедлайн
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamScheduler:
+    """
+    Token bucket перед HTTP клиентом AniList.
+
+    Ожидающие запросы стоят в очереди с приоритетами: запросы
+    пользователя обгоняют фоновые. Если ждать дольше дедлайна или
+    очередь полна — сразу отказ (AniListRateLimited), а не таймаут.
+    Состояние корректируется по заголовкам X-RateLimit-* и Retry-After.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: int,
+        burst: int,
+        max_queue: int,
+        deadlines: dict[Priority, float],
+    ):
+        self.rate = rate_per_minute / 60
+        self.capacity = float(burst)
+        self.max_queue = max_queue
+        self.deadlines = deadlines
+
+        self.tokens = float(burst)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+
+        self.granted = 0
+        self.rejected = 0
+        self.throttled = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def estimated_wait(self, priority: Priority) -> float:
+        now = time.monotonic()
+        self._refill(now)
+
+        ahead = sum(1 for p, _, fut in self._queue if p <= priority and not fut.done())
+        missing = ahead + 1 - self.tokens
+        blocked = max(0.0, self.blocked_until - now)
+
+        return blocked + max(0.0, missing) / self.rate
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE, deadline: float | None = None) -> None:
+        now = time.monotonic()
+        self._refill(now)
+
+        # быстрый путь: очередь пуста и токен есть
+        if not self._queue and self.tokens >= 1 and now >= self.blocked_until:
+            self.tokens -= 1
+            self.granted += 1
+            return
+
+        if deadline is None:
+            deadline = self.deadlines[priority]
+
+        wait = self.estimated_wait(priority)
+        if len(self._queue) >= self.max_queue or wait > deadline:
+            self.rejected += 1
+            raise AniListRateLimited("Лимит запросов к AniList исчерпан", retry_after=wait)
+
+        fut = asyncio.get_running_loop().create_future()
+        item = (priority, next(self._seq), fut)
+        heapq.heappush(self._queue, item)
+        self._ensure_dispatcher()
+
+        try:
+            await asyncio.wait_for(fut, timeout=deadline)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AniListRateLimited(
+                "Лимит запросов к AniList исчерпан",
+                retry_after=self.estimated_wait(priority),
+            )
+        finally:
+            # дедлайн или отмена: не держим место в очереди до выборки диспетчером
+            if fut.cancelled():
+                self._drop(item)
+
+    def _drop(self, item: tuple[int, int, asyncio.Future]) -> None:
+        try:
+            self._queue.remove(item)
+        except ValueError:
+            return
+        heapq.heapify(self._queue)
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while self._queue:
+            now = time.monotonic()
+            self._refill(now)
+
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            _, _, fut = heapq.heappop(self._queue)
+            # ожидающий уже отменён или вышел по дедлайну
+            if fut.done():
+                continue
+
+            self.tokens -= 1
+            self.granted += 1
+            fut.set_result(None)
+
+    def observe(self, status_code: int, headers) -> float | None:
+        """
+        Учитывает заголовки ответа AniList. Для 429 возвращает,
+        сколько секунд нужно подождать
+        """
+        now = time.monotonic()
+        self._refill(now)
+
+        limit = headers.get("X-RateLimit-Limit")
+        if limit and limit.isdigit() and int(limit) > 0:
+            self.rate = int(limit) / 60
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining and remaining.isdigit():
+            self.tokens = min(self.tokens, float(remaining))
+
+        if status_code != 429:
+            return None
+
+        retry_after = _parse_retry_after(headers)
+        self.throttled += 1
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        logger.warning("AniList 429, пауза %.1f с", retry_after)
+        return retry_after
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_minute": round(self.rate * 60, 1),
+            "tokens": round(self.tokens, 2),
+            "queued": self.queued,
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+        }
+
+
+def _parse_retry_after(headers) -> float:
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+    reset = headers.get("X-RateLimit-Reset")
+    if reset and reset.isdigit():
+        return max(0.0, int(reset) - time.time())
+
+    return 60.0
+
+
+scheduler = UpstreamScheduler(
+    rate_per_minute=config.ANILIST_RATE_PER_MINUTE,
+    burst=config.ANILIST_BURST,
+    max_queue=config.SCHEDULER_MAX_QUEUE,
+    deadlines={
+        Priority.INTERACTIVE: config.SCHEDULER_DEADLINE_INTERACTIVE,
+        Priority.BACKGROUND: config.SCHEDULER_DEADLINE_BACKGROUND,
+        Priority.REFRESH: config.SCHEDULER_DEADLINE_REFRESH,
+    },
+)
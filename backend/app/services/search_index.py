@@ -0,0 +1,385 @@
+import heapq
+import logging
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+from typing import Iterable
+
+from app.services.entity_store import MediaRecord, entity_store
+
+logger = logging.getLogger(__name__)
+
+TITLE_SLOTS = ("title_romaji", "title_english", "title_native", "title_user_preferred")
+
+SPLIT_RE = re.compile(r"[\W_]+")
+
+# уверенность совпадений: целиком / по префиксу / с опечатками
+EXACT = 1.0
+PREFIX = 0.9
+# при меньшей уверенности — запасной поиск в AniList
+CONFIDENT = 0.6
+
+# опечатки ищем только среди слов с таким сходством триграмм
+FUZZY_MIN_SIMILARITY = 0.45
+FUZZY_CANDIDATES = 3
+# кандидаты на исправление — слова длиной ±FUZZY_LENGTH_DELTA
+FUZZY_LENGTH_DELTA = 2
+# последнее слово короче — ищем только точное совпадение
+MIN_PREFIX = 1
+# префикс, под который попадает больше id, не раскрываем в множество:
+# такие совпадения часты, их дешевле найти обходом по популярности
+PREFIX_UNION_MAX = 20000
+PREFIX_UNION_MAX_TOKENS = 1000
+# больше кандидатов — выбираем их обходом id по популярности
+SCAN_THRESHOLD = 2000
+SCAN_OVERSAMPLE = 4
+
+
+def normalize(text: str) -> list[str]:
+    """
+    "Shingeki no Kyojin: The Final Season" -> ["shingeki", "no", "kyojin", "the", "final", "season"]
+    Регистр и диакритика не важны: "Pokémon" == "pokemon"
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return [token for token in SPLIT_RE.split(stripped.casefold()) if token]
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchHit:
+    __slots__ = ("media_id", "confidence", "rank")
+
+    def __init__(self, media_id: int, confidence: float, rank: int):
+        self.media_id = media_id
+        self.confidence = confidence
+        self.rank = rank
+
+
+class SearchIndex:
+    """
+    Поиск по названиям всех Media, которые прошли через кэш
+    (romaji / english / native / userPreferred).
+
+    - слово -> id: точное совпадение слов;
+    - отсортированный словарь слов: последнее слово запроса как префикс
+      (typeahead), диапазон через bisect;
+    - триграммы слов словаря: исправление опечаток.
+
+    Триграммы строятся по словарю (десятки тысяч слов), а не по
+    названиям — так индекс на 100k тайтлов остаётся небольшим.
+    Ранжирование: уверенность совпадения, затем popularity + favourites.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, set[int]] = {}
+        self._vocabulary: list[str] = []
+        self._new_tokens: list[str] = []
+        self._trigrams: dict[tuple[str, int], set[str]] = {}
+        # " слово слово ... ": префикс/слово проверяются поиском подстроки
+        self._text: dict[int, str] = {}
+        self._rank: dict[int, int] = {}
+        self._type: dict[int, str | None] = {}
+        self._by_rank: list[int] = []
+        # удалённые id, которые ещё стоят в _by_rank (до пересортировки)
+        self._unranked: set[int] = set()
+        self._rank_changes = 0
+
+        self.lookups = 0
+        self.fallbacks = 0
+
+    def __len__(self) -> int:
+        return len(self._text)
+
+    # ─── индексирование ───────────────────────────────────────
+
+    def _add_token(self, token: str, media_id: int) -> None:
+        ids = self._postings.get(token)
+        if ids is None:
+            ids = self._postings[token] = set()
+            # удалённое слово остаётся в словаре — второй раз не добавляем
+            if not self._in_vocabulary(token):
+                self._new_tokens.append(token)
+            for gram in trigrams(token):
+                self._trigrams.setdefault((gram, len(token)), set()).add(token)
+        ids.add(media_id)
+
+    def _in_vocabulary(self, token: str) -> bool:
+        i = bisect_left(self._vocabulary, token)
+        return i < len(self._vocabulary) and self._vocabulary[i] == token
+
+    def _remove_token(self, token: str, media_id: int) -> None:
+        ids = self._postings.get(token)
+        if ids is None:
+            return
+        ids.discard(media_id)
+        if not ids:
+            del self._postings[token]
+            for gram in trigrams(token):
+                words = self._trigrams.get((gram, len(token)))
+                if words is not None:
+                    words.discard(token)
+                    if not words:
+                        del self._trigrams[gram, len(token)]
+
+    def add(self, record: MediaRecord) -> None:
+        """
+        Вставка/обновление одной Media (вызывается хранилищем сущностей)
+        """
+        media_id = record.id
+        titles = [getattr(record, slot, None) for slot in TITLE_SLOTS]
+        tokens = list(dict.fromkeys(token for title in titles if title for token in normalize(title)))
+        text = f" {' '.join(tokens)} "
+        old = self._text.get(media_id)
+        if not tokens and old is None:
+            return
+
+        rank = (getattr(record, "popularity", None) or 0) + (getattr(record, "favourites", None) or 0)
+        if old is None:
+            if media_id in self._unranked:
+                self._unranked.discard(media_id)
+            else:
+                self._by_rank.append(media_id)
+            self._rank_changes += 1
+        elif self._rank[media_id] != rank:
+            self._rank_changes += 1
+        self._rank[media_id] = rank
+        self._type[media_id] = getattr(record, "type", None)
+
+        if old == text:
+            return
+        previous = set(old.split()) if old else set()
+        for token in previous.difference(tokens):
+            self._remove_token(token, media_id)
+        for token in set(tokens) - previous:
+            self._add_token(token, media_id)
+        self._text[media_id] = text
+
+    def remove(self, media_id: int) -> None:
+        """
+        Удаление Media, вытесненной из хранилища сущностей:
+        индекс не переживает хранилище и не растёт без предела
+        """
+        text = self._text.pop(media_id, None)
+        if text is None:
+            return
+        for token in text.split():
+            self._remove_token(token, media_id)
+        del self._rank[media_id]
+        del self._type[media_id]
+        # из _by_rank id уйдёт при пересортировке, до неё — пропускается
+        self._unranked.add(media_id)
+        self._rank_changes += 1
+
+    def add_many(self, records: Iterable[MediaRecord]) -> None:
+        for record in records:
+            self.add(record)
+        # сортировки — сразу, а не на первом поиске
+        self._sync_vocabulary()
+        self._ranked()
+
+    # ─── поиск ────────────────────────────────────────────────
+
+    def _sync_vocabulary(self) -> None:
+        if self._new_tokens:
+            # Timsort: отсортированный список + короткий хвост — почти O(n)
+            # слово могло быть удалено и добавлено снова до сортировки
+            self._vocabulary.extend(dict.fromkeys(self._new_tokens))
+            self._vocabulary.sort()
+            self._new_tokens.clear()
+
+    def _prefix_tokens(self, prefix: str) -> list[str]:
+        self._sync_vocabulary()
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + "\uffff", start)
+        # удалённые слова остаются в словаре до пересборки
+        return [token for token in self._vocabulary[start:end] if token in self._postings]
+
+    def _ranked(self) -> list[int]:
+        """
+        Все id по убыванию rank. Пересортировка — только после заметного
+        числа изменений: новые id до этого просто дописаны в конец
+        """
+        if self._rank_changes > max(1000, len(self._by_rank) // 10):
+            self._by_rank = sorted(self._rank, key=self._rank.__getitem__, reverse=True)
+            self._unranked.clear()
+            self._rank_changes = 0
+        return self._by_rank
+
+    def _similar_tokens(self, word: str) -> list[tuple[str, float]]:
+        grams = trigrams(word)
+        lengths = range(max(1, len(word) - FUZZY_LENGTH_DELTA), len(word) + FUZZY_LENGTH_DELTA + 1)
+        # подсчёт общих триграмм целиком в C, точное сходство —
+        # только для слов с наибольшим числом общих
+        counts = Counter(chain.from_iterable(
+            self._trigrams[gram, length] for gram in grams for length in lengths if (gram, length) in self._trigrams
+        ))
+
+        scored = []
+        for token, shared in counts.most_common(FUZZY_CANDIDATES * 4):
+            similarity = shared / (len(grams) + len(token) + 1 - shared)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((token, similarity))
+        return heapq.nlargest(FUZZY_CANDIDATES, scored, key=lambda item: item[1])
+
+    def _constraint(self, word: str, is_last: bool, fuzzy: bool):
+        """
+        Условие на одно слово запроса:
+        - [(множество id, уверенность), ...] по убыванию уверенности;
+        - str — префикс слишком общий, проверяем его на кандидатах;
+        - None — слово ничему не соответствует
+        """
+        if is_last:
+            tokens = self._prefix_tokens(word)
+            if len(tokens) > PREFIX_UNION_MAX_TOKENS:
+                return word
+            total = 0
+            for token in tokens:
+                total += len(self._postings[token])
+                if total > PREFIX_UNION_MAX:
+                    return word
+            if tokens:
+                options = []
+                if word in self._postings:
+                    options.append((self._postings[word], EXACT))
+                longer = [self._postings[token] for token in tokens if token != word]
+                if longer:
+                    options.append((longer[0] if len(longer) == 1 else set().union(*longer), PREFIX))
+                return options
+
+        ids = self._postings.get(word)
+        if ids:
+            return [(ids, EXACT)]
+        if not fuzzy:
+            return None
+        similar = self._similar_tokens(word)
+        return [(self._postings[token], similarity * PREFIX) for token, similarity in similar] or None
+
+    def _confidence(self, media_id: int, constraints: list) -> float:
+        confidence = EXACT
+        for constraint in constraints:
+            if isinstance(constraint, str):
+                if f" {constraint} " not in self._text[media_id]:
+                    confidence = min(confidence, PREFIX)
+                continue
+            for ids, option in constraint:
+                if media_id in ids:
+                    confidence = min(confidence, option)
+                    break
+        return confidence
+
+    def _narrow(self, sets: list) -> set[int] | None:
+        candidates = None
+        # пересечение множеств в C, начиная с самого узкого
+        for options in sorted(sets, key=lambda options: sum(len(ids) for ids, _ in options)):
+            ids = options[0][0] if len(options) == 1 else set().union(*(ids for ids, _ in options))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        return candidates
+
+    def _match(self, words: list[str], fuzzy: bool, limit: int, media_type: str | None) -> list[SearchHit]:
+        constraints = []
+        for word in words[:-1]:
+            constraint = self._constraint(word, False, fuzzy)
+            if constraint is None:
+                return []
+            constraints.append(constraint)
+
+        candidates = self._narrow(constraints)
+        if candidates is not None and len(candidates) <= SCAN_THRESHOLD:
+            # первые слова уже сузили выбор — последнее проверяем
+            # как префикс, не раскрывая его в множество
+            last = words[-1]
+            if not fuzzy or self._prefix_tokens(last):
+                constraints.append(last)
+            else:
+                constraint = self._constraint(last, True, fuzzy)
+                if constraint is None:
+                    return []
+                constraints.append(constraint)
+                candidates = candidates & self._narrow([constraint])
+        else:
+            constraint = self._constraint(words[-1], True, fuzzy)
+            if constraint is None:
+                return []
+            constraints.append(constraint)
+            if not isinstance(constraint, str):
+                candidates = self._narrow([constraint]) if candidates is None else candidates & self._narrow([constraint])
+        if candidates is not None and not candidates:
+            return []
+
+        prefixes = [f" {constraint}" for constraint in constraints if isinstance(constraint, str)]
+
+        def accept(media_id: int) -> bool:
+            if media_type is not None and self._type.get(media_id) not in (media_type, None):
+                return False
+            text = self._text[media_id]
+            return all(prefix in text for prefix in prefixes)
+
+        if candidates is not None and (len(candidates) <= SCAN_THRESHOLD or not prefixes):
+            matched = [media_id for media_id in candidates if accept(media_id)]
+        else:
+            # кандидатов много, а префикс проверяется по одному:
+            # идём по id в порядке популярности, пока не наберём с запасом
+            matched = []
+            text = self._text
+            for media_id in self._ranked():
+                if media_id not in text:
+                    continue
+                if (candidates is None or media_id in candidates) and accept(media_id):
+                    matched.append(media_id)
+                    if len(matched) >= limit * SCAN_OVERSAMPLE:
+                        break
+
+        rank = self._rank
+        if all(not isinstance(constraint, str) and len(constraint) == 1 for constraint in constraints):
+            # у всех совпадений одна уверенность: порядок только по rank
+            confidence = min(constraint[0][1] for constraint in constraints)
+            return [SearchHit(media_id, confidence, rank[media_id]) for media_id in heapq.nlargest(limit, matched, key=rank.__getitem__)]
+
+        scored = [(self._confidence(media_id, constraints), rank[media_id], media_id) for media_id in matched]
+        return [SearchHit(media_id, confidence, score) for confidence, score, media_id in heapq.nlargest(limit, scored)]
+
+    def search(self, query: str, limit: int = 10, media_type: str | None = None) -> list[SearchHit]:
+        """
+        Лучшие совпадения: сначала по уверенности, затем по популярности
+        """
+        self.lookups += 1
+        words = normalize(query)
+        if not words:
+            return []
+
+        hits = self._match(words, False, limit, media_type)
+        if len(hits) >= limit:
+            return hits
+
+        # мало точных совпадений — пробуем исправить опечатки,
+        # если есть незнакомые слова
+        unknown = any(word not in self._postings for word in words[:-1]) or not self._prefix_tokens(words[-1])
+        if not unknown:
+            return hits
+
+        seen = {hit.media_id for hit in hits}
+        fuzzy = [hit for hit in self._match(words, True, limit, media_type) if hit.media_id not in seen]
+        return hits + fuzzy[: limit - len(hits)]
+
+    def stats(self) -> dict:
+        return {
+            "media": len(self._text),
+            "tokens": len(self._postings),
+            "trigrams": len(self._trigrams),
+            "lookups": self.lookups,
+            "fallbacks": self.fallbacks,
+        }
+
+
+search_index = SearchIndex()
+# каждая Media, попавшая в хранилище сущностей, сразу доступна поиску
+entity_store.on_media(search_index.add)
+entity_store.on_media_evicted(search_index.remove)
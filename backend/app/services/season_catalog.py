@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from enum import Enum
+from typing import AsyncIterator
+
+from app.core import config
+from app.core.graphql import gql
+from app.core.images import proxy_image_url
+from app.models.responses import MediaShort
+from app.services.anilist_service import Priority, anilist_query
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+CURRENT_SEASON_QUERY = gql("current_season")
+
+FETCH_PER_PAGE = 50
+
+
+class MediaSeasonEnum(str, Enum):
+    WINTER = "WINTER"
+    SPRING = "SPRING"
+    SUMMER = "SUMMER"
+    FALL = "FALL"
+
+
+SORT_KEYS = {
+    "popularity": lambda m: m.popularity or 0,
+    "score": lambda m: m.averageScore or 0,
+    "title": lambda m: (m.title.romaji or m.title.english or "").lower(),
+}
+
+
+def current_season() -> tuple[MediaSeasonEnum, int]:
+    now = datetime.now(timezone.utc)
+    month = now.month
+
+    if month in (1, 2, 3):
+        season = MediaSeasonEnum.WINTER
+    elif month in (4, 5, 6):
+        season = MediaSeasonEnum.SPRING
+    elif month in (7, 8, 9):
+        season = MediaSeasonEnum.SUMMER
+    else:
+        season = MediaSeasonEnum.FALL
+
+    return season, now.year
+
+
+def _with_cover_fallback(item: dict) -> dict:
+    if item.get("coverImage"):
+        return item
+    fallback = proxy_image_url("cover", item["id"]) or f"https://img.anili.st/media/{item['id']}"
+    return {
+        **item,
+        "coverImage": {
+            "large": fallback,
+            "extraLarge": fallback,
+        },
+    }
+
+
+class SeasonSnapshot:
+    """
+    Весь каталог сезона, уже провалидированный в MediaShort
+    (порядок AniList — POPULARITY_DESC)
+    """
+
+    def __init__(self, season: MediaSeasonEnum, year: int, items: list[MediaShort]):
+        self.season = season
+        self.year = year
+        self.items = items
+        self.fetched_at = time.time()
+        # не позже fetched_at, пока снапшот не читали после загрузки
+        self.accessed_at = self.fetched_at
+        self._sorted: dict[tuple[str, bool], list[MediaShort]] = {}
+
+    def sorted(self, sort: str, descending: bool = True) -> list[MediaShort]:
+        key = (sort, descending)
+        if key not in self._sorted:
+            self._sorted[key] = sorted(self.items, key=SORT_KEYS[sort], reverse=descending)
+        return self._sorted[key]
+
+
+class _Build:
+    """
+    Состояние загрузки каталога сезона (для load / stream / sample)
+    """
+
+    def __init__(self, season: MediaSeasonEnum, year: int):
+        self.season = season
+        self.year = year
+        self.items: list[MediaShort] = []
+        self.seen: set[int] = set()
+        self.total = 0
+        self.pages = 0
+        self.started = time.monotonic()
+
+
+class SeasonCatalog:
+    """
+    Снапшоты каталогов (season, year): первый запрос ждёт загрузку,
+    дальше снапшот обновляется в фоне и все выборки идут из памяти.
+
+    Снапшотов не больше max_snapshots (LRU по обращениям), а в фоне
+    обновляются только те, что читали после прошлой загрузки: обход
+    произвольных сезонов и лет не превращается в постоянные выкачки
+    """
+
+    def __init__(self, refresh_interval: int, idle_ttl: int, concurrency: int, max_snapshots: int):
+        self.refresh_interval = refresh_interval
+        self.idle_ttl = idle_ttl
+        self.concurrency = concurrency
+        self.max_snapshots = max_snapshots
+
+        self._snapshots: OrderedDict[tuple[str, int], SeasonSnapshot] = OrderedDict()
+        self._loads = SingleFlight()
+        self._task: asyncio.Task | None = None
+
+    async def get(self, season: MediaSeasonEnum, year: int) -> SeasonSnapshot:
+        snapshot = self._touch(season, year)
+        if snapshot is None:
+            snapshot = await self._loads.do(
+                f"{season.value}:{year}",
+                lambda: self.load(season, year, Priority.INTERACTIVE),
+            )
+        return snapshot
+
+    def _touch(self, season: MediaSeasonEnum, year: int) -> SeasonSnapshot | None:
+        key = (season.value, year)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            self._snapshots.move_to_end(key)
+            snapshot.accessed_at = time.time()
+        return snapshot
+
+    async def load(self, season: MediaSeasonEnum, year: int, priority: Priority) -> SeasonSnapshot:
+        build = _Build(season, year)
+        async for _ in self._collect(build, priority):
+            pass
+        return self._install(build)
+
+    async def stream(self, season: MediaSeasonEnum, year: int) -> AsyncIterator[MediaShort]:
+        """
+        Каталог сезона по одному тайтлу. Без снапшота — тайтлы каждой
+        страницы AniList отдаются, как только она пришла; дочитанный до
+        конца поток сохраняет снапшот, как load()
+        """
+        snapshot = self._touch(season, year)
+        if snapshot is not None:
+            for item in snapshot.items:
+                yield item
+            return
+
+        build = _Build(season, year)
+        async for item in self._collect(build, Priority.INTERACTIVE):
+            yield item
+        self._install(build)
+
+    async def sample(self, season: MediaSeasonEnum, year: int, k: int) -> AsyncIterator[MediaShort]:
+        """
+        Случайные k тайтлов каталога потоком. Без снапшота — выборка
+        Кнута (алгоритм S) по мере прихода страниц: total известен
+        с первой страницы, каждый тайтл берётся с вероятностью
+        (сколько ещё нужно) / (сколько ещё осталось)
+        """
+        snapshot = self._touch(season, year)
+        if snapshot is not None:
+            for item in random.sample(snapshot.items, min(k, len(snapshot.items))):
+                yield item
+            return
+
+        build = _Build(season, year)
+        seen = 0
+        async for item in self._collect(build, Priority.INTERACTIVE):
+            # total между страницами может сдвинуться — не меньше уже виденного
+            remaining = max(build.total - seen, 1)
+            seen += 1
+            if k > 0 and random.random() * remaining < k:
+                k -= 1
+                yield item
+        self._install(build)
+
+    async def _collect(self, build: _Build, priority: Priority) -> AsyncIterator[MediaShort]:
+        """
+        Тайтлы сезона в порядке AniList, провалидированные по одному;
+        страницы после первой качаются параллельно (не больше concurrency),
+        а отдаются по порядку, как только готова очередная
+        """
+        def variables(page: int) -> dict:
+            return {
+                "season": build.season.value,
+                "seasonYear": build.year,
+                "perPage": FETCH_PER_PAGE,
+                "page": page,
+            }
+
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_page(page: int) -> dict:
+            async with sem:
+                result = await anilist_query(CURRENT_SEASON_QUERY, variables(page), priority=priority)
+            return (result.get("data") or {}).get("Page") or {}
+
+        first = await fetch_page(1)
+        page_info = first.get("pageInfo") or {}
+        build.total = page_info.get("total") or 0
+        last_page = page_info.get("lastPage") or 1
+
+        # остальные страницы — параллельно; брошенный поток отменяет их
+        tasks = [asyncio.create_task(fetch_page(page)) for page in range(2, last_page + 1)]
+        try:
+            for index in range(last_page):
+                page_data = first if index == 0 else await tasks[index - 1]
+                build.pages += 1
+                for item in page_data.get("media") or []:
+                    # между страницами порядок может сдвинуться — без дублей
+                    if item["id"] in build.seen:
+                        continue
+                    build.seen.add(item["id"])
+                    media = MediaShort.model_validate(_with_cover_fallback(item))
+                    build.items.append(media)
+                    yield media
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _install(self, build: _Build) -> SeasonSnapshot:
+        key = (build.season.value, build.year)
+        snapshot = SeasonSnapshot(build.season, build.year, build.items)
+        old = self._snapshots.get(key)
+        if old is not None:
+            # фоновое обновление не считается обращением
+            snapshot.accessed_at = old.accessed_at
+        self._snapshots[key] = snapshot
+        while len(self._snapshots) > self.max_snapshots:
+            evicted, _ = self._snapshots.popitem(last=False)
+            logger.info("Снапшот сезона %s %s вытеснен", *evicted)
+
+        logger.info(
+            "Снапшот сезона %s %s: %s тайтлов, %s страниц за %.2f с",
+            build.season.value, build.year, len(build.items), build.pages, time.monotonic() - build.started,
+        )
+        return snapshot
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(min(60, self.refresh_interval))
+            now = time.time()
+
+            for key, snapshot in list(self._snapshots.items()):
+                # вытеснен, пока обновлялись предыдущие
+                if self._snapshots.get(key) is not snapshot:
+                    continue
+                if now - snapshot.accessed_at > self.idle_ttl:
+                    del self._snapshots[key]
+                    continue
+
+                if now - snapshot.fetched_at < self.refresh_interval:
+                    continue
+                # не читали с прошлой загрузки — обновим, когда понадобится
+                if snapshot.accessed_at <= snapshot.fetched_at:
+                    continue
+
+                try:
+                    await self.load(snapshot.season, snapshot.year, Priority.BACKGROUND)
+                except Exception:
+                    # остаёмся на старом снапшоте, попробуем в следующий раз
+                    logger.exception("Ошибка обновления снапшота %s %s", *key)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+season_catalog = SeasonCatalog(
+    refresh_interval=config.SEASON_SNAPSHOT_REFRESH,
+    idle_ttl=config.SEASON_SNAPSHOT_IDLE,
+    concurrency=config.SEASON_SNAPSHOT_CONCURRENCY,
+    max_snapshots=config.SEASON_SNAPSHOT_MAX,
+)
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Склеивает одновременные одинаковые запросы: первый вызывающий
+    запускает загрузку, остальные ждут ту же задачу.
+
+    - ошибку загрузки получают все ожидающие;
+    - отмена одного ожидающего не отменяет общую загрузку (shield).
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+
+        self.calls = 0
+        self.executions = 0
+        self.deduplicated = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.deduplicated += 1
+
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # если все ожидающие отменились, ошибку никто не заберёт
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("single-flight %s завершился ошибкой: %r", key, task.exception())
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "deduplicated": self.deduplicated,
+            "in_flight": self.in_flight,
+        }
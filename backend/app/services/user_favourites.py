@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import math
+
+from app.core import config
+from app.core.graphql import selection_set
+from app.services.anilist_service import anilist_query, composite_query_entry
+from app.services.cache import CacheEntry
+
+logger = logging.getLogger(__name__)
+
+FAVOURITE_KINDS = ("anime", "manga", "characters", "staff")
+# размер страницы избранного в AniList (как в user_profile.gql)
+PER_PAGE = 25
+# lastPage неизвестен — сколько следующих страниц запрашиваем наперёд
+SPECULATIVE_PAGES = 2
+
+
+def build_pages_query(query: str, pages: list[tuple[str, int]]) -> str:
+    """
+    Один документ с корнем на каждую страницу, например
+    anime3: User(id: $id) { favourites { anime(page: 3, perPage: 25) {...} } }
+    Выборка страницы берётся из запроса профиля (в т.ч. sparse-варианта)
+    """
+    favourites = selection_set(query, "favourites")
+    roots = "\n".join(
+        f"  {kind}{page}: User(id: $id) {{ favourites {{ "
+        f"{kind}(page: {page}, perPage: {PER_PAGE}) {{{selection_set(favourites, kind)}}} }} }}"
+        for kind, page in pages
+    )
+    return f"query FavouritesPages($id: Int) {{\n{roots}\n}}"
+
+
+class _Connection:
+    __slots__ = ("pages", "next_page", "last_page", "open")
+
+    def __init__(self, first: dict):
+        page_info = first.get("pageInfo") or {}
+        self.pages: dict[int, list] = {1: list(first.get("nodes") or [])}
+        self.next_page = 2
+        self.last_page = page_info.get("lastPage") or 0
+        self.open = bool(page_info.get("hasNextPage"))
+
+    def count(self) -> int:
+        return sum(len(nodes) for nodes in self.pages.values())
+
+    def plan(self, limit: int) -> range:
+        """
+        Какие страницы запросить в этой волне
+        """
+        if not self.open:
+            return range(0)
+        needed = math.ceil((limit - self.count()) / PER_PAGE)
+        if needed <= 0:
+            return range(0)
+        # lastPage известен — сразу все нужные страницы, иначе — немного наперёд
+        last = self.next_page + needed - 1
+        last = min(last, self.last_page) if self.last_page else min(last, self.next_page + SPECULATIVE_PAGES - 1)
+        return range(self.next_page, last + 1)
+
+    def add(self, page: int, connection: dict | None) -> None:
+        nodes = (connection or {}).get("nodes") or []
+        self.pages[page] = nodes
+        if not nodes:
+            self.open = False
+
+    def finish_wave(self, pages: range) -> None:
+        self.next_page = pages.stop
+        tail = self.pages.get(pages.stop - 1)
+        if not tail or (self.last_page and self.next_page > self.last_page):
+            self.open = False
+
+    def result(self, limit: int) -> dict:
+        nodes = [node for page in sorted(self.pages) for node in self.pages[page]]
+        return {
+            "pageInfo": {"hasNextPage": self.open or len(nodes) > limit, "lastPage": self.last_page or None},
+            "nodes": nodes[:limit],
+        }
+
+
+async def complete_favourites(query: str, user: dict, limit: int) -> dict:
+    """
+    Копия user, в которой у каждой связи избранного догружены страницы
+    и обрезаны до limit записей (в т.ч. когда догружать нечего).
+    Страницы всех четырёх связей одной волны склеиваются в запросы
+    по USER_FAVOURITES_ROOTS_PER_REQUEST корней,
+    запросы идут параллельно не больше USER_FAVOURITES_CONCURRENCY
+    """
+    favourites = user.get("favourites") or {}
+    connections = {
+        kind: _Connection(favourites[kind])
+        for kind in FAVOURITE_KINDS
+        if favourites.get(kind) is not None
+    }
+    if not connections:
+        # избранное не запрошено (?fields=) — в ответе его и не должно быть
+        return user
+    sem = asyncio.Semaphore(config.USER_FAVOURITES_CONCURRENCY)
+    requests = 0
+
+    async def fetch(pages: list[tuple[str, int]]) -> dict:
+        async with sem:
+            result = await anilist_query(build_pages_query(query, pages), {"id": user["id"]})
+        if result.get("errors") and not result.get("data"):
+            # неполный профиль не кэшируем — пусть ошибка дойдёт до эндпоинта
+            raise RuntimeError((result["errors"][0] or {}).get("message") or "AniList error")
+        return result.get("data") or {}
+
+    while True:
+        wave = {kind: connection.plan(limit) for kind, connection in connections.items()}
+        pages = [(kind, page) for kind, plan in wave.items() for page in plan]
+        if not pages:
+            break
+
+        size = config.USER_FAVOURITES_ROOTS_PER_REQUEST
+        chunks = [pages[i:i + size] for i in range(0, len(pages), size)]
+        requests += len(chunks)
+        for data in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+            for alias, root in data.items():
+                kind = alias.rstrip("0123456789")
+                connections[kind].add(int(alias[len(kind):]), ((root or {}).get("favourites") or {}).get(kind))
+
+        for kind, plan in wave.items():
+            if plan:
+                connections[kind].finish_wave(plan)
+
+    if requests:
+        logger.info(
+            "Избранное %s: %s, запросов %s",
+            user.get("name"),
+            {kind: connection.count() for kind, connection in connections.items()},
+            requests,
+        )
+
+    complete = dict(user)
+    complete["favourites"] = {
+        **favourites,
+        **{kind: connection.result(limit) for kind, connection in connections.items()},
+    }
+    return complete
+
+
+async def user_profile_entry(query: str, root: str, variables: dict, limit: int) -> CacheEntry:
+    """
+    Профиль (корень User или Viewer) со всем избранным до limit на связь.
+    Собранный профиль кэшируется целиком (user_profile_full)
+    """
+    async def build() -> dict:
+        result = await anilist_query(query, variables)
+        user = (result.get("data") or {}).get(root)
+        if not user:
+            return result
+        # ответ первой страницы общий с кэшем — не мутируем, собираем копию
+        return {**result, "data": {**result["data"], root: await complete_favourites(query, user, limit)}}
+
+    name = "user_profile_full" if root == "User" else "viewer_profile"
+    return await composite_query_entry(name, query, {**variables, "favouritesLimit": limit}, build)
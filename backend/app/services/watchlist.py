@@ -0,0 +1,476 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    user        TEXT NOT NULL,
+    media_id    INTEGER NOT NULL,
+    status      TEXT NOT NULL,
+    progress    INTEGER NOT NULL DEFAULT 0,
+    score       REAL,
+    added_at    REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (user, media_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS watchlist_status ON watchlist (user, status, updated_at DESC);
+CREATE INDEX IF NOT EXISTS watchlist_updated ON watchlist (user, updated_at DESC);
+CREATE TABLE IF NOT EXISTS list_imports (
+    user        TEXT NOT NULL,
+    media_type  TEXT NOT NULL,
+    state       TEXT NOT NULL,
+    next_chunk  INTEGER NOT NULL,
+    imported    INTEGER NOT NULL,
+    skipped     INTEGER NOT NULL,
+    error       TEXT,
+    started_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    owner       TEXT,
+    heartbeat   REAL,
+    PRIMARY KEY (user, media_type)
+) WITHOUT ROWID;
+"""
+
+# статусы MediaListStatus AniList
+STATUSES = ("CURRENT", "PLANNING", "COMPLETED", "DROPPED", "PAUSED", "REPEATING")
+# прогресс без записи в списке — начали смотреть
+DEFAULT_STATUS = "CURRENT"
+# тайтл добавлен в список без статуса
+NEW_ENTRY_STATUS = "PLANNING"
+
+SORTS = {
+    "updated": "updated_at DESC",
+    "added": "added_at DESC",
+}
+
+COLUMNS = "media_id, status, progress, score, added_at, updated_at"
+IMPORT_COLUMNS = "user, media_type, state, next_chunk, imported, skipped, error, started_at, updated_at"
+# колонки, добавленные в list_imports после первой версии схемы
+IMPORT_MIGRATIONS = (("owner", "TEXT"), ("heartbeat", "REAL"))
+
+
+class WatchlistEntry:
+    __slots__ = ("media_id", "status", "progress", "score", "added_at", "updated_at")
+
+    def __init__(self, media_id: int, status: str, progress: int, score: float | None, added_at: float, updated_at: float):
+        self.media_id = media_id
+        self.status = status
+        self.progress = progress
+        self.score = score
+        self.added_at = added_at
+        self.updated_at = updated_at
+
+
+class WatchlistStore:
+    """
+    Списки просмотра пользователей в SQLite (WAL).
+
+    Чтение — из небольшого пула потоков, у каждого потока своё
+    соединение: под WAL читатели не ждут ни друг друга, ни записи.
+    Запись — один поток с одним соединением.
+
+    Прогресс эпизодов меняется часто (каждая серия, часто несколько
+    кликов подряд), поэтому set_progress() только кладёт значение в
+    буфер: последнее значение по (user, media_id) побеждает, фоновая
+    задача сбрасывает буфер одной транзакцией. Чтения накладывают
+    буфер поверх базы, так что пользователь сразу видит свой прогресс.
+    """
+
+    def __init__(self, path: str, flush_interval: float, readers: int):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.readers = readers
+
+        self._writer_conn: sqlite3.Connection | None = None
+        self._writer: ThreadPoolExecutor | None = None
+        self._reader: ThreadPoolExecutor | None = None
+        self._local = threading.local()
+        self._reader_conns: list[sqlite3.Connection] = []
+        self._pending: dict[tuple[str, int], tuple[int, float]] = {}
+        # буфер, который сейчас пишется на диск: виден чтениям до коммита
+        self._flushing: dict[tuple[str, int], tuple[int, float]] = {}
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+        self.writes = 0
+        self.coalesced = 0
+        self.flushes = 0
+
+    @property
+    def active(self) -> bool:
+        return self._writer_conn is not None
+
+    # ─── lifecycle ─────────────────────────────────────────────
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(list_imports)")}
+        for name, decl in IMPORT_MIGRATIONS:
+            if name not in columns:
+                conn.execute(f"ALTER TABLE list_imports ADD COLUMN {name} {decl}")
+        self._writer_conn = conn
+
+    def _reader_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+            self._reader_conns.append(conn)
+        return conn
+
+    async def _write(self, fn, *args):
+        if not self.active:
+            await self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+
+    async def _read(self, fn, *args):
+        if not self.active:
+            await self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._reader, fn, *args)
+
+    async def start(self) -> None:
+        if self.active:
+            return
+        async with self._lock:
+            if self.active:
+                return
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="watchlist-write")
+            await asyncio.get_running_loop().run_in_executor(self._writer, self._open)
+            self._reader = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="watchlist-read")
+            self._task = asyncio.create_task(self._flusher())
+            logger.info("Списки просмотра: %s", self.path)
+
+    async def stop(self) -> None:
+        if not self.active:
+            return
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # дописываем буфер прогресса
+        await self.flush()
+
+        self._reader.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        self._reader_conns.clear()
+        self._local = threading.local()
+        self._reader = None
+
+        await asyncio.get_running_loop().run_in_executor(self._writer, self._writer_conn.close)
+        self._writer_conn = None
+        self._writer.shutdown(wait=True)
+        self._writer = None
+
+    # ─── запись ────────────────────────────────────────────────
+
+    def _upsert_rows(self, rows: list[tuple]) -> None:
+        # более старая запись (импорт) не затирает более свежие локальные изменения
+        self._writer_conn.executemany(
+            f"""
+            INSERT INTO watchlist (user, {COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user, media_id) DO UPDATE SET
+                status = excluded.status,
+                progress = excluded.progress,
+                score = COALESCE(excluded.score, watchlist.score),
+                updated_at = excluded.updated_at
+            WHERE excluded.updated_at >= watchlist.updated_at
+            """,
+            rows,
+        )
+
+    def _upsert(self, rows: list[tuple]) -> None:
+        with self._writer_conn:
+            self._upsert_rows(rows)
+
+    async def put(
+        self,
+        user: str,
+        media_id: int,
+        status: str | None = None,
+        progress: int | None = None,
+        score: float | None = None,
+    ) -> WatchlistEntry:
+        """
+        Добавить тайтл или изменить статус/оценку (сразу на диск);
+        непереданные поля остаются как были
+        """
+        now = time.time()
+        if status is None or progress is None:
+            # сохраняем текущие значения, в т.ч. ещё не сброшенный прогресс
+            current = await self.get(user, media_id)
+            if status is None:
+                status = current.status if current is not None else NEW_ENTRY_STATUS
+            if progress is None:
+                progress = current.progress if current is not None else 0
+        self._pending.pop((user, media_id), None)
+
+        await self._write(self._upsert, [(user, media_id, status, progress, score, now, now)])
+        self.writes += 1
+        return await self.get(user, media_id)
+
+    async def put_many(self, user: str, entries: Iterable[WatchlistEntry]) -> int:
+        """
+        Пачка записей одной транзакцией (импорт)
+        """
+        rows = [
+            (user, entry.media_id, entry.status, entry.progress, entry.score, entry.added_at, entry.updated_at)
+            for entry in entries
+        ]
+        if rows:
+            await self._write(self._upsert, rows)
+            self.writes += len(rows)
+        return len(rows)
+
+    def _put_chunk(self, rows: list[tuple], job: tuple, owner: str) -> bool:
+        with self._writer_conn:
+            if not self._save_import(job, owner):
+                return False
+            self._upsert_rows(rows)
+            return True
+
+    async def put_chunk(self, user: str, entries: Iterable[WatchlistEntry], job: tuple, owner: str) -> bool:
+        """
+        Пачка записей импорта и состояние задачи импорта — одной транзакцией:
+        после сбоя продолжаем ровно со следующей пачки.
+        False — задачу перехватил другой воркер, пачка не записана
+        """
+        rows = [
+            (user, entry.media_id, entry.status, entry.progress, entry.score, entry.added_at, entry.updated_at)
+            for entry in entries
+        ]
+        if not await self._write(self._put_chunk, rows, job, owner):
+            return False
+        self.writes += len(rows)
+        return True
+
+    def set_progress(self, user: str, media_id: int, progress: int) -> None:
+        """
+        Прогресс просмотра: запись отложена и склеивается с соседними
+        """
+        key = (user, media_id)
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = (progress, time.time())
+
+    def _delete(self, user: str, media_id: int) -> int:
+        with self._writer_conn:
+            return self._writer_conn.execute(
+                "DELETE FROM watchlist WHERE user = ? AND media_id = ?",
+                (user, media_id),
+            ).rowcount
+
+    async def remove(self, user: str, media_id: int) -> bool:
+        pending = self._pending.pop((user, media_id), None)
+        removed = await self._write(self._delete, user, media_id)
+        return bool(removed) or pending is not None
+
+    def _flush(self, pending: list[tuple]) -> None:
+        with self._writer_conn:
+            self._writer_conn.executemany(
+                f"""
+                INSERT INTO watchlist (user, {COLUMNS})
+                VALUES (?, ?, '{DEFAULT_STATUS}', ?, NULL, ?, ?)
+                ON CONFLICT(user, media_id) DO UPDATE SET
+                    progress = excluded.progress,
+                    updated_at = excluded.updated_at
+                """,
+                pending,
+            )
+
+    async def flush(self) -> None:
+        if not self._pending or not self.active:
+            return
+
+        batch, self._pending = self._pending, {}
+        self._flushing.update(batch)
+        rows = [(user, media_id, progress, at, at) for (user, media_id), (progress, at) in batch.items()]
+        try:
+            await self._write(self._flush, rows)
+        except sqlite3.Error:
+            # возвращаем в буфер; более новый прогресс, пришедший за время записи, главнее
+            logger.exception("Ошибка записи прогресса, %s записей оставлены в буфере", len(rows))
+            for key, value in batch.items():
+                self._pending.setdefault(key, value)
+            return
+        finally:
+            for key, value in batch.items():
+                if self._flushing.get(key) is value:
+                    del self._flushing[key]
+        self.flushes += 1
+        self.writes += len(rows)
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    # ─── чтение ────────────────────────────────────────────────
+
+    def _buffered(self, user: str, media_id: int) -> tuple[int, float] | None:
+        key = (user, media_id)
+        return self._pending.get(key) or self._flushing.get(key)
+
+    def _overlay(self, user: str, entry: WatchlistEntry) -> WatchlistEntry:
+        pending = self._buffered(user, entry.media_id)
+        if pending is not None:
+            entry.progress, entry.updated_at = pending
+        return entry
+
+    def _get(self, user: str, media_id: int) -> WatchlistEntry | None:
+        row = self._reader_conn().execute(
+            f"SELECT {COLUMNS} FROM watchlist WHERE user = ? AND media_id = ?",
+            (user, media_id),
+        ).fetchone()
+        return WatchlistEntry(*row) if row else None
+
+    async def get(self, user: str, media_id: int) -> WatchlistEntry | None:
+        entry = await self._read(self._get, user, media_id)
+        if entry is None:
+            pending = self._buffered(user, media_id)
+            if pending is None:
+                return None
+            progress, at = pending
+            return WatchlistEntry(media_id, DEFAULT_STATUS, progress, None, at, at)
+        return self._overlay(user, entry)
+
+    def _page(self, user: str, status: str | None, sort: str, limit: int, offset: int) -> tuple[int, list[WatchlistEntry]]:
+        conn = self._reader_conn()
+        where, args = ("user = ? AND status = ?", (user, status)) if status else ("user = ?", (user,))
+        total = conn.execute(f"SELECT COUNT(*) FROM watchlist WHERE {where}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {COLUMNS} FROM watchlist WHERE {where} ORDER BY {SORTS[sort]} LIMIT ? OFFSET ?",
+            (*args, limit, offset),
+        ).fetchall()
+        return total, [WatchlistEntry(*row) for row in rows]
+
+    async def page(
+        self,
+        user: str,
+        status: str | None = None,
+        sort: str = "updated",
+        limit: int = 50,
+        offset: int = 0,
+    ) -> tuple[int, list[WatchlistEntry]]:
+        """
+        (всего записей, страница) — по индексам (user, status) / (user, updated_at)
+        """
+        # несброшенный прогресс меняет порядок и может добавлять записи —
+        # сначала сбрасываем буфер (только если в нём есть этот пользователь)
+        if any(key[0] == user for key in self._pending):
+            await self.flush()
+        total, entries = await self._read(self._page, user, status, sort, limit, offset)
+        return total, [self._overlay(user, entry) for entry in entries]
+
+    # ─── состояние импорта ─────────────────────────────────────
+
+    def _save_import(self, job: tuple, owner: str) -> bool:
+        # пишет только владелец задачи; заодно продлевает его захват
+        cur = self._writer_conn.execute(
+            """
+            UPDATE list_imports
+            SET state = ?, next_chunk = ?, imported = ?, skipped = ?, error = ?,
+                started_at = ?, updated_at = ?, heartbeat = ?
+            WHERE user = ? AND media_type = ? AND owner = ?
+            """,
+            (*job[2:], time.time(), job[0], job[1], owner),
+        )
+        return cur.rowcount == 1
+
+    def _save_import_tx(self, job: tuple, owner: str) -> bool:
+        with self._writer_conn:
+            return self._save_import(job, owner)
+
+    async def save_import(self, job: tuple, owner: str) -> bool:
+        """
+        False — задачу перехватил другой воркер, писать её состояние нельзя
+        """
+        return await self._write(self._save_import_tx, job, owner)
+
+    def _claim_import(self, job: tuple, owner: str, active: tuple[str, ...], stale_before: float) -> tuple | None:
+        marks = ", ".join("?" * len(active))
+        with self._writer_conn:
+            cur = self._writer_conn.execute(
+                f"""
+                INSERT INTO list_imports ({IMPORT_COLUMNS}, owner, heartbeat)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user, media_type) DO UPDATE
+                SET owner = excluded.owner, heartbeat = excluded.heartbeat
+                WHERE owner IS NULL OR owner = excluded.owner
+                    OR heartbeat < ? OR state NOT IN ({marks})
+                """,
+                (*job, owner, time.time(), stale_before, *active),
+            )
+            if cur.rowcount != 1:
+                return None
+            return self._writer_conn.execute(
+                f"SELECT {IMPORT_COLUMNS} FROM list_imports WHERE user = ? AND media_type = ?",
+                job[:2],
+            ).fetchone()
+
+    async def claim_import(self, job: tuple, owner: str, active: tuple[str, ...], stale_before: float) -> tuple | None:
+        """
+        Атомарный захват задачи импорта воркером (одна задача — один воркер).
+
+        Нет строки — вставляется job. Есть — захват удаётся, если задача
+        ничья, уже наша, не активна (состояние не из active) или её
+        владелец не отмечался с stale_before (воркер упал).
+        Возвращает сохранённое состояние задачи или None, если задачу
+        ведёт другой воркер
+        """
+        return await self._write(self._claim_import, job, owner, active, stale_before)
+
+    def _release_import(self, user: str, media_type: str, owner: str) -> None:
+        with self._writer_conn:
+            self._writer_conn.execute(
+                "UPDATE list_imports SET owner = NULL WHERE user = ? AND media_type = ? AND owner = ?",
+                (user, media_type, owner),
+            )
+
+    async def release_import(self, user: str, media_type: str, owner: str) -> None:
+        await self._write(self._release_import, user, media_type, owner)
+
+    def _load_imports(self, where: str, args: tuple) -> list[tuple]:
+        return self._reader_conn().execute(f"SELECT {IMPORT_COLUMNS} FROM list_imports WHERE {where}", args).fetchall()
+
+    async def load_import(self, user: str, media_type: str) -> tuple | None:
+        rows = await self._read(self._load_imports, "user = ? AND media_type = ?", (user, media_type))
+        return rows[0] if rows else None
+
+    async def imports_in_state(self, state: str) -> list[tuple]:
+        return await self._read(self._load_imports, "state = ?", (state,))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.active,
+            "writes": self.writes,
+            "pending": len(self._pending),
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+        }
+
+
+watchlist = WatchlistStore(
+    config.WATCHLIST_PATH,
+    flush_interval=config.WATCHLIST_FLUSH_INTERVAL,
+    readers=config.WATCHLIST_READERS,
+)
@@ -0,0 +1,72 @@
+"""
+Стоимость логирования тел AniList при выключенном DEBUG: старый путь
+(json.dumps(..., indent=2) на каждый запрос) против PayloadSampler
+с ленивой сериализацией.
+
+    python -m benchmarks.bench_debug_logging --iterations 2000
+"""
+import argparse
+import io
+import json
+import logging
+import random
+import time
+
+from app.core.log import PayloadSampler
+from benchmarks.bench_entity_store import media_details
+
+
+def per_call(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def main(args):
+    rng = random.Random(1)
+    payload = {"query": "query MediaDetails($id: Int) { ... }", "variables": {"id": 1}}
+    result = media_details(1, characters=25, staff=25, rng=rng)
+    raw = json.dumps(result).encode()
+
+    logger = logging.getLogger("bench.payloads")
+    # пишем в память: форматирование (и сериализация) выполняется по-настоящему
+    logger.addHandler(logging.StreamHandler(io.StringIO()))
+    logger.propagate = False
+    logger.setLevel(logging.WARNING)
+
+    def legacy():
+        logger.debug("AniList request")
+        logger.debug(json.dumps(payload, ensure_ascii=False, indent=2))
+        logger.debug("AniList response")
+        logger.debug(json.dumps(result, ensure_ascii=False, indent=2))
+
+    sampler = PayloadSampler(logger, max_chars=4000)
+
+    def lazy():
+        sampled = sampler.sampled()
+        sampler.emit("MediaDetails", payload["variables"], raw, 0.05, sampled)
+
+    def baseline():
+        pass
+
+    n = args.iterations
+    empty = per_call(baseline, n)
+    legacy_cost = per_call(legacy, n) - empty
+    lazy_cost = per_call(lazy, n) - empty
+
+    print(f"response: {len(raw) / 1024:.1f} KB, DEBUG выключен")
+    print(f"eager json.dumps: {legacy_cost * 1e6:9.2f} мкс/запрос")
+    print(f"lazy sampler:     {lazy_cost * 1e6:9.2f} мкс/запрос")
+
+    # сэмплирование 1 из 100: сериализуется только выбранный запрос
+    logger.setLevel(logging.INFO)
+    sampler = PayloadSampler(logger, every=100, max_chars=4000)
+    sampled_cost = per_call(lazy, n) - empty
+    print(f"sampled 1/100:    {sampled_cost * 1e6:9.2f} мкс/запрос")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+"""
+Память: полные ответы media_details (как в кэше ответов) против
+нормализованного хранилища сущностей с теми же данными.
+
+    python -m benchmarks.bench_entity_store --media 2000
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from app.services.entity_store import EntityStore
+
+
+def media_details(media_id: int, characters: int, staff: int, rng: random.Random) -> dict:
+    def person(pid: int, kind: str) -> dict:
+        return {
+            "id": pid,
+            "name": {"full": f"{kind} Name {pid}", "native": f"名前{pid}"},
+            "image": {"large": f"https://s4.anilist.co/file/anilistcdn/{kind}/large/b{pid}.jpg"},
+        }
+
+    return {
+        "data": {
+            "Media": {
+                "id": media_id,
+                "type": "ANIME",
+                "source": "MANGA",
+                "title": {
+                    "romaji": f"Romaji Title {media_id}",
+                    "english": f"English Title {media_id}",
+                    "native": f"タイトル{media_id}",
+                    "userPreferred": f"Romaji Title {media_id}",
+                },
+                "description": "Lorem ipsum dolor sit amet. " * 20,
+                "format": "TV",
+                "status": "FINISHED",
+                "season": "FALL",
+                "seasonYear": 2020,
+                "episodes": 12,
+                "duration": 24,
+                "averageScore": rng.randint(40, 90),
+                "popularity": rng.randint(1000, 500000),
+                "favourites": rng.randint(10, 50000),
+                "genres": ["Action", "Drama", "Fantasy"],
+                "coverImage": {
+                    "extraLarge": f"https://s4.anilist.co/file/anilistcdn/media/anime/cover/large/bx{media_id}.jpg",
+                    "large": f"https://s4.anilist.co/file/anilistcdn/media/anime/cover/medium/bx{media_id}.jpg",
+                    "medium": f"https://s4.anilist.co/file/anilistcdn/media/anime/cover/small/bx{media_id}.jpg",
+                },
+                "staff": {
+                    "edges": [
+                        {"role": "Director", "node": person(rng.randrange(staff), "staff")}
+                        for _ in range(15)
+                    ]
+                },
+                "relations": {"edges": []},
+                "characters": {
+                    "edges": [
+                        {
+                            "role": "MAIN",
+                            "node": person(rng.randrange(characters), "character"),
+                            "voiceActors": [
+                                {**person(rng.randrange(staff), "staff"), "languageV2": "Japanese"}
+                            ],
+                        }
+                        for _ in range(50)
+                    ]
+                },
+            }
+        }
+    }
+
+
+def measure(build) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, obj
+
+
+def main(args):
+    rng = random.Random(42)
+    # как в кэше: каждый ответ — отдельно разобранный JSON
+    bodies = [
+        json.dumps(media_details(i, args.characters, args.staff, rng)).encode()
+        for i in range(1, args.media + 1)
+    ]
+
+    raw_bytes, raw = measure(lambda: [json.loads(body) for body in bodies])
+
+    del raw
+
+    def build_store():
+        # разбираем заново, чтобы строки принадлежали только хранилищу
+        store = EntityStore(max_per_type=10**9)
+        for body in bodies:
+            store.ingest("media_details", json.loads(body))
+        return store
+
+    store_bytes, store = measure(build_store)
+
+    mb = 1024 * 1024
+    print(f"responses: {args.media}, JSON on wire: {sum(map(len, bodies)) / mb:.1f} MB")
+    print(f"full responses in memory: {raw_bytes / mb:.1f} MB")
+    print(f"entity store:             {store_bytes / mb:.1f} MB  {store.stats()}")
+    print(f"ratio: {raw_bytes / store_bytes:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--media", type=int, default=2000)
+    parser.add_argument("--characters", type=int, default=20000)
+    parser.add_argument("--staff", type=int, default=5000)
+    main(parser.parse_args())
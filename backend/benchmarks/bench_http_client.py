@@ -0,0 +1,91 @@
+"""
+Латентность одного запроса к AniList: новый AsyncClient на каждый
+вызов (как было) против общего пула соединений.
+
+    python -m benchmarks.bench_http_client --requests 300 --latency-ms 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import certifi
+import httpx
+
+from benchmarks.mock_anilist import MockAniList
+from app.services.http_client import HEADERS, build_client
+
+PAYLOAD = {"query": "query MediaDetails($id: Int!) { Media(id: $id) { id } }", "variables": {"id": 1}}
+
+
+async def per_call_client(url: str) -> None:
+    async with httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=httpx.Timeout(20.0),
+        verify=certifi.where(),
+    ) as client:
+        resp = await client.post(url, json=PAYLOAD)
+    resp.json()
+
+
+async def run(name: str, call, n: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    wall = time.perf_counter() - wall
+
+    latencies.sort()
+    return {
+        "name": name,
+        "requests": n,
+        "rps": round(n / wall, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+async def main(args):
+    mock = MockAniList(latency_ms=args.latency_ms)
+    port = await mock.start()
+    url = f"http://127.0.0.1:{port}"
+
+    results = []
+
+    results.append(await run("per-call AsyncClient", lambda: per_call_client(url), args.requests, args.concurrency))
+    before_conns = mock.connections
+
+    shared = build_client()
+
+    async def pooled():
+        resp = await shared.post(url, json=PAYLOAD)
+        resp.json()
+
+    results.append(await run("shared pooled client", pooled, args.requests, args.concurrency))
+    await shared.aclose()
+    await mock.stop()
+
+    results[0]["connections"] = before_conns
+    results[1]["connections"] = mock.connections - before_conns
+
+    for r in results:
+        print(
+            f"{r['name']:<22} rps={r['rps']:<8} p50={r['p50_ms']:<8} "
+            f"p95={r['p95_ms']:<8} p99={r['p99_ms']:<8} tcp_connections={r['connections']}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
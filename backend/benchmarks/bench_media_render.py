@@ -0,0 +1,81 @@
+"""
+/media/anime/{id} из кэша: старый путь (model_validate + повторная
+валидация response_model + JSON на каждый запрос) против готовых байтов
+с ETag, плюс ответ 304 на If-None-Match.
+
+    python -m benchmarks.bench_media_render --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.graphql import gql
+from app.main import app
+from app.models.responses import FullAnimeDetails
+from app.services.anilist_service import anilist_query, store_result
+from benchmarks.bench_entity_store import media_details
+
+MEDIA_ID = 1
+MEDIA_DETAILS_QUERY = gql("media_details")
+
+legacy_app = FastAPI()
+
+
+@legacy_app.get("/media/{media_type}/{media_id}", response_model=FullAnimeDetails)
+async def legacy_media_details(media_type: str, media_id: int):
+    result = await anilist_query(MEDIA_DETAILS_QUERY, {"id": media_id})
+    return FullAnimeDetails.model_validate(result["data"]["Media"])
+
+
+async def run(name: str, target: FastAPI, n: int, headers: dict | None = None) -> dict:
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # прогрев (первый рендер в кэш)
+        await client.get(f"/media/anime/{MEDIA_ID}", headers=headers)
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        for _ in range(n):
+            resp = await client.get(f"/media/anime/{MEDIA_ID}", headers=headers)
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+
+    return {
+        "name": name,
+        "status": resp.status_code,
+        "bytes": len(resp.content),
+        "rps": round(n / wall, 1),
+        "cpu_ms_per_request": round(cpu / n * 1000, 3),
+    }
+
+
+async def main(args):
+    result = media_details(MEDIA_ID, characters=20000, staff=5000, rng=random.Random(1))
+    store_result(MEDIA_DETAILS_QUERY, {"id": MEDIA_ID}, result, len(json.dumps(result)))
+
+    results = [await run("before: validate + json", legacy_app, args.requests)]
+
+    after = await run("after: cached bytes", app, args.requests)
+    results.append(after)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        etag = (await client.get(f"/media/anime/{MEDIA_ID}")).headers["etag"]
+    results.append(await run("after: If-None-Match", app, args.requests, {"If-None-Match": etag}))
+
+    for r in results:
+        print(
+            f"{r['name']:<26} status={r['status']} body={r['bytes']:<7} "
+            f"rps={r['rps']:<8} cpu/req={r['cpu_ms_per_request']} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
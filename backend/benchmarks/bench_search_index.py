@@ -0,0 +1,112 @@
+"""
+Локальный поиск по названиям: построение индекса на N тайтлов и
+латентность запросов (typeahead-префиксы, несколько слов, опечатки).
+
+    python -m benchmarks.bench_search_index --titles 100000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from app.services.entity_store import MediaRecord
+from app.services.search_index import SearchIndex
+
+SYLLABLES = (
+    "ka ki ku ke ko sa shi su se so ta chi tsu te to na ni nu ne no ha hi fu he ho "
+    "ma mi mu me mo ya yu yo ra ri ru re ro wa n ga gi gu ge go za ji zu ze zo da de do ba bi bu be bo"
+).split()
+ENGLISH = (
+    "the of a in and to no wa attack titan sword art online hero academia demon slayer "
+    "night sky world love story war season final chronicle blade spirit dragon ghost "
+    "school life magic girl boy princess kingdom journey last first dream star moon sun"
+).split()
+
+
+# японские названия почти без пробелов: одно "слово" из нескольких корней
+NATIVE = ["".join(chr(0x3041 + random.Random(i).randrange(80)) for _ in range(3)) for i in range(3000)]
+
+
+def romaji_word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+
+
+def make_record(media_id: int, rng: random.Random) -> MediaRecord:
+    record = MediaRecord(media_id)
+    record.merge({
+        "type": "ANIME",
+        "title": {
+            "romaji": " ".join(romaji_word(rng) for _ in range(rng.randint(1, 5))),
+            "english": " ".join(rng.choice(ENGLISH) for _ in range(rng.randint(1, 6))).title(),
+            "native": "".join(rng.choice(NATIVE) for _ in range(rng.randint(1, 3))),
+        },
+        "popularity": int(rng.paretovariate(1.2) * 1000),
+        "favourites": rng.randint(0, 5000),
+    })
+    return record
+
+
+def queries(records: list[MediaRecord], rng: random.Random, n: int) -> list[tuple[str, str]]:
+    out = []
+    for _ in range(n):
+        title = rng.choice(records).title_romaji
+        kind = rng.choice(("prefix", "words", "typo", "english"))
+        if kind == "prefix":
+            out.append((kind, title[: rng.randint(2, 6)]))
+        elif kind == "words":
+            words = title.split()
+            cut = rng.randint(1, len(words))
+            last = words[cut - 1]
+            out.append((kind, " ".join(words[: cut - 1] + [last[: max(1, len(last) - 1)]])))
+        elif kind == "typo":
+            word = max(title.split(), key=len)
+            i = rng.randrange(len(word))
+            out.append((kind, word[:i] + rng.choice("aeiouk") + word[i + 1:]))
+        else:
+            out.append((kind, " ".join(rng.sample(ENGLISH, 2))))
+    return out
+
+
+def main(args):
+    rng = random.Random(1)
+    records = [make_record(i, rng) for i in range(1, args.titles + 1)]
+
+    # память — отдельной сборкой: под tracemalloc всё в разы медленнее
+    tracemalloc.start()
+    traced = SearchIndex()
+    traced.add_many(records)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.add_many(records)
+    build = time.perf_counter() - start
+    # миллионы объектов индекса и записей: полный проход GC посреди
+    # замеров дал бы сотни мс, к поиску отношения не имеющие
+    gc.collect()
+    gc.freeze()
+
+    print(f"titles: {args.titles}, build {build:.2f} s ({build / args.titles * 1e6:.1f} us/media), "
+          f"index {memory / 1024 / 1024:.1f} MB, {index.stats()}")
+
+    timings: dict[str, list[float]] = {}
+    for kind, query in queries(records, rng, args.queries):
+        start = time.perf_counter()
+        index.search(query, limit=10, media_type="ANIME")
+        timings.setdefault(kind, []).append(time.perf_counter() - start)
+
+    for kind, values in sorted(timings.items()):
+        values.sort()
+        p50 = values[len(values) // 2] * 1000
+        p99 = values[int(len(values) * 0.99)] * 1000
+        print(f"{kind:<8} n={len(values):<6} p50 {p50:.3f} ms  p99 {p99:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=4000)
+    main(parser.parse_args())
@@ -0,0 +1,167 @@
+"""
+Несколько воркеров на хосте: доля попаданий и пропускная способность
+при 1..N процессах API с общим файлом кэша (shared) и без него
+(isolated — у каждого воркера только своя память).
+
+Каждый воркер — отдельный процесс со своим event loop и lifespan, как
+у uvicorn --workers; нагрузка /media/anime/{id} с Zipf-распределением
+id делится между ними поровну. AniList — FixtureAniList в отдельном
+процессе; hit ratio = 1 - (запросы MediaDetails к AniList) / (запросы API).
+
+    python -m benchmarks.bench_workers --workers 1,2,4,8 --duration 10 --latency-ms 50
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.load_test import _serve_mock, percentile
+from benchmarks.mock_anilist import add_mock_arguments
+
+
+def zipf_ids(rng: random.Random, pool: int, skew: float, n: int) -> list[int]:
+    weights = [1 / (rank ** skew) for rank in range(1, pool + 1)]
+    return rng.choices(range(1, pool + 1), weights, k=n)
+
+
+def _worker(index: int, args, port: int, mode: str, data_dir: str, barrier, results) -> None:
+    # config читается при импорте — окружение до импорта app
+    os.environ.update({
+        "ANILIST_API_URL": f"http://127.0.0.1:{port}",
+        "DATA_DIR": data_dir,
+        "DISK_CACHE_PATH": str(Path(data_dir) / "anilist_cache.sqlite3"),
+        "DISK_CACHE_ENABLED": "1" if mode == "shared" else "0",
+        "DISK_CACHE_SHARED": "1",
+        "WATCHLIST_PATH": str(Path(data_dir) / f"watchlist-{index}.sqlite3"),
+        "REFRESH_AHEAD_ENABLED": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+
+    async def run():
+        import httpx
+
+        from app.main import app
+        from app.services.anilist_service import disk_cache
+        from app.services.birthday_index import birthday_index
+        from app.services.scheduler import scheduler
+        from app.services.season_catalog import season_catalog
+
+        # меряем кэш media_details: фоновые сканы только шумят в счётчиках AniList
+        birthday_index.start = lambda: None
+        season_catalog.start = lambda: None
+        scheduler.rate = 1_000_000 / 60
+        scheduler.capacity = scheduler.tokens = 10_000.0
+
+        rng = random.Random(args.seed * 1000 + index)
+        ids = zipf_ids(rng, args.id_pool, args.skew, 100_000)
+        latencies: list[float] = []
+        errors = 0
+
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+                await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+                stop_at = time.perf_counter() + args.duration
+                cursor = iter(ids)
+
+                async def load():
+                    nonlocal errors
+                    while time.perf_counter() < stop_at:
+                        start = time.perf_counter()
+                        resp = await client.get(f"/media/anime/{next(cursor)}")
+                        latencies.append(time.perf_counter() - start)
+                        errors += resp.status_code != 200
+
+                started = time.perf_counter()
+                await asyncio.gather(*(load() for _ in range(max(1, args.concurrency // args.n))))
+                elapsed = time.perf_counter() - started
+
+            results.put({
+                "latencies": latencies,
+                "errors": errors,
+                "elapsed": elapsed,
+                "lease_waits": disk_cache.lease_waits,
+                "lease_wait_hits": disk_cache.lease_wait_hits,
+            })
+
+    asyncio.run(run())
+
+
+def run_once(args, port: int, mode: str, workers: int) -> dict:
+    import httpx
+
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    args.n = workers
+
+    with tempfile.TemporaryDirectory(prefix="bench-workers-") as data_dir:
+        before = httpx.get(f"http://127.0.0.1:{port}/__stats").json()["operations"].get("MediaDetails", 0)
+        processes = [
+            ctx.Process(target=_worker, args=(i, args, port, mode, data_dir, barrier, results), daemon=True)
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        collected = [results.get(timeout=args.duration + 120) for _ in processes]
+        for process in processes:
+            process.join()
+        after = httpx.get(f"http://127.0.0.1:{port}/__stats").json()["operations"].get("MediaDetails", 0)
+
+    latencies = sorted(value for item in collected for value in item["latencies"])
+    elapsed = max(item["elapsed"] for item in collected)
+    upstream = after - before
+    return {
+        "mode": mode,
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "upstream": upstream,
+        "hit_ratio": round(1 - upstream / max(1, len(latencies)), 4),
+        "lease_waits": sum(item["lease_waits"] for item in collected),
+        "lease_wait_hits": sum(item["lease_wait_hits"] for item in collected),
+        "errors": sum(item["errors"] for item in collected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--modes", default="isolated,shared")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32, help="всего на все воркеры")
+    parser.add_argument("--id-pool", type=int, default=5000)
+    parser.add_argument("--skew", type=float, default=1.1, help="параметр Zipf: больше — горячее голова")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    ports = ctx.Queue()
+    mock = ctx.Process(target=_serve_mock, args=(args, ports), daemon=True)
+    mock.start()
+    port = ports.get(timeout=30)
+
+    print(f"{'mode':<10}{'workers':>8}{'req':>9}{'rps':>10}{'p50':>9}{'p99':>9}{'upstream':>10}{'hit':>8}{'waits':>8}")
+    try:
+        for mode in args.modes.split(","):
+            for workers in (int(n) for n in args.workers.split(",")):
+                row = run_once(args, port, mode, workers)
+                print(
+                    f"{row['mode']:<10}{row['workers']:>8}{row['requests']:>9}{row['rps']:>10}"
+                    f"{row['p50_ms']:>9}{row['p99_ms']:>9}{row['upstream']:>10}{row['hit_ratio']:>8}"
+                    f"{row['lease_waits']:>8}"
+                    + (f"  errors {row['errors']}" if row["errors"] else "")
+                )
+    finally:
+        mock.terminate()
+        mock.join()
+
+
+if __name__ == "__main__":
+    main()
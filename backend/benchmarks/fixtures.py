@@ -0,0 +1,401 @@
+"""
+Детерминированные ответы AniList для mock-сервера.
+
+Для каждого корневого поля запросов из app/api/v1/graphql_queries/
+(Media, Page.media, Page.characters, Character, Staff, User, Viewer,
+MediaListCollection)
+строится полный объект, который затем обрезается по выборке запроса —
+так одинаково отвечаем на полный запрос, его sparse-вариант (?fields=)
+и на пакетный MediaBatch с алиасами. Одинаковые переменные дают
+одинаковый ответ: случайность завязана на id сущности.
+"""
+import json
+import random
+import re
+from pathlib import Path
+
+from app.core.graphql import Selection
+
+SEASONS = ("WINTER", "SPRING", "SUMMER", "FALL")
+FORMATS = ("TV", "TV_SHORT", "MOVIE", "OVA", "ONA", "SPECIAL")
+LANGUAGES = ("Japanese", "English", "Korean")
+FAVOURITES = ("anime", "manga", "characters", "staff")
+GENRES = ("Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Sci-Fi", "Slice of Life")
+
+ARG_RE = re.compile(r"(\w+)\s*:\s*(\$?\w+)")
+
+
+def entity_rng(kind: str, entity_id) -> random.Random:
+    return random.Random(f"{kind}:{entity_id}")
+
+
+def _cover(kind: str, entity_id: int) -> dict:
+    base = f"https://s4.anilist.co/file/anilistcdn/media/{kind}/cover"
+    return {
+        "extraLarge": f"{base}/large/bx{entity_id}.jpg",
+        "large": f"{base}/medium/bx{entity_id}.jpg",
+        "medium": f"{base}/small/bx{entity_id}.jpg",
+    }
+
+
+def _title(media_id: int) -> dict:
+    return {
+        "romaji": f"Romaji Title {media_id}",
+        "english": f"English Title {media_id}",
+        "native": f"タイトル{media_id}",
+        "userPreferred": f"Romaji Title {media_id}",
+    }
+
+
+def _person(kind: str, person_id: int) -> dict:
+    return {
+        "id": person_id,
+        "name": {
+            "full": f"{kind.title()} Name {person_id}",
+            "native": f"名前{person_id}",
+            "alternative": [f"Alias {person_id}"],
+        },
+        "image": {"large": f"https://s4.anilist.co/file/anilistcdn/{kind}/large/b{person_id}.jpg"},
+    }
+
+
+def _date(rng: random.Random, year: bool = True) -> dict:
+    return {
+        "year": rng.randint(1960, 2005) if year else None,
+        "month": rng.randint(1, 12),
+        "day": rng.randint(1, 28),
+    }
+
+
+def _media_short(media_id: int) -> dict:
+    rng = entity_rng("media", media_id)
+    return {
+        "id": media_id,
+        "type": "ANIME",
+        "title": _title(media_id),
+        "format": rng.choice(FORMATS),
+        "seasonYear": rng.randint(1995, 2025),
+        "averageScore": rng.randint(40, 90),
+        "coverImage": _cover("anime", media_id),
+        "startDate": {"year": rng.randint(1995, 2025)},
+    }
+
+
+class Fixtures:
+    """
+    characters / staff — размер пулов персонажей и сэйю, из которых
+    набираются связи; season_size — аниме в каждом сезоне.
+    """
+
+    def __init__(self, characters: int = 20000, staff: int = 5000, season_size: int = 180):
+        self.characters = characters
+        self.staff = staff
+        self.season_size = season_size
+
+    # ── корневые поля ──────────────────────────────────────────
+
+    def media(self, media_id: int) -> dict:
+        rng = entity_rng("media", media_id)
+        return {
+            **_media_short(media_id),
+            "source": "MANGA",
+            "description": "Lorem ipsum dolor sit amet, <i>consectetur</i> adipiscing elit. " * 12,
+            "status": "FINISHED",
+            "season": rng.choice(SEASONS),
+            "episodes": rng.choice((12, 13, 24, 25)),
+            "duration": 24,
+            "popularity": rng.randint(1000, 500000),
+            "favourites": rng.randint(10, 50000),
+            "bannerImage": f"https://s4.anilist.co/file/anilistcdn/media/anime/banner/{media_id}.jpg",
+            "genres": rng.sample(GENRES, 3),
+            "studios": {"nodes": [{"name": f"Studio {rng.randint(1, 300)}"}]},
+            "trailer": {"id": f"yt{media_id}", "site": "youtube", "thumbnail": f"https://i.ytimg.com/vi/yt{media_id}/hqdefault.jpg"},
+            "streamingEpisodes": [
+                {
+                    "title": f"Episode {n}",
+                    "thumbnail": f"https://img.example/{media_id}/{n}.jpg",
+                    "site": "Crunchyroll",
+                    "url": f"https://www.crunchyroll.com/watch/{media_id}-{n}",
+                }
+                for n in range(1, 13)
+            ],
+            "staff": {
+                "edges": [
+                    {"role": rng.choice(("Director", "Original Creator", "Music", "Script")), "node": _person("staff", rng.randrange(1, self.staff))}
+                    for _ in range(15)
+                ]
+            },
+            "relations": {
+                "edges": [
+                    {"relationType": rng.choice(("SEQUEL", "PREQUEL", "ADAPTATION", "SIDE_STORY")), "node": _media_short(rng.randrange(1, 200000))}
+                    for _ in range(rng.randint(0, 6))
+                ]
+            },
+            "characters": {
+                "edges": [
+                    {
+                        "role": "MAIN" if n < 4 else "SUPPORTING",
+                        "node": _person("character", rng.randrange(1, self.characters)),
+                        "voiceActors": [
+                            {**_person("staff", rng.randrange(1, self.staff)), "languageV2": "Japanese"}
+                        ],
+                    }
+                    for n in range(rng.randint(10, 50))
+                ]
+            },
+        }
+
+    def season_page(self, season: str, year: int, page: int, per_page: int) -> dict:
+        base = (year * 10 + SEASONS.index(season)) * 1000 if season in SEASONS else year * 10000
+        total = self.season_size
+        start = (page - 1) * per_page
+        items = []
+        for i in range(start, min(start + per_page, total)):
+            media_id = base + i
+            item = self.media(media_id)
+            # каталог отсортирован по популярности
+            item.update(season=season, seasonYear=year, popularity=(total - i) * 1000)
+            items.append(item)
+        last_page = max(1, -(-total // per_page))
+        return {
+            "pageInfo": {"total": total, "lastPage": last_page, "hasNextPage": page < last_page, "currentPage": page},
+            "media": items,
+        }
+
+    def characters_page(self, page: int, per_page: int) -> dict:
+        start = (page - 1) * per_page
+        items = []
+        for i in range(start, min(start + per_page, self.characters)):
+            character = self.character(i + 1, 1, 1)
+            # sort: FAVOURITES_DESC
+            character["favourites"] = (self.characters - i) * 10
+            items.append(character)
+        return {"characters": items}
+
+    def character(self, character_id: int, page: int, per_page: int, language: str | None = None) -> dict:
+        rng = entity_rng("character", character_id)
+        total = rng.randint(1, 40)
+        start = (page - 1) * per_page
+        media_ids = [rng.randrange(1, 200000) for _ in range(total)][start:start + per_page]
+        # у франшизы одни и те же сэйю из тайтла в тайтл
+        cast = [rng.randrange(1, self.staff) for _ in range(4)]
+        voice_actors = {media_id: entity_rng("cast", media_id).sample(cast, 2) for media_id in media_ids}
+        return {
+            **_person("character", character_id),
+            "description": f"Character {character_id} description. " * 8,
+            "favourites": rng.randint(0, 100000),
+            "age": str(rng.randint(12, 40)),
+            "gender": rng.choice(("Male", "Female")),
+            "bloodType": rng.choice(("A", "B", "AB", "O")),
+            "dateOfBirth": _date(rng, year=False),
+            "media": {
+                "nodes": [_media_short(media_id) for media_id in media_ids],
+                "edges": [
+                    {
+                        "node": {"id": media_id},
+                        "voiceActors": [
+                            va for va in (
+                                {**_person("staff", staff_id), "age": 30, "bloodType": "A", "languageV2": LANGUAGES[staff_id % len(LANGUAGES)]}
+                                for staff_id in voice_actors[media_id]
+                            )
+                            if language is None or va["languageV2"].upper() == language
+                        ],
+                    }
+                    for media_id in media_ids
+                ],
+                "pageInfo": {"total": total, "hasNextPage": start + per_page < total, "currentPage": page},
+            },
+        }
+
+    def staff_member(self, staff_id: int, page: int, per_page: int) -> dict:
+        rng = entity_rng("staff", staff_id)
+        total = rng.randint(1, 120)
+        start = (page - 1) * per_page
+        return {
+            **_person("staff", staff_id),
+            "description": f"<p>Staff {staff_id} biography.</p>" * 6,
+            "primaryOccupations": ["Voice Actor"],
+            "gender": rng.choice(("Male", "Female")),
+            "dateOfBirth": _date(rng),
+            "dateOfDeath": {"year": None, "month": None, "day": None},
+            "age": rng.randint(20, 70),
+            "yearsActive": [rng.randint(1980, 2015)],
+            "homeTown": "Tokyo, Japan",
+            "bloodType": rng.choice(("A", "B", "AB", "O")),
+            "favourites": rng.randint(0, 50000),
+            "staffMedia": {
+                "nodes": [_media_short(rng.randrange(1, 200000)) for _ in range(max(0, min(per_page, total - start)))],
+                "pageInfo": {"total": total, "hasNextPage": start + per_page < total},
+            },
+        }
+
+    def user(self, name: str, user_id: int | None = None, pages: dict | None = None) -> dict:
+        """
+        pages — {связь избранного: (page, perPage)}; избранное зависит
+        только от id, так что User(name:) и User(id:) отдают одни страницы
+        """
+        if user_id is None:
+            user_id = sum(name.encode()) * 7919 % 1_000_000
+        rng = entity_rng("user", name)
+        return {
+            "id": user_id,
+            "name": name,
+            "avatar": {
+                "large": f"https://s4.anilist.co/file/anilistcdn/user/avatar/large/b{user_id}.png",
+                "medium": f"https://s4.anilist.co/file/anilistcdn/user/avatar/medium/b{user_id}.png",
+            },
+            "bannerImage": None,
+            "about": f"About {name}",
+            "statistics": {
+                "anime": {"count": rng.randint(0, 1500), "meanScore": 74.5, "minutesWatched": rng.randint(0, 10**6), "episodesWatched": rng.randint(0, 20000)},
+                "manga": {"count": rng.randint(0, 800), "meanScore": 71.0, "chaptersRead": rng.randint(0, 50000), "volumesRead": rng.randint(0, 3000)},
+            },
+            "favourites": {kind: self.favourites(user_id, kind, *(pages or {}).get(kind, (1, 25))) for kind in FAVOURITES},
+            "createdAt": 1500000000,
+            "updatedAt": 1700000000,
+            "siteUrl": f"https://anilist.co/user/{name}",
+            "donatorTier": 0,
+            "moderatorRoles": None,
+        }
+
+    def favourites(self, user_id: int, kind: str, page: int, per_page: int) -> dict:
+        """
+        Страница избранного: у большинства пользователей до сотни записей
+        на связь, у части — несколько сотен
+        """
+        rng = entity_rng(f"favourites:{kind}", user_id)
+        total = rng.randint(0, 400) if rng.random() < 0.2 else rng.randint(0, 80)
+        start = (page - 1) * per_page
+        ids = range(start, min(start + per_page, total))
+        if kind in ("anime", "manga"):
+            nodes = [_media_short(entity_rng(kind, f"{user_id}:{i}").randrange(1, 200000)) for i in ids]
+        else:
+            pool = self.characters if kind == "characters" else self.staff
+            nodes = [_person(kind.rstrip("s"), entity_rng(kind, f"{user_id}:{i}").randrange(1, pool)) for i in ids]
+        last_page = max(1, -(-total // per_page))
+        return {"pageInfo": {"hasNextPage": page < last_page, "lastPage": last_page}, "nodes": nodes}
+
+    def list_collection(self, name: str, media_type: str, chunk: int, per_chunk: int) -> dict:
+        """
+        Список пользователя: от сотен до нескольких тысяч записей, отдаётся пачками
+        """
+        rng = entity_rng("list", f"{name}:{media_type}")
+        total = rng.randint(200, 4000)
+        media_ids = rng.sample(range(1, 200000), total)
+        start = (chunk - 1) * per_chunk
+        statuses = ("CURRENT", "PLANNING", "COMPLETED", "DROPPED", "PAUSED", "REPEATING")
+
+        entries = []
+        for media_id in media_ids[start:start + per_chunk]:
+            entry_rng = entity_rng("list-entry", f"{name}:{media_id}")
+            entries.append({
+                "mediaId": media_id,
+                "status": entry_rng.choice(statuses),
+                "progress": entry_rng.randint(0, 24),
+                "score": entry_rng.choice((0, entry_rng.randint(10, 100))),
+                "createdAt": 1500000000 + media_id,
+                "updatedAt": 1600000000 + media_id,
+                "media": _media_short(media_id),
+            })
+        return {
+            "hasNextChunk": start + per_chunk < total,
+            "lists": [{"name": "All", "isCustomList": False, "entries": entries}],
+        }
+
+    # ── разбор запроса ─────────────────────────────────────────
+
+    def resolve(self, selection: Selection, variables: dict):
+        """
+        Полный объект для корневой выборки; None — не найдено
+        """
+        field = field_name(selection)
+        args = {}
+        for name, value in ARG_RE.findall(selection.head.partition("(")[2]):
+            args[name] = variables.get(value[1:]) if value.startswith("$") else _literal(value)
+
+        if field == "Media":
+            return self.media(int(args["id"]))
+        if field == "Character":
+            return self.character(
+                int(args["id"]), variables.get("page") or 1, variables.get("perPage") or 25, variables.get("language"),
+            )
+        if field == "Staff":
+            return self.staff_member(int(args["id"]), variables.get("page") or 1, variables.get("perPage") or 25)
+        if field == "User":
+            return self.user(args.get("name") or f"user{args.get('id')}", args.get("id"), _favourite_pages(selection, variables))
+        if field == "MediaListCollection":
+            return self.list_collection(
+                args.get("userName") or "user", args.get("type") or "ANIME",
+                args.get("chunk") or 1, args.get("perChunk") or 500,
+            )
+        if field == "Viewer":
+            return self.user("viewer", pages=_favourite_pages(selection, variables))
+        if field == "Page":
+            page, per_page = args.get("page") or 1, args.get("perPage") or 50
+            children = {child.name for child in selection.children or ()}
+            if "characters" in children:
+                return self.characters_page(page, per_page)
+            return self.season_page(variables.get("season"), variables.get("seasonYear") or 2024, page, per_page)
+        raise ValueError(f"Fixtures: неизвестное корневое поле {field}")
+
+
+def _favourite_pages(selection: Selection, variables: dict) -> dict:
+    """
+    Аргументы page/perPage у связей внутри favourites { ... }
+    """
+    pages = {}
+    for child in selection.children or ():
+        if field_name(child) != "favourites":
+            continue
+        for connection in child.children or ():
+            args = {
+                name: variables.get(value[1:]) if value.startswith("$") else _literal(value)
+                for name, value in ARG_RE.findall(connection.head.partition("(")[2])
+            }
+            pages[field_name(connection)] = (args.get("page") or 1, args.get("perPage") or 25)
+    return pages
+
+
+def _literal(value: str):
+    return int(value) if value.isdigit() else value
+
+
+def field_name(selection: Selection) -> str:
+    """
+    Имя поля схемы без алиаса, аргументов и директив: "m1: Media(id: 1)" -> "Media"
+    """
+    return selection.head.split("(")[0].split("@")[0].split(":")[-1].strip()
+
+
+def compile_plan(selections: list[Selection] | None) -> tuple | None:
+    """
+    Выборка в виде ((ключ ответа, поле схемы, вложенный план), ...) —
+    разбирается один раз на запрос, а не на каждый объект
+    """
+    if selections is None:
+        return None
+    return tuple((selection.name, field_name(selection), compile_plan(selection.children)) for selection in selections)
+
+
+def project(value, plan: tuple | None):
+    """
+    Оставляет в value только поля плана (с учётом алиасов)
+    """
+    if plan is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, plan) for item in value]
+    return {key: project(value.get(field), children) for key, field, children in plan}
+
+
+def load_recorded(directory: str | Path) -> dict[str, bytes]:
+    """
+    Записанные ответы: <ИмяОперации>.json отдаётся как есть
+    вместо синтетического
+    """
+    recorded = {}
+    for path in Path(directory).glob("*.json"):
+        body = path.read_bytes()
+        json.loads(body)  # битый файл — ошибка сразу, а не под нагрузкой
+        recorded[path.stem] = body
+    return recorded
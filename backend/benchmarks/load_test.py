@@ -0,0 +1,273 @@
+"""
+Нагрузочный тест всех роутеров API против локального FixtureAniList.
+
+API поднимается в процессе (ASGI transport, с lifespan: фоновые индексы
+тоже работают), AniList — mock на localhost с заданной задержкой и
+ошибками. Отчёт: пропускная способность, p50/p95/p99 по сценариям,
+статусы и число запросов к AniList по операциям. --output пишет JSON
+с хэшем коммита, --compare сравнивает с прошлым прогоном:
+
+    python -m benchmarks.load_test --duration 20 --concurrency 32 --latency-ms 30 \\
+        --output results/$(git rev-parse --short HEAD).json --compare results/base.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.mock_anilist import add_mock_arguments, mock_from_args
+
+SEASONS = ("WINTER", "SPRING", "SUMMER", "FALL")
+
+
+def _ids(rng: random.Random, pool: int, n: int) -> str:
+    return ",".join(str(rng.randint(1, pool)) for _ in range(n))
+
+
+# сценарий: rng, размер пула id -> (метод, путь, JSON тело)
+SCENARIOS = {
+    "media_details": lambda rng, pool: ("GET", f"/media/anime/{rng.randint(1, pool)}", None),
+    "media_sparse": lambda rng, pool: ("GET", f"/media/anime/{rng.randint(1, pool)}?fields=title,coverImage,averageScore", None),
+    "media_batch": lambda rng, pool: ("GET", f"/media/batch?ids={_ids(rng, pool, 10)}&view=short", None),
+    "media_batch_post": lambda rng, pool: ("POST", "/media/batch", {"ids": [rng.randint(1, pool) for _ in range(10)]}),
+    "season_current": lambda rng, pool: ("GET", "/season/current?limit=8", None),
+    "season_catalog": lambda rng, pool: (
+        "GET",
+        f"/season/{rng.randint(2022, 2024)}/{rng.choice(SEASONS)}?page={rng.randint(1, 3)}&sort={rng.choice(('popularity', 'score', 'title'))}",
+        None,
+    ),
+    "today_birthdays": lambda rng, pool: ("GET", "/characters/today-birthdays", None),
+    "birthdays": lambda rng, pool: ("GET", f"/characters/birthdays?month={rng.randint(1, 12)}&day={rng.randint(1, 28)}", None),
+    "character": lambda rng, pool: ("GET", f"/character/{rng.randint(1, pool)}", None),
+    "character_voice_actors": lambda rng, pool: (
+        "GET",
+        f"/character/{rng.randint(1, pool)}/voice-actors?language={rng.choice(('JAPANESE', 'ENGLISH'))}",
+        None,
+    ),
+    "staff": lambda rng, pool: ("GET", f"/staff/{rng.randint(1, pool)}", None),
+    "user": lambda rng, pool: ("GET", f"/user/user{rng.randint(1, pool)}", None),
+    "viewer": lambda rng, pool: ("GET", "/user/me", None),
+    "search": lambda rng, pool: ("GET", f"/anime?search=title+{rng.randint(1, pool)}", None),
+    "watchlist_progress": lambda rng, pool: (
+        "PATCH",
+        f"/watchlist/user{rng.randint(1, 50)}/{rng.randint(1, pool)}/progress",
+        {"progress": rng.randint(1, 24)},
+    ),
+    "watchlist": lambda rng, pool: ("GET", f"/watchlist/user{rng.randint(1, 50)}?limit=20", None),
+}
+
+DEFAULT_WEIGHTS = {
+    "media_details": 30,
+    "media_sparse": 5,
+    "media_batch": 5,
+    "media_batch_post": 2,
+    "season_current": 10,
+    "season_catalog": 10,
+    "today_birthdays": 8,
+    "birthdays": 5,
+    "character": 10,
+    "character_voice_actors": 3,
+    "staff": 8,
+    "user": 5,
+    "viewer": 2,
+    "search": 5,
+    "watchlist_progress": 8,
+    "watchlist": 4,
+}
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], statuses: Counter, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+        "status": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _serve_mock(args, ports) -> None:
+    async def serve():
+        mock = mock_from_args(args)
+        ports.put(await mock.start())
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def run(args) -> dict:
+    # импорт после настройки окружения: config читается при импорте
+    import httpx
+
+    from app.main import app
+    from app.services import anilist_service
+    from app.services.scheduler import scheduler
+
+    # mock в отдельном процессе, чтобы сборка его ответов не ела CPU API
+    if args.in_process_mock:
+        mock = mock_from_args(args)
+        port = await mock.start()
+        process = None
+    else:
+        ports = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_serve_mock, args=(args, ports), daemon=True)
+        process.start()
+        port = ports.get(timeout=30)
+    anilist_service.ANILIST_API_URL = f"http://127.0.0.1:{port}"
+
+    async def mock_stats() -> dict:
+        if process is None:
+            return mock.stats()
+        async with httpx.AsyncClient() as stats_client:
+            return (await stats_client.get(f"http://127.0.0.1:{port}/__stats")).json()
+
+    # квоту живого AniList (90/мин) снимаем: меряем себя, а не лимит
+    scheduler.rate = args.upstream_rate / 60
+    scheduler.capacity = scheduler.tokens = float(args.upstream_burst)
+
+    names = [name for name in args.scenarios.split(",") if name] if args.scenarios else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+    weights = [DEFAULT_WEIGHTS[name] for name in names]
+
+    latencies: dict[str, list[float]] = {name: [] for name in names}
+    statuses: dict[str, Counter] = {name: Counter() for name in names}
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            if args.warmup:
+                await asyncio.sleep(args.warmup)
+            before = await mock_stats()
+
+            stop_at = time.perf_counter() + args.duration
+            budget = [args.requests or 0]
+
+            async def worker(seed: int):
+                rng = random.Random(seed)
+                while time.perf_counter() < stop_at:
+                    if args.requests:
+                        if budget[0] <= 0:
+                            return
+                        budget[0] -= 1
+                    name = rng.choices(names, weights)[0]
+                    method, path, body = SCENARIOS[name](rng, args.id_pool)
+                    start = time.perf_counter()
+                    resp = await client.request(method, path, json=body)
+                    latencies[name].append(time.perf_counter() - start)
+                    statuses[name][resp.status_code] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(args.seed * 10_000 + i) for i in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            after = await mock_stats()
+
+    if process is None:
+        await mock.stop()
+    else:
+        process.terminate()
+        process.join()
+
+    upstream = Counter(after["operations"]) - Counter(before["operations"])
+    upstream_statuses = Counter(after["statuses"]) - Counter(before["statuses"])
+    all_latencies = [value for values in latencies.values() for value in values]
+    all_statuses = sum(statuses.values(), Counter())
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "elapsed_s": round(elapsed, 2),
+        "total": summarize(all_latencies, all_statuses, elapsed),
+        "scenarios": {name: summarize(latencies[name], statuses[name], elapsed) for name in names if latencies[name]},
+        "upstream": {
+            "requests": sum(upstream.values()),
+            "per_api_request": round(sum(upstream.values()) / max(1, len(all_latencies)), 3),
+            "by_operation": dict(upstream.most_common()),
+            "status": dict(sorted(upstream_statuses.items())),
+            "connections": after["connections"],
+        },
+    }
+
+
+def print_report(result: dict, baseline: dict | None) -> None:
+    print(f"commit {result['commit'] or '?'}  {result['elapsed_s']} s")
+    header = f"{'scenario':<18}{'req':>8}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}  status"
+    print(header)
+    rows = [("TOTAL", result["total"])] + list(result["scenarios"].items())
+    for name, row in rows:
+        line = f"{name:<18}{row['requests']:>8}{row['rps']:>10}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}  {row['status']}"
+        if baseline:
+            old = baseline["total"] if name == "TOTAL" else baseline["scenarios"].get(name)
+            if old and old["rps"] and old["p95_ms"]:
+                line += f"  rps {row['rps'] / old['rps'] - 1:+.0%}, p95 {row['p95_ms'] / old['p95_ms'] - 1:+.0%}"
+        print(line)
+
+    upstream = result["upstream"]
+    print(f"upstream: {upstream['requests']} запросов ({upstream['per_api_request']} на запрос API), статусы {upstream['status']}")
+    for operation, count in upstream["by_operation"].items():
+        print(f"  {operation:<24}{count:>8}")
+    if baseline:
+        print(f"upstream baseline: {baseline['upstream']['requests']} запросов")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--requests", type=int, default=0, help="остановиться после N запросов (0 — по времени)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scenarios", default="", help=f"через запятую, по умолчанию все: {','.join(SCENARIOS)}")
+    parser.add_argument("--id-pool", type=int, default=500, help="id берутся из 1..N: меньше — больше попаданий в кэш")
+    parser.add_argument("--warmup", type=float, default=2.0, help="секунд на старт фоновых индексов до замера")
+    parser.add_argument("--upstream-rate", type=int, default=100_000, help="лимит планировщика, запросов в минуту")
+    parser.add_argument("--upstream-burst", type=int, default=1000)
+    parser.add_argument("--disk-cache", action="store_true", help="включить дисковый кэш (во временном каталоге)")
+    parser.add_argument("--in-process-mock", action="store_true", help="mock AniList в том же event loop")
+    parser.add_argument("--output", help="куда записать JSON с результатами")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    # данные (индексы, дисковый кэш) — во временный каталог, не в data/
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="wordanimation-load-")
+    os.environ.setdefault("DISK_CACHE_ENABLED", "1" if args.disk_cache else "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    result = asyncio.run(run(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, baseline)
+
+    if args.output:
+        path = Path(args.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Локальная заглушка AniList GraphQL для бенчмарков.
+
+Минимальный HTTP/1.1 сервер на asyncio с keep-alive. MockAniList
+отвечает фиксированным JSON; FixtureAniList — ответами из
+benchmarks.fixtures на любой запрос из graphql_queries/ с задержкой,
+разбросом, ошибками и 429. Запуск (API направить на него через
+ANILIST_API_URL=http://127.0.0.1:8765):
+
+    python -m benchmarks.mock_anilist --port 8765 --latency-ms 20 --jitter-ms 10 \
+        --error-rate 0.01 --rate-limit-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from http import HTTPStatus
+
+from app.core.graphql import operation_name, root_selections
+from benchmarks.fixtures import Fixtures, compile_plan, entity_rng, load_recorded, project
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BODY = {
+    "data": {
+        "Media": {
+            "id": 1,
+            "type": "ANIME",
+            "title": {"romaji": "Cowboy Bebop", "english": "Cowboy Bebop"},
+        }
+    }
+}
+
+
+class MockAniList:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self.connections = 0
+        self._server: asyncio.AbstractServer | None = None
+
+    async def handle_graphql(self, payload: dict) -> tuple[int, dict, bytes]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return 200, {}, json.dumps(DEFAULT_BODY).encode()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "connections": self.connections}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                # счётчики для нагрузочного теста, когда mock в другом процессе
+                if lines[0].startswith("GET /__stats"):
+                    self._write(writer, 200, {}, json.dumps(self.stats()).encode())
+                    await writer.drain()
+                    continue
+
+                self.requests += 1
+                try:
+                    payload = json.loads(body or b"{}")
+                except json.JSONDecodeError:
+                    status, extra, out = 400, {}, b'{"errors":[{"message":"bad json"}]}'
+                else:
+                    status, extra, out = await self.handle_graphql(payload)
+
+                self._write(writer, status, extra, out)
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, status: int, extra: dict, out: bytes) -> None:
+        response_headers = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(out)),
+            "Connection": "keep-alive",
+            **extra,
+        }
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n".encode()
+            + "".join(f"{k}: {v}\r\n" for k, v in response_headers.items()).encode()
+            + b"\r\n"
+            + out
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="запросов в минуту, 0 — без лимита")
+    parser.add_argument("--not-found-rate", type=float, default=0.0)
+    parser.add_argument("--recorded", help="каталог <Операция>.json с записанными ответами")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+class FixtureAniList(MockAniList):
+    """
+    latency_ms + равномерный разброс до jitter_ms на каждый ответ.
+    error_rate — доля ответов 500, rate_limit_rate — доля 429 с Retry-After.
+    rate_limit > 0 — объявляем X-RateLimit-Limit/Remaining и честно
+    отвечаем 429 сверх лимита в минуту.
+    not_found_rate — доля id, для которых Media/Character/Staff "не существует".
+    recorded — {операция: тело}, отдаётся вместо синтетического ответа.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        rate_limit: int = 0,
+        retry_after: int = 1,
+        not_found_rate: float = 0.0,
+        fixtures: Fixtures | None = None,
+        recorded: dict[str, bytes] | None = None,
+        seed: int = 0,
+    ):
+        super().__init__(latency_ms)
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.not_found_rate = not_found_rate
+        self.fixtures = fixtures or Fixtures()
+        self.recorded = recorded or {}
+        self.rng = random.Random(seed)
+
+        self.operations: Counter[str] = Counter()
+        self.statuses: Counter[int] = Counter()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        # готовые ответы: одинаковый запрос не собираем заново
+        self._rendered: dict[tuple[str, str], tuple[int, bytes]] = {}
+        self._plans: dict[str, list] = {}
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "operations": dict(self.operations),
+            "statuses": {str(code): count for code, count in self.statuses.items()},
+        }
+
+    def _rate_headers(self) -> tuple[dict, bool]:
+        if not self.rate_limit:
+            return {}, False
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        remaining = max(0, self.rate_limit - self._window_count)
+        headers = {"X-RateLimit-Limit": str(self.rate_limit), "X-RateLimit-Remaining": str(remaining)}
+        return headers, self._window_count > self.rate_limit
+
+    def _missing(self, root: str, entity_id) -> bool:
+        return bool(self.not_found_rate) and entity_rng(f"missing:{root}", entity_id).random() < self.not_found_rate
+
+    def _respond(self, status: int, headers: dict, body: dict | bytes) -> tuple[int, dict, bytes]:
+        self.statuses[status] += 1
+        if isinstance(body, dict):
+            body = json.dumps(body, ensure_ascii=False).encode()
+        return status, headers, body
+
+    async def handle_graphql(self, payload: dict) -> tuple[int, dict, bytes]:
+        query = payload.get("query") or ""
+        variables = payload.get("variables") or {}
+        operation = operation_name(query)
+        self.operations[operation] += 1
+
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        headers, over_limit = self._rate_headers()
+        if over_limit or (self.rate_limit_rate and self.rng.random() < self.rate_limit_rate):
+            headers = {**headers, "Retry-After": str(self.retry_after), "X-RateLimit-Remaining": "0"}
+            return self._respond(429, headers, {"errors": [{"message": "Too Many Requests.", "status": 429}], "data": None})
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return self._respond(500, headers, {"errors": [{"message": "Internal Server Error", "status": 500}], "data": None})
+
+        if operation in self.recorded:
+            return self._respond(200, headers, self.recorded[operation])
+
+        key = (query, json.dumps(variables, sort_keys=True))
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            rendered = self._render(query, variables)
+            if len(self._rendered) >= 10_000:
+                self._rendered.clear()
+            self._rendered[key] = rendered
+        status, body = rendered
+        return self._respond(status, headers, body)
+
+    def _render(self, query: str, variables: dict) -> tuple[int, bytes]:
+        plans = self._plans.get(query)
+        if plans is None:
+            try:
+                selections = root_selections(query)
+            except (ValueError, IndexError):
+                return 400, b'{"errors":[{"message":"Syntax Error","status":400}],"data":null}'
+            plans = self._plans[query] = [(selection, compile_plan(selection.children)) for selection in selections]
+
+        data, errors = {}, []
+        for selection, plan in plans:
+            value = self.fixtures.resolve(selection, variables)
+            entity_id = value.get("id") if isinstance(value, dict) else None
+            if entity_id is not None and self._missing(selection.name, entity_id):
+                data[selection.name] = None
+                errors.append({"message": "Not Found.", "status": 404, "path": [selection.name]})
+                continue
+            data[selection.name] = project(value, plan)
+
+        if errors:
+            return 404, json.dumps({"errors": errors, "data": data}, ensure_ascii=False).encode()
+        return 200, json.dumps({"data": data}, ensure_ascii=False).encode()
+
+
+def mock_from_args(args: argparse.Namespace) -> FixtureAniList:
+    return FixtureAniList(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rate_limit=args.rate_limit,
+        not_found_rate=args.not_found_rate,
+        recorded=load_recorded(args.recorded) if args.recorded else None,
+        seed=args.seed,
+    )
+
+
+async def _main(args):
+    mock = mock_from_args(args)
+    port = await mock.start(args.host, args.port)
+    logger.info("Mock AniList слушает http://%s:%s", args.host, port)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_arguments(parser)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))